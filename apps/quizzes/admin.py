@@ -1,8 +1,9 @@
 from django.contrib import admin
-from unfold.admin import ModelAdmin, StackedInline
+from unfold.admin import ModelAdmin, StackedInline, TabularInline
 from .models import (
     Quiz, Question, Answer, OrderingItem, MatchingPair, Group, GroupItem,
-    InputAnswer, SelectOption, UserAnswer, UserQuizProgress, InputAnswerItem, SelectOptionItem
+    InputAnswer, SelectOption, UserAnswer, UserAnswerSelection, UserQuizProgress, InputAnswerItem, SelectOptionItem,
+    QuestionPool, QuestionDraw, AnswerSubmission, IdempotencyRecord
 )
 
 
@@ -13,20 +14,26 @@ class QuestionInline(StackedInline):
     show_change_link = True  # Позволяет редактировать объект
 
 
+class QuestionPoolInline(StackedInline):
+    """Настройки случайной выборки вопросов теста"""
+    model = QuestionPool
+    extra = 0
+
+
 @admin.register(Quiz)
 class QuizAdmin(ModelAdmin):
     """Админка для тестов"""
-    list_display = ("title", "created_at")
+    list_display = ("title", "shuffle", "created_at")
     search_fields = ("title",)
     date_hierarchy = "created_at"
-    inlines = [QuestionInline]
+    inlines = [QuestionPoolInline, QuestionInline]
 
 
 @admin.register(Question)
 class QuestionAdmin(ModelAdmin):
     """Админка для вопросов"""
-    list_display = ("text", "quiz", "question_type")
-    list_filter = ("question_type",)
+    list_display = ("text", "quiz", "question_type", "difficulty", "points")
+    list_filter = ("question_type", "difficulty")
     search_fields = ("text", "quiz__title")
     autocomplete_fields = ("quiz",)
 
@@ -100,7 +107,7 @@ class InputAnswerAdmin(ModelAdmin):
 @admin.register(InputAnswerItem)
 class InputAnswerItemAdmin(ModelAdmin):
     """Админка для правильных текстовых ответов"""
-    list_display = ("number", "input_placeholder")
+    list_display = ("number", "input_placeholder", "max_typos")
     search_fields = ("number", "input_placeholder", "input_correct_text")
     autocomplete_fields = ("inputAnswer",)
 
@@ -122,19 +129,30 @@ class SelectOptionItemAdmin(ModelAdmin):
     list_display = ("number", "select_placeholder")
     search_fields = ("number", "select_placeholder", "select_correct_text", "select_option_text")
     autocomplete_fields = ("selectOption",)
+
+
+class UserAnswerSelectionInline(TabularInline):
+    """Выбранные варианты ответа"""
+    model = UserAnswerSelection
+    extra = 0
+    autocomplete_fields = ("answer",)
+    exclude = ("answered_at",)
+
+
 @admin.register(UserAnswer)
 class UserAnswerAdmin(ModelAdmin):
     """Админка для ответов пользователей"""
-    list_display = ("user", "question", "is_correct", "answered_at")
+    list_display = ("user", "question", "is_correct", "score", "answered_at")
     list_filter = ("is_correct", "answered_at")
     search_fields = ("user__username", "question__text")
     autocomplete_fields = ("user", "question", "selected_option")
     date_hierarchy = "answered_at"
     readonly_fields = ("answered_at",)
+    inlines = [UserAnswerSelectionInline]
     fieldsets = (
-        (None, {"fields": ("user", "question", "is_correct", "answered_at")}),
-        ("Выбор", {"fields": ("selected_answers", "selected_option")}),
-        ("Свободный ввод", {"fields": ("input_text",)}),
+        (None, {"fields": ("user", "question", "is_correct", "score", "answered_at")}),
+        ("Выбор", {"fields": ("selected_option",)}),
+        ("Свободный ввод", {"fields": ("input_text", "selected_values")}),
         ("Дополнительные данные", {"fields": ("selected_order", "selected_matching", "selected_grouping")}),
     )
 
@@ -146,10 +164,40 @@ class UserQuizProgressAdmin(ModelAdmin):
     list_filter = ("completed_at",)
     search_fields = ("user__username", "quiz__title")
     autocomplete_fields = ("user", "quiz")
-    readonly_fields = ("answered_questions", "correct_answers", "score_percentage", "completed_at")
+    readonly_fields = ("answered_questions", "correct_answers", "total_points", "earned_points", "score_percentage",
+                       "completed_at")
 
     fieldsets = (
         (None, {"fields": ("user", "quiz")}),
-        ("Прогресс", {"fields": ("answered_questions", "correct_answers", "total_questions", "score_percentage")}),
+        ("Прогресс", {"fields": ("answered_questions", "correct_answers", "total_questions", "total_points",
+                                 "earned_points", "score_percentage")}),
         ("Завершение", {"fields": ("completed_at",)}),
     )
+
+
+@admin.register(QuestionDraw)
+class QuestionDrawAdmin(ModelAdmin):
+    """Админка для выборок вопросов учеников"""
+    list_display = ("user", "quiz", "total_questions", "drawn_at")
+    search_fields = ("user__username", "quiz__title")
+    autocomplete_fields = ("user", "quiz")
+    readonly_fields = ("drawn_at",)
+
+
+@admin.register(AnswerSubmission)
+class AnswerSubmissionAdmin(ModelAdmin):
+    """Админка для асинхронных отправок ответов"""
+    list_display = ("id", "user", "quiz", "status", "created_at", "processed_at")
+    list_filter = ("status",)
+    search_fields = ("user__username", "quiz__title")
+    autocomplete_fields = ("user", "quiz")
+    readonly_fields = ("answers", "result", "error", "created_at", "processed_at")
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(ModelAdmin):
+    """Админка для сохраненных ответов на повторяемые отправки"""
+    list_display = ("user", "key", "status_code", "created_at")
+    search_fields = ("user__username", "key")
+    autocomplete_fields = ("user",)
+    readonly_fields = ("fingerprint", "status_code", "response", "created_at")
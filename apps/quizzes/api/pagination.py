@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (keyset): следующая страница начинается строго после последней
+    строки предыдущей, поэтому стоимость не зависит от номера страницы, а новые строки не сдвигают выдачу.
+
+    `ordering` должен заканчиваться уникальным полем и совпадать с составным индексом модели.
+    NULL считается больше любого значения, как в PostgreSQL по умолчанию.
+    """
+    ordering = ("-id",)
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+        self.model_fields = {name: queryset.model._meta.get_field(name) for name, _ in self.fields}
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.after(queryset, position)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def after(self, queryset, position):
+        """Строки строго после position в лексикографическом порядке по self.fields"""
+        descending = {descending for _, descending in self.fields}
+        nullable = any(field.null for field in self.model_fields.values())
+        # Одно направление и нет NULL вперемешку со значениями: сравнение строк (a, b) < (%s, %s) по индексу.
+        # NULL больше любого значения, поэтому при убывании строки с NULL не проходят сравнение — они раньше
+        if len(descending) == 1 and None not in position and (descending == {True} or not nullable):
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            columns = ", ".join(f"{table}.{connection.ops.quote_name(self.model_fields[name].column)}"
+                                for name, _ in self.fields)
+            placeholders = ", ".join(["%s"] * len(position))
+            operator = "<" if descending == {True} else ">"
+            return queryset.extra(where=[f"({columns}) {operator} ({placeholders})"], params=position)
+        return queryset.filter(self.after_condition(position))
+
+    def after_condition(self, position):
+        """Условие «строго после position» с NULL-значениями — цепочкой Q по полям"""
+        condition, equal = Q(pk__in=[]), Q()
+        for (name, descending), value in zip(self.fields, position):
+            nullable = self.model_fields[name].null
+            if value is None:
+                greater = Q(pk__in=[]) if not descending else Q(**{f"{name}__isnull": False})
+                same = Q(**{f"{name}__isnull": True})
+            else:
+                greater = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if nullable and not descending:
+                    greater |= Q(**{f"{name}__isnull": True})
+                same = Q(**{name: value})
+            condition |= equal & greater
+            equal &= same
+        return condition
+
+    def encode_cursor(self, row):
+        position = [getattr(row, name) for name, _ in self.fields]
+        # isoformat() без округления: DjangoJSONEncoder обрезает микросекунды, и курсор пропустил бы строки
+        data = json.dumps(position, default=lambda value: value.isoformat()).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(position, list) or len(position) != len(self.fields):
+                raise ValueError
+            return [None if value is None else self.model_fields[name].to_python(value)
+                    for (name, _), value in zip(self.fields, position)]
+        except (ValueError, TypeError, binascii.Error, json.JSONDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("first", self.get_first_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "first": {"type": "string", "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class UserAnswerPagination(KeysetPagination):
+    """Ответы — сначала новые (индекс user_answer_answered_at_idx)"""
+    ordering = ("-answered_at", "-id")
+
+
+class UserQuizProgressPagination(KeysetPagination):
+    """Прогресс — сначала незавершенные, затем недавно завершенные (индекс user_progress_completed_at_idx)"""
+    ordering = ("-completed_at", "-id")
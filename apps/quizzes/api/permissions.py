@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from ..models import user_scope
+
 
 class IsAdminOrContentManager(permissions.BasePermission):
     """
@@ -31,6 +33,7 @@ class IsOwnerOrSchoolAdmin(permissions.BasePermission):
             return True  # `ADMIN` видит все
 
         if request.user.role in [request.user.Role.EXPERT, request.user.Role.TEACHER, request.user.Role.SCHOOL_ADMIN]:
-            return obj.user.school == request.user.school  # Видят ответы своей школы
+            # Видят ответы своей школы (школа сохранена в самом ответе/прогрессе)
+            return obj.school_id is not None and obj.school_id == user_scope(request.user)["school_id"]
 
-        return obj.user == request.user  # Обычные пользователи видят только свои данные
+        return obj.user_id == request.user.id  # Обычные пользователи видят только свои данные
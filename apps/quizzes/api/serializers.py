@@ -1,8 +1,10 @@
+from django.conf import settings
+from django.db.models import Prefetch
 from rest_framework import serializers
 from ..models import (
     Quiz, Question, Answer, OrderingItem, MatchingPair,
     Group, GroupItem, InputAnswer, InputAnswerItem, SelectOption, SelectOptionItem,
-    UserAnswer, UserQuizProgress
+    UserAnswer, UserQuizProgress, QuizRollup, LeaderboardScope, QuestionType, QuestionPool
 )
 
 
@@ -55,7 +57,7 @@ class InputAnswerItemSerializer(serializers.ModelSerializer):
     )
     class Meta:
         model = InputAnswerItem
-        fields = ["id", "number", "input_placeholder", "input_correct_text"]
+        fields = ["id", "number", "input_placeholder", "input_correct_text", "max_typos"]
 
 
 class InputAnswerSerializer(serializers.ModelSerializer):
@@ -95,17 +97,153 @@ class QuestionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Question
-        fields = ["id", "quiz", "text", "question_type", "answers", "ordering_items",
+        fields = ["id", "quiz", "text", "question_type", "points", "difficulty", "answers", "ordering_items",
                   "matching_pairs", "groups", "input_answers", "select_options"]
 
 
+# Какие связи загружать заранее, чтобы число запросов не зависело от числа строк (см. views.py)
+QUESTION_PREFETCH = (
+    "answers", "ordering_items", "matching_pairs", "groups__items",
+    "input_answers__input_answer", "select_options__select_option",
+)
+QUIZ_PREFETCH = tuple(f"questions__{lookup}" for lookup in QUESTION_PREFETCH)
+USER_ANSWER_PREFETCH = (Prefetch("selected_answers", queryset=Answer.objects.only("id")),)
+
+
+class QuestionPoolSerializer(serializers.ModelSerializer):
+    """Настройки случайной выборки вопросов"""
+
+    class Meta:
+        model = QuestionPool
+        fields = ["size", "stratify_by"]
+
+
 class QuizSerializer(serializers.ModelSerializer):
     """Сериализатор для тестов"""
     questions = QuestionSerializer(many=True, read_only=True)
+    pool = QuestionPoolSerializer(read_only=True)
 
     class Meta:
         model = Quiz
-        fields = ["id", "title", "description", "created_at", "questions"]
+        fields = ["id", "title", "description", "shuffle", "pool", "created_at", "questions"]
+
+
+# Формат обмена тестами (interchange.py): дерево теста без id, вложенные объекты — списками
+class TreeAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ["text", "is_correct"]
+
+
+class TreeOrderingItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderingItem
+        fields = ["text", "order"]
+
+
+class TreeMatchingPairSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MatchingPair
+        fields = ["left_side", "right_side"]
+
+
+class TreeGroupItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GroupItem
+        fields = ["text"]
+
+
+class TreeGroupSerializer(serializers.ModelSerializer):
+    items = TreeGroupItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = Group
+        fields = ["name", "items"]
+
+
+class TreeInputAnswerItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InputAnswerItem
+        fields = ["number", "input_placeholder", "input_correct_text", "max_typos"]
+
+
+class TreeInputAnswerSerializer(serializers.ModelSerializer):
+    items = TreeInputAnswerItemSerializer(many=True, required=False, source="input_answer")
+
+    class Meta:
+        model = InputAnswer
+        fields = ["text", "items"]
+
+
+class TreeSelectOptionItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SelectOptionItem
+        fields = ["number", "select_placeholder", "select_correct_text", "select_option_text"]
+
+
+class TreeSelectOptionSerializer(serializers.ModelSerializer):
+    items = TreeSelectOptionItemSerializer(many=True, required=False, source="select_option")
+
+    class Meta:
+        model = SelectOption
+        fields = ["text", "items"]
+
+
+class TreeQuestionSerializer(serializers.ModelSerializer):
+    """Вопрос с дочерними объектами; допускаются только объекты, которые использует его тип"""
+    answers = TreeAnswerSerializer(many=True, required=False)
+    ordering_items = TreeOrderingItemSerializer(many=True, required=False)
+    matching_pairs = TreeMatchingPairSerializer(many=True, required=False)
+    groups = TreeGroupSerializer(many=True, required=False)
+    input_answers = TreeInputAnswerSerializer(many=True, required=False)
+    select_options = TreeSelectOptionSerializer(many=True, required=False)
+
+    CHILDREN = {
+        QuestionType.SINGLE_CHOICE: "answers",
+        QuestionType.MULTIPLE_CHOICE: "answers",
+        QuestionType.ORDERING: "ordering_items",
+        QuestionType.MATCHING: "matching_pairs",
+        QuestionType.GROUPING: "groups",
+        QuestionType.INPUT: "input_answers",
+        QuestionType.SELECT: "select_options",
+    }
+
+    class Meta:
+        model = Question
+        fields = ["text", "question_type", "points", "difficulty", "answers", "ordering_items", "matching_pairs",
+                  "groups", "input_answers", "select_options"]
+
+    def validate(self, attrs):
+        allowed = self.CHILDREN[attrs["question_type"]]
+        for name in set(self.CHILDREN.values()) - {allowed}:
+            if attrs.get(name):
+                raise serializers.ValidationError({name: f"Не используется в вопросах типа {attrs['question_type']}."})
+        # Те же ограничения уникальности, что в моделях: ошибка до начала записи
+        orders = [item["order"] for item in attrs.get("ordering_items", [])]
+        if len(orders) != len(set(orders)):
+            raise serializers.ValidationError({"ordering_items": "Порядковые номера повторяются."})
+        pairs = [(pair["left_side"], pair["right_side"]) for pair in attrs.get("matching_pairs", [])]
+        if len(pairs) != len(set(pairs)):
+            raise serializers.ValidationError({"matching_pairs": "Пары повторяются."})
+        return attrs
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        allowed = self.CHILDREN.get(instance.question_type)
+        for name in set(self.CHILDREN.values()) - {allowed}:
+            data.pop(name, None)
+        return data
+
+
+class QuizTreeSerializer(serializers.ModelSerializer):
+    """Тест целиком в формате обмена"""
+    version = serializers.IntegerField(required=False, write_only=True, min_value=1, max_value=1)
+    pool = QuestionPoolSerializer(required=False, allow_null=True)
+    questions = TreeQuestionSerializer(many=True, allow_empty=False, max_length=settings.QUIZ_IMPORT_MAX_QUESTIONS)
+
+    class Meta:
+        model = Quiz
+        fields = ["version", "title", "description", "shuffle", "pool", "questions"]
 
 
 class UserAnswerSerializer(serializers.ModelSerializer):
@@ -115,20 +253,46 @@ class UserAnswerSerializer(serializers.ModelSerializer):
         model = UserAnswer
         fields = ["id", "user", "question", "selected_answers", "input_text",
                   "selected_order", "selected_matching", "selected_grouping",
-                  "selected_option", "is_correct", "answered_at"]
+                  "selected_option", "selected_values", "is_correct", "score", "answered_at"]
 
 
-class SubmitAnswerSerializer(serializers.Serializer):
-    """Сериализатор для отправки ответа на вопрос"""
-    question = serializers.PrimaryKeyRelatedField(queryset=Question.objects.all())
-    selected_answers = serializers.PrimaryKeyRelatedField(queryset=Answer.objects.all(), many=True, required=False)
+class AnswerDataSerializer(serializers.Serializer):
+    """Ответ на вопрос; ссылки на вопрос и вариант проверяются пачкой при пакетной отправке"""
+    question = serializers.IntegerField()
+    # Принадлежность вариантов вопросу проверяется по ключу ответов, без запросов к базе
+    selected_answers = serializers.ListField(child=serializers.IntegerField(), required=False)
     input_text = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     selected_order = serializers.ListField(child=serializers.IntegerField(), required=False)
     selected_matching = serializers.ListField(child=serializers.JSONField(), required=False)
     selected_grouping = serializers.ListField(child=serializers.JSONField(), required=False)
+    selected_option = serializers.IntegerField(required=False, allow_null=True)
+    selected_values = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False)
+
+
+class SubmitAnswerSerializer(AnswerDataSerializer):
+    """Сериализатор для отправки ответа на вопрос"""
+    question = serializers.PrimaryKeyRelatedField(queryset=Question.objects.select_related("quiz"))
     selected_option = serializers.PrimaryKeyRelatedField(queryset=SelectOption.objects.all(), required=False,
                                                          allow_null=True)
 
+    def validate(self, attrs):
+        """Вариант должен относиться к вопросу — так же, как в build_answers при пакетной отправке"""
+        option = attrs.get("selected_option")
+        if option is not None and option.question_id != attrs["question"].pk:
+            raise serializers.ValidationError({"selected_option": ["Вариант не относится к этому вопросу."]})
+        return attrs
+
+
+class SubmitBatchSerializer(serializers.Serializer):
+    """Сериализатор для пакетной отправки ответов на вопросы одного теста"""
+    quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())
+    answers = AnswerDataSerializer(many=True, allow_empty=False, max_length=settings.QUIZ_BATCH_MAX_ANSWERS)
+
+
+class FinishAttemptSerializer(serializers.Serializer):
+    """Сериализатор для завершения попытки (ответы берутся из черновика)"""
+    quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())
+
 
 class UserQuizProgressSerializer(serializers.ModelSerializer):
     """Сериализатор для прогресса пользователей"""
@@ -136,5 +300,24 @@ class UserQuizProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserQuizProgress
         fields = ["id", "user", "quiz", "total_questions",
-                  "answered_questions", "correct_answers",
+                  "answered_questions", "correct_answers", "total_points", "earned_points",
                   "score_percentage", "completed_at"]
+
+
+class QuizRollupSerializer(serializers.ModelSerializer):
+    """Сериализатор для сводки результатов теста по классу"""
+    average_score = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = QuizRollup
+        fields = ["quiz", "school", "school_class", "school_class_prefix", "attempts", "completed",
+                  "score_sum", "average_score", "histogram", "updated_at"]
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """Параметры запроса рейтинга"""
+    quiz = serializers.IntegerField()
+    scope = serializers.ChoiceField(choices=LeaderboardScope.choices, default=LeaderboardScope.NATIONAL)
+    scope_id = serializers.IntegerField(required=False)  # По умолчанию — школа/город/область текущего пользователя
+    limit = serializers.IntegerField(min_value=1, max_value=settings.QUIZ_LEADERBOARD_MAX_LIMIT, default=10)
+    offset = serializers.IntegerField(min_value=0, default=0)
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     QuizViewSet, QuestionViewSet, AnswerViewSet, OrderingItemViewSet, MatchingPairViewSet,
     GroupViewSet, GroupItemViewSet, InputAnswerViewSet,InputAnswerItemViewSet, SelectOptionViewSet, SelectOptionItemViewSet,
-    UserAnswerViewSet, UserQuizProgressViewSet
+    UserAnswerViewSet, UserQuizProgressViewSet, QuizRollupViewSet,
+    LeaderboardViewSet
 )
 
 router = DefaultRouter()
@@ -20,9 +21,17 @@ router.register(r'select-options', SelectOptionViewSet, basename='select-option'
 router.register(r'select-options', SelectOptionItemViewSet, basename='select-option-item')
 router.register(r'user-answers', UserAnswerViewSet, basename='user-answer')
 router.register(r'user-progress', UserQuizProgressViewSet, basename='user-progress')
+router.register(r'quiz-stats', QuizRollupViewSet, basename='quiz-stats')
+router.register(r'leaderboards', LeaderboardViewSet, basename='leaderboard')
 
+# Явные пути идут раньше роутера, иначе "user-progress/my/" перехватывает маршрут detail
 urlpatterns = [
-    path('', include(router.urls)),
     path('user-answers/submit/', UserAnswerViewSet.as_view({'post': 'submit'}), name="submit-answer"),
+    path('user-answers/submit-batch/', UserAnswerViewSet.as_view({'post': 'submit_batch'}), name="submit-batch"),
+    path('user-answers/draft/', UserAnswerViewSet.as_view({'get': 'draft', 'post': 'draft'}), name="answer-draft"),
+    path('user-answers/finish/', UserAnswerViewSet.as_view({'post': 'finish'}), name="finish-attempt"),
+    path('user-answers/submissions/<uuid:submission_id>/', UserAnswerViewSet.as_view({'get': 'submission'}),
+         name="answer-submission"),
     path('user-progress/my/', UserQuizProgressViewSet.as_view({'get': 'my_progress'}), name="my-progress"),
+    path('', include(router.urls)),
 ]
@@ -1,37 +1,169 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 import django_filters
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from tablib import UnsupportedFormat
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from .pagination import UserAnswerPagination, UserQuizProgressPagination
 from .permissions import IsAdminOrContentManager, IsOwnerOrSchoolAdmin
 from .serializers import (
     QuizSerializer, QuestionSerializer, AnswerSerializer, OrderingItemSerializer, MatchingPairSerializer,
     GroupSerializer, GroupItemSerializer, InputAnswerSerializer, SelectOptionSerializer, SelectOptionItemSerializer,
-    UserAnswerSerializer, SubmitAnswerSerializer, UserQuizProgressSerializer, InputAnswerItemSerializer
+    UserAnswerSerializer, SubmitAnswerSerializer, SubmitBatchSerializer, FinishAttemptSerializer,
+    UserQuizProgressSerializer, InputAnswerItemSerializer, QuizRollupSerializer, LeaderboardQuerySerializer,
+    QUESTION_PREFETCH, QUIZ_PREFETCH, USER_ANSWER_PREFETCH
 )
 from ..models import (
     Quiz, Question, Answer, OrderingItem, MatchingPair,
     Group, GroupItem, InputAnswer, SelectOption,
-    UserAnswer, UserQuizProgress, InputAnswerItem, SelectOptionItem
+    UserAnswer, UserQuizProgress, InputAnswerItem, SelectOptionItem, QuizRollup, AnswerSubmission, HISTOGRAM_BUCKETS,
+    user_scope
 )
+from ..drafts import DraftLocked, get_draft, save_draft, flush_draft
+from ..grading import get_quiz_key
+from ..progress import question_states
+from .. import exports, idempotency, interchange, leaderboards, pools, shuffling, snapshots, submissions
+from ..services import attempt_result, build_answer, build_answers, save_answers
 
 User = get_user_model()
 
 
 class QuizViewSet(viewsets.ModelViewSet):
     """API для тестов"""
-    queryset = Quiz.objects.all()
+    queryset = Quiz.objects.select_related("pool").prefetch_related(*QUIZ_PREFETCH)
     serializer_class = QuizSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrContentManager]
 
+    def is_staff_request(self):
+        return self.request.user.role in [self.request.user.Role.ADMIN, self.request.user.Role.CONTENT_MANAGER]
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Отдает опубликованный снимок теста как есть; без снимка — сериализует тест заново.
+        Ученик получает только вопросы своей выборки (pools.py) в своем порядке (shuffling.py).
+        """
+        variant = snapshots.STAFF if self.is_staff_request() else snapshots.STUDENT
+        pk = str(kwargs.get(self.lookup_field, ""))
+        published = snapshots.get_published(int(pk), variant) if pk.isdecimal() else None
+
+        # Сотрудникам нужен актуальный тест, даже если изменения еще не опубликованы
+        if published and variant == snapshots.STAFF and \
+                not Quiz.objects.filter(pk=pk, content_version=published[2]).exists():
+            published = None
+
+        if published is None:
+            data = self.get_serializer(self.get_object()).data
+            if variant == snapshots.STUDENT:
+                data, _ = self.student_variant(snapshots.student_view(data))
+            return Response(data)
+
+        # Снимок отдается без get_object(): объектные права проверяем на легком объекте с одним pk
+        self.check_object_permissions(request, Quiz(pk=int(pk)))
+        etag, payload, _ = published
+        data, parts = None, ()
+        if variant == snapshots.STUDENT:
+            data = shuffling.parsed_snapshot(etag, payload)
+            data, parts = self.student_variant(data)
+        if parts:
+            etag = f'{etag[:-1]}-{"-".join(parts)}"'
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        elif parts:
+            response = HttpResponse(JSONRenderer().render(data), content_type="application/json")
+        else:
+            response = HttpResponse(payload, content_type="application/json")
+        response["ETag"] = etag
+        return response
+
+    def student_variant(self, data):
+        """
+        Тест для ученика: только вопросы его выборки (пул) в его порядке (перемешивание).
+        Возвращает (данные, части ETag варианта); без пула и перемешивания — исходные данные.
+        """
+        parts = []
+        if data.get("pool"):
+            quiz_key = get_quiz_key(Quiz.objects.only("id", "content_version").get(pk=data["id"]))
+            ids = pools.question_ids(quiz_key, pools.drawn(self.request.user.pk, quiz_key))
+            data = {**data, "questions": [q for q in data["questions"] if q["id"] in ids]}
+            parts.append(pools.fingerprint(ids))
+        if data.get("shuffle"):
+            attempt = shuffling.current_attempt(self.request.user.pk, data["id"])
+            seed = shuffling.seed(self.request.user.pk, data["id"], attempt)
+            data = shuffling.shuffle_quiz(data, seed)
+            parts.append(seed[:6].hex())
+        return data, parts
+
+    @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated, IsAdminOrContentManager])
+    def publish(self, request, pk=None):
+        """Публикует текущее содержимое теста: ученики получают этот снимок до следующей публикации"""
+        snapshot = snapshots.publish(self.get_object())
+        return Response({
+            "id": snapshot.id,
+            "quiz": snapshot.quiz_id,
+            "content_version": snapshot.content_version,
+            "content_hash": snapshot.content_hash,
+            "published_at": snapshot.published_at,
+        }, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter("output", openapi.IN_QUERY, description="Формат: json (по умолчанию), csv или xlsx",
+                              type=openapi.TYPE_STRING, enum=list(interchange.FORMATS)),
+        ]
+    )
+    @action(detail=True, methods=["get"], url_path="export")
+    def export_tree(self, request, pk=None):
+        """Тест целиком с правильными ответами в формате обмена (только для сотрудников)"""
+        if not self.is_staff_request():
+            return Response({"error": "Недостаточно прав."}, status=status.HTTP_403_FORBIDDEN)
+        output = request.query_params.get("output", interchange.JSON)
+        if output not in interchange.FORMATS:
+            return Response({"error": "Неверный формат выгрузки."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quiz = interchange.load_quiz(pk)
+        except (Quiz.DoesNotExist, ValueError):
+            return Response({"error": "Тест не найден."}, status=status.HTTP_404_NOT_FOUND)
+        if output == interchange.JSON:
+            response = StreamingHttpResponse(interchange.iter_json(quiz), content_type=interchange.FORMATS[output])
+        else:
+            try:
+                response = HttpResponse(interchange.export_table(quiz, output),
+                                        content_type=interchange.FORMATS[output])
+            except UnsupportedFormat:
+                return Response({"error": f"Формат {output} недоступен на сервере."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        response["Content-Disposition"] = f'attachment; filename="quiz-{quiz.pk}.{output}"'
+        return response
+
+    @swagger_auto_schema(request_body=openapi.Schema(type=openapi.TYPE_OBJECT,
+                                                     description="Тест в формате обмена или файл (file)"))
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[JSONParser, MultiPartParser])
+    def import_tree(self, request):
+        """Создает тест со всеми вопросами из JSON или файла .json/.csv/.xlsx одной транзакцией"""
+        upload = request.FILES.get("file")
+        try:
+            data = interchange.parse(upload.read(), interchange.format_of(upload.name)) if upload else request.data
+            quiz = interchange.import_quiz(data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"id": quiz.id, "title": quiz.title, "questions": quiz.questions.count()},
+                        status=status.HTTP_201_CREATED)
+
 
 class QuestionViewSet(viewsets.ModelViewSet):
     """API для вопросов"""
-    queryset = Question.objects.all()
+    queryset = Question.objects.prefetch_related(*QUESTION_PREFETCH)
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrContentManager]
     filter_backends = [DjangoFilterBackend]
@@ -119,7 +251,7 @@ class MatchingPairViewSet(viewsets.ModelViewSet):
 
 class GroupViewSet(viewsets.ModelViewSet):
     """API для групп"""
-    queryset = Group.objects.all()
+    queryset = Group.objects.prefetch_related("items")
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrContentManager]
     filter_backends = [DjangoFilterBackend]
@@ -148,7 +280,7 @@ class GroupItemViewSet(viewsets.ModelViewSet):
 
 class InputAnswerViewSet(viewsets.ModelViewSet):
     """API для текстовых ответов"""
-    queryset = InputAnswer.objects.all()
+    queryset = InputAnswer.objects.prefetch_related("input_answer")
     serializer_class = InputAnswerSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrContentManager]
     filter_backends = [DjangoFilterBackend]
@@ -192,7 +324,7 @@ class InputAnswerItemViewSet(viewsets.ModelViewSet):
 
 class SelectOptionViewSet(viewsets.ModelViewSet):
     """API для выпадающего списка"""
-    queryset = SelectOption.objects.all()
+    queryset = SelectOption.objects.prefetch_related("select_option")
     serializer_class = SelectOptionSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrContentManager]
     filter_backends = [DjangoFilterBackend]
@@ -231,15 +363,39 @@ class SelectOptionItemViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+EXPORT_PARAMETERS = [
+    openapi.Parameter("output", openapi.IN_QUERY, description="Формат: csv (по умолчанию) или ndjson",
+                      type=openapi.TYPE_STRING, enum=list(exports.FORMATS)),
+    openapi.Parameter("gzip", openapi.IN_QUERY, description="1 — сжать выгрузку gzip", type=openapi.TYPE_BOOLEAN),
+]
+
+IDEMPOTENCY_PARAMETER = openapi.Parameter(
+    idempotency.HEADER, openapi.IN_HEADER, type=openapi.TYPE_STRING,
+    description="Ключ повтора: запрос с тем же ключом вернет сохраненный ответ без повторной записи")
+
+
+def export_response(request, name, queryset):
+    """Потоковая выгрузка: строки читаются и кодируются по мере отправки, без загрузки в память"""
+    output = request.query_params.get("output", exports.CSV)
+    if output not in exports.FORMATS:
+        return Response({"error": "Неверный формат выгрузки."}, status=status.HTTP_400_BAD_REQUEST)
+    gzip = request.query_params.get("gzip") in ("1", "true")
+    _, columns, rows = exports.EXPORTS[name]
+    response = StreamingHttpResponse(exports.stream(rows(queryset), columns, output, gzip),
+                                     content_type="application/gzip" if gzip else exports.FORMATS[output])
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(name, output, gzip)}"'
+    return response
+
+
 class UserAnswerFilter(django_filters.FilterSet):
     """Фильтры для UserAnswer"""
-    school = django_filters.NumberFilter(field_name="user__profile__school__id", lookup_expr="exact")
-    school_class = django_filters.NumberFilter(field_name="user__profile__school_class__id", lookup_expr="exact")
-    school_class_prefix = django_filters.NumberFilter(field_name="user__profile__school_class_prefix__id",
-                                                      lookup_expr="exact")
-    question = django_filters.NumberFilter(field_name="question__id", lookup_expr="exact")
-    user = django_filters.NumberFilter(field_name="user__id", lookup_expr="exact")
-    quiz = django_filters.NumberFilter(field_name="question__quiz__id", lookup_expr="exact")
+    # Школа, класс и тест хранятся в самом ответе (см. UserAnswer.quiz/school), без JOIN
+    school = django_filters.NumberFilter(field_name="school_id", lookup_expr="exact")
+    school_class = django_filters.NumberFilter(field_name="school_class_id", lookup_expr="exact")
+    school_class_prefix = django_filters.NumberFilter(field_name="school_class_prefix_id", lookup_expr="exact")
+    question = django_filters.NumberFilter(field_name="question_id", lookup_expr="exact")
+    user = django_filters.NumberFilter(field_name="user_id", lookup_expr="exact")
+    quiz = django_filters.NumberFilter(field_name="quiz_id", lookup_expr="exact")
 
     class Meta:
         model = UserAnswer
@@ -248,11 +404,12 @@ class UserAnswerFilter(django_filters.FilterSet):
 
 class UserAnswerViewSet(viewsets.ModelViewSet):
     """Ответы пользователей"""
-    queryset = UserAnswer.objects.all()
+    queryset = UserAnswer.objects.prefetch_related(*USER_ANSWER_PREFETCH)
     serializer_class = UserAnswerSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrSchoolAdmin]
     filter_backends = [DjangoFilterBackend]
     filterset_class = UserAnswerFilter
+    pagination_class = UserAnswerPagination
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -267,6 +424,10 @@ class UserAnswerViewSet(viewsets.ModelViewSet):
             openapi.Parameter("user", openapi.IN_QUERY, description="Фильтр по пользователю (ID)",
                               type=openapi.TYPE_INTEGER),
             openapi.Parameter("quiz", openapi.IN_QUERY, description="Фильтр по тесту (ID)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("cursor", openapi.IN_QUERY, description="Курсор следующей страницы (из поля next)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter("page_size", openapi.IN_QUERY, description="Размер страницы (до 500)",
+                              type=openapi.TYPE_INTEGER),
         ]
     )
     def list(self, request, *args, **kwargs):
@@ -276,62 +437,153 @@ class UserAnswerViewSet(viewsets.ModelViewSet):
         """Фильтруем ответы в зависимости от роли"""
         user = self.request.user
 
+        queryset = super().get_queryset()
+
         if user.role == user.Role.ADMIN:
-            return UserAnswer.objects.all()
+            return queryset
 
         if user.role in [user.Role.EXPERT, user.Role.TEACHER, user.Role.SCHOOL_ADMIN]:
-            return UserAnswer.objects.filter(user__school=user.school)
+            school_id = user_scope(user)["school_id"]
+            return queryset.filter(school_id=school_id) if school_id else queryset.none()
 
-        return UserAnswer.objects.filter(user=user)
+        return queryset.filter(user=user)
 
     def perform_create(self, serializer):
         """Запрещаем создавать ответ за другого пользователя"""
         serializer.save(user=self.request.user)
 
+    @swagger_auto_schema(manual_parameters=EXPORT_PARAMETERS)
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def export(self, request):
+        """Выгрузка ответов (с фильтрами списка) в CSV или NDJSON"""
+        return export_response(request, "answers", self.filter_queryset(self.get_queryset()))
+
+    @swagger_auto_schema(manual_parameters=[IDEMPOTENCY_PARAMETER])
     @action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+    @idempotency.idempotent
     def submit(self, request):
         """Отправка ответа пользователем"""
         serializer = SubmitAnswerSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            user = request.user
             question = serializer.validated_data["question"]
-            selected_answers = serializer.validated_data.get("selected_answers", [])
-            input_text = serializer.validated_data.get("input_text", "").strip().lower()
+            quiz_key = get_quiz_key(question.quiz)
+            user_answer = build_answer(request.user, quiz_key.get(question.pk), serializer.validated_data)
+            if submissions.is_enabled():
+                return self.enqueued(submissions.enqueue(request.user.pk, question.quiz_id,
+                                                         [serializer.validated_data]))
 
-            user_answer = UserAnswer.objects.create(
-                user=user,
-                question=question,
-                input_text=input_text if question.question_type == "input" else None,
-            )
+            # Сохраняем ответ и обновляем прогресс пользователя одним атомарным запросом
+            progress = save_answers(request.user, quiz_key, [user_answer])
 
-            if question.question_type in ["single_choice", "multiple_choice"]:
-                user_answer.selected_answers.set(selected_answers)
-                correct_answers = set(question.answers.filter(is_correct=True))
-                user_answer.is_correct = set(correct_answers) == set(selected_answers)
+            return Response({"message": "Ответ принят", "is_correct": user_answer.is_correct,
+                             "score": user_answer.score, "score_percentage": progress.score_percentage},
+                            status=status.HTTP_200_OK)
 
-            elif question.question_type == "input":
-                correct_texts = question.input_answers.first().correct_texts
-                user_answer.is_correct = input_text in [t.lower() for t in correct_texts]
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            user_answer.save()
+    @swagger_auto_schema(request_body=SubmitBatchSerializer, manual_parameters=[IDEMPOTENCY_PARAMETER])
+    @action(detail=False, methods=["post"], url_path="submit-batch",
+            permission_classes=[permissions.IsAuthenticated])
+    @idempotency.idempotent
+    def submit_batch(self, request):
+        """Отправка всех ответов попытки одним запросом"""
+        serializer = SubmitBatchSerializer(data=request.data, context={"request": request})
+        if serializer.is_valid():
+            quiz_key = get_quiz_key(serializer.validated_data["quiz"])
+            answers = build_answers(request.user, quiz_key, serializer.validated_data["answers"])
+            if submissions.is_enabled():
+                return self.enqueued(submissions.enqueue(request.user.pk, quiz_key.quiz_id,
+                                                         serializer.validated_data["answers"]))
+            progress = save_answers(request.user, quiz_key, answers)
+            return Response(attempt_result(answers, progress), status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            # Обновляем прогресс пользователя
-            progress, created = UserQuizProgress.objects.get_or_create(user=user, quiz=question.quiz)
-            progress.update_progress()
+    def enqueued(self, submission):
+        """Ответ на отправку в асинхронном режиме: ответы приняты, результат — по ссылке"""
+        return Response({
+            "message": "Ответы приняты на проверку",
+            "id": submission.id,
+            "status": submission.status,
+            "status_url": reverse("answer-submission", args=[submission.id], request=self.request),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def draft_locked():
+        """Черновик занят другим запросом того же ученика — клиент повторяет запрос"""
+        return Response({"error": "Черновик сохраняется другим запросом, повторите попытку."},
+                        status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=["get"], url_path=r"submissions/(?P<submission_id>[0-9a-f-]{36})",
+            permission_classes=[permissions.IsAuthenticated])
+    def submission(self, request, submission_id=None):
+        """Состояние асинхронной отправки ответов и результат проверки"""
+        try:
+            found = AnswerSubmission.objects.filter(pk=submission_id, user=request.user).first()
+        except DjangoValidationError:
+            found = None
+        if found is None:
+            return Response({"error": "Отправка не найдена."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(submissions.status(found))
 
-            return Response({"message": "Ответ принят", "is_correct": user_answer.is_correct},
+    @swagger_auto_schema(
+        methods=["get"],
+        manual_parameters=[
+            openapi.Parameter("quiz", openapi.IN_QUERY, description="Тест (ID)", type=openapi.TYPE_INTEGER,
+                              required=True),
+        ]
+    )
+    @swagger_auto_schema(methods=["post"], request_body=SubmitBatchSerializer)
+    @action(detail=False, methods=["get", "post"], permission_classes=[permissions.IsAuthenticated])
+    def draft(self, request):
+        """Черновик незавершенной попытки: автосохранение ответов без записи в базу"""
+        if request.method == "GET":
+            quiz_id = request.query_params.get("quiz", "")
+            if not quiz_id.isdecimal():
+                return Response({"error": "Укажите тест (quiz)."}, status=status.HTTP_400_BAD_REQUEST)
+            draft = get_draft(request.user.id, int(quiz_id))
+            return Response({"quiz": int(quiz_id), "answers": list(draft["answers"].values()) if draft else []})
+
+        serializer = SubmitBatchSerializer(data=request.data, context={"request": request})
+        if serializer.is_valid():
+            quiz = serializer.validated_data["quiz"]
+            items = serializer.validated_data["answers"]
+            build_answers(request.user, get_quiz_key(quiz), items)  # Только проверка, в базу ничего не пишется
+            try:
+                draft = save_draft(request.user.id, quiz.id, items)
+            except DraftLocked:
+                return self.draft_locked()
+            return Response({"message": "Черновик сохранен", "answers": len(draft["answers"])},
                             status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(request_body=FinishAttemptSerializer, manual_parameters=[IDEMPOTENCY_PARAMETER])
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+    @idempotency.idempotent
+    def finish(self, request):
+        """Завершение попытки: ответы из черновика проверяются и сохраняются одной транзакцией"""
+        serializer = FinishAttemptSerializer(data=request.data, context={"request": request})
+        if serializer.is_valid():
+            quiz = serializer.validated_data["quiz"]
+            try:
+                result = flush_draft(request.user.id, quiz.id, quiz=quiz)
+            except DraftLocked:
+                return self.draft_locked()
+            if not result or not result[0]:
+                return Response({"error": "Нет сохраненных ответов."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(attempt_result(*result), status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 
 class UserQuizProgressFilter(django_filters.FilterSet):
     """Фильтры для UserQuizProgress"""
-    school = django_filters.NumberFilter(field_name="user__profile__school__id", lookup_expr="exact")
-    school_class = django_filters.NumberFilter(field_name="user__profile__school_class__id", lookup_expr="exact")
-    school_class_prefix = django_filters.NumberFilter(field_name="user__profile__school_class_prefix__id", lookup_expr="exact")
-    user = django_filters.NumberFilter(field_name="user__id", lookup_expr="exact")
-    quiz = django_filters.NumberFilter(field_name="quiz__id", lookup_expr="exact")
+    school = django_filters.NumberFilter(field_name="school_id", lookup_expr="exact")
+    school_class = django_filters.NumberFilter(field_name="school_class_id", lookup_expr="exact")
+    school_class_prefix = django_filters.NumberFilter(field_name="school_class_prefix_id", lookup_expr="exact")
+    user = django_filters.NumberFilter(field_name="user_id", lookup_expr="exact")
+    quiz = django_filters.NumberFilter(field_name="quiz_id", lookup_expr="exact")
 
     class Meta:
         model = UserQuizProgress
@@ -346,6 +598,7 @@ class UserQuizProgressViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrSchoolAdmin]
     filter_backends = [DjangoFilterBackend]
     filterset_class = UserQuizProgressFilter
+    pagination_class = UserQuizProgressPagination
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -358,6 +611,10 @@ class UserQuizProgressViewSet(viewsets.ModelViewSet):
             openapi.Parameter("user", openapi.IN_QUERY, description="Фильтр по пользователю (ID)",
                               type=openapi.TYPE_INTEGER),
             openapi.Parameter("quiz", openapi.IN_QUERY, description="Фильтр по тесту (ID)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("cursor", openapi.IN_QUERY, description="Курсор следующей страницы (из поля next)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter("page_size", openapi.IN_QUERY, description="Размер страницы (до 500)",
+                              type=openapi.TYPE_INTEGER),
         ]
     )
     def list(self, request, *args, **kwargs):
@@ -367,13 +624,52 @@ class UserQuizProgressViewSet(viewsets.ModelViewSet):
         """Фильтруем прогресс пользователей в зависимости от роли"""
         user = self.request.user
 
+        queryset = super().get_queryset()
+
         if user.role == user.Role.ADMIN:
-            return UserQuizProgress.objects.all()
+            return queryset
 
         if user.role in [user.Role.EXPERT, user.Role.TEACHER, user.Role.SCHOOL_ADMIN]:
-            return UserQuizProgress.objects.filter(user__school=user.school)
+            school_id = user_scope(user)["school_id"]
+            return queryset.filter(school_id=school_id) if school_id else queryset.none()
+
+        return queryset.filter(user=user)
 
-        return UserQuizProgress.objects.filter(user=user)
+    @swagger_auto_schema(manual_parameters=EXPORT_PARAMETERS)
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def export(self, request):
+        """Выгрузка прогресса (с фильтрами списка) в CSV или NDJSON"""
+        return export_response(request, "progress", self.filter_queryset(self.get_queryset()))
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter("quiz", openapi.IN_QUERY, description="Тест (ID)", type=openapi.TYPE_INTEGER,
+                              required=True),
+        ]
+    )
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def resume(self, request):
+        """Состояние каждого вопроса теста для продолжения прохождения"""
+        quiz_id = request.query_params.get("quiz", "")
+        quiz = Quiz.objects.filter(pk=quiz_id).first() if quiz_id.isdecimal() else None
+        if quiz is None:
+            return Response({"error": "Тест не найден."}, status=status.HTTP_404_NOT_FOUND)
+
+        quiz_key = get_quiz_key(quiz)
+        drawn = pools.drawn(request.user.pk, quiz_key)
+        keys = quiz_key.subset(drawn)
+        progress = UserQuizProgress.objects.filter(user=request.user, quiz=quiz).first()
+        return Response({
+            "quiz": quiz.id,
+            "total_questions": len(keys),
+            "answered_questions": progress.answered_questions if progress else 0,
+            "correct_answers": progress.correct_answers if progress else 0,
+            "total_points": sum(k.points for k in keys),
+            "earned_points": progress.earned_points if progress else 0,
+            "score_percentage": progress.score_percentage if progress else 0.0,
+            "completed_at": progress.completed_at if progress else None,
+            "questions": question_states(progress, quiz_key, drawn),
+        })
 
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def my_progress(self, request):
@@ -381,3 +677,116 @@ class UserQuizProgressViewSet(viewsets.ModelViewSet):
         user_progress = UserQuizProgress.objects.filter(user=request.user)
         serializer = self.get_serializer(user_progress, many=True)
         return Response(serializer.data)
+
+
+class QuizRollupFilter(django_filters.FilterSet):
+    """Фильтры для сводок результатов"""
+    quiz = django_filters.NumberFilter(field_name="quiz_id", lookup_expr="exact")
+    school = django_filters.NumberFilter(field_name="school_id", lookup_expr="exact")
+    school_class = django_filters.NumberFilter(field_name="school_class_id", lookup_expr="exact")
+    school_class_prefix = django_filters.NumberFilter(field_name="school_class_prefix_id", lookup_expr="exact")
+
+    class Meta:
+        model = QuizRollup
+        fields = ["quiz", "school", "school_class", "school_class_prefix"]
+
+
+class QuizRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статистика тестов по классам и школам (только готовые сводки, без чтения ответов)"""
+    queryset = QuizRollup.objects.all()
+    serializer_class = QuizRollupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = QuizRollupFilter
+
+    def get_queryset(self):
+        """ADMIN и CONTENT_MANAGER видят все, сотрудники школы — свою школу, остальные — ничего"""
+        user = self.request.user
+        queryset = super().get_queryset()
+
+        if user.role in [user.Role.ADMIN, user.Role.CONTENT_MANAGER]:
+            return queryset
+
+        if user.role in [user.Role.EXPERT, user.Role.TEACHER, user.Role.SCHOOL_ADMIN]:
+            school_id = user_scope(user)["school_id"]
+            return queryset.filter(school_id=school_id) if school_id else queryset.none()
+
+        return queryset.none()
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter("quiz", openapi.IN_QUERY, description="Фильтр по тесту (ID)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("school", openapi.IN_QUERY, description="Фильтр по школе (ID)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter("school_class", openapi.IN_QUERY, description="Фильтр по классу (ID)",
+                              type=openapi.TYPE_INTEGER),
+            openapi.Parameter("school_class_prefix", openapi.IN_QUERY, description="Фильтр по префиксу класса (ID)",
+                              type=openapi.TYPE_INTEGER),
+        ]
+    )
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """Итог по выбранным сводкам (например, по всей школе): суммы и общая гистограмма"""
+        rows = self.filter_queryset(self.get_queryset()).values_list("attempts", "completed", "score_sum",
+                                                                    "histogram")
+        attempts = completed = 0
+        score_sum = 0.0
+        histogram = [0] * HISTOGRAM_BUCKETS
+        for row_attempts, row_completed, row_score_sum, row_histogram in rows:
+            attempts += row_attempts
+            completed += row_completed
+            score_sum += row_score_sum
+            histogram = [a + b for a, b in zip(histogram, row_histogram)]
+        return Response({
+            "groups": len(rows),
+            "attempts": attempts,
+            "completed": completed,
+            "average_score": score_sum / attempts if attempts else 0.0,
+            "histogram": histogram,
+        })
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """Рейтинги учеников по тесту: школа, город, область, вся страна"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def rows(self, rows):
+        names = {
+            user_id: f"{first_name} {last_name}".strip()
+            for user_id, first_name, last_name in User.objects.filter(id__in=[row[1] for row in rows])
+            .values_list("id", "first_name", "last_name")
+        }
+        return [{"rank": rank, "user": user_id, "name": names.get(user_id, ""), "score": score}
+                for rank, user_id, score in rows]
+
+    @swagger_auto_schema(query_serializer=LeaderboardQuerySerializer)
+    def list(self, request):
+        """Верх рейтинга (limit строк начиная с offset)"""
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        scope_id = params.get("scope_id")
+        if scope_id is None:
+            scope_id = leaderboards.school_scopes(user_scope(request.user)["school_id"]).get(params["scope"])
+            if scope_id is None:
+                return Response({"error": "Укажите scope_id: у пользователя не указана школа."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        rows = leaderboards.top(params["quiz"], params["scope"], scope_id, params["limit"], params["offset"])
+        return Response({"quiz": params["quiz"], "scope": params["scope"], "scope_id": scope_id,
+                         "results": self.rows(rows)})
+
+    @swagger_auto_schema(query_serializer=LeaderboardQuerySerializer)
+    @action(detail=False, methods=["get"])
+    def me(self, request):
+        """Место текущего пользователя и по limit соседей выше и ниже"""
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        found = leaderboards.position(params["quiz"], params["scope"], request.user.id, params["limit"])
+        if found is None:
+            return Response({"error": "Пользователь еще не участвует в рейтинге."}, status=status.HTTP_404_NOT_FOUND)
+
+        scope_id, rank, rows = found
+        return Response({"quiz": params["quiz"], "scope": params["scope"], "scope_id": scope_id, "rank": rank,
+                         "neighbours": self.rows(rows)})
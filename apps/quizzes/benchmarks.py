@@ -0,0 +1,265 @@
+"""
+Повторяемые замеры ключевых эндпоинтов API (команда benchmark_api) на синтетических данных (synthetic.py).
+
+Каждый сценарий — запрос от имени случайного синтетического пользователя:
+отправка ответа, тест для ученика, список учебников, ответы школы с
+фильтрами (учитель) и «мой прогресс». Два режима:
+
+- inprocess — запросы через тестовый клиент Django в этом же процессе,
+  считается и число SQL-запросов;
+- http — параллельные запросы к запущенному серверу (`url`), токены
+  выпускаются локально, поэтому сервер должен работать с той же базой и SECRET_KEY.
+
+Результат — задержки (p50/p90/p95/p99, мс), пропускная способность и число
+запросов к базе по сценариям; сохраняется в JSON вместе с коммитом, чтобы
+сравнивать прогоны между коммитами (compare).
+
+middleware_overhead отдельно замеряет, сколько стоят на запрос API цепочки
+FULL_MIDDLEWARE и LEAN_MIDDLEWARE (config/middleware.py) вокруг пустого представления.
+"""
+import json
+import math
+import random
+import subprocess
+import time
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from statistics import mean
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.users.models import CustomUser
+from config.middleware import Chain
+
+from .models import Answer, QuestionType, Quiz
+from .synthetic import DOMAIN, QUIZ_PREFIX
+
+PERCENTILES = (50, 90, 95, 99)
+SCENARIOS = ("submit", "quiz_retrieve", "textbook_list", "user_answers_filtered", "my_progress")
+
+
+class Context:
+    """Пользователи с токенами и тесты, на которых строятся запросы сценариев"""
+
+    def __init__(self, users=50, rng=None):
+        self.rng = rng or random.Random(1)
+        students = self._sample(CustomUser.objects.filter(email__startswith="student", email__endswith=f"@{DOMAIN}")
+                                .order_by("id").values_list("id", flat=True), users)
+        teachers = self._sample(CustomUser.objects.filter(email__startswith="teacher", email__endswith=f"@{DOMAIN}")
+                                .order_by("id").values_list("id", "profile__school"), users)
+        if not students or not teachers:
+            raise ValueError("Нет синтетических пользователей: сначала выполните seed_synthetic.")
+        self.students = [(user_id, self._token(user_id)) for user_id in students]
+        self.teachers = [(self._token(user_id), school_id) for user_id, school_id in teachers]
+        self.quiz_ids = list(Quiz.objects.filter(title__startswith=QUIZ_PREFIX).values_list("id", flat=True))
+        # Вопросы с одним выбором: (тест, вопрос, [варианты])
+        choices = {}
+        for quiz_id, question_id, answer_id in (
+                Answer.objects.filter(question__quiz_id__in=self.quiz_ids,
+                                      question__question_type=QuestionType.SINGLE_CHOICE)
+                .values_list("question__quiz_id", "question_id", "id")):
+            choices.setdefault((quiz_id, question_id), []).append(answer_id)
+        self.questions = [(quiz_id, question_id, answers) for (quiz_id, question_id), answers in choices.items()]
+
+    def _sample(self, queryset, count):
+        """Одни и те же пользователи при том же зерне и тех же данных"""
+        rows = list(queryset)
+        return self.rng.sample(rows, min(count, len(rows)))
+
+    @staticmethod
+    def _token(user_id):
+        return str(RefreshToken.for_user(CustomUser(id=user_id)).access_token)
+
+    def request(self, scenario):
+        """(метод, путь, тело, токен) очередного запроса сценария"""
+        rng = self.rng
+        _, student_token = rng.choice(self.students)
+        if scenario == "submit":
+            _, question_id, answers = rng.choice(self.questions)
+            return "post", reverse("submit-answer"), {"question": question_id,
+                                                      "selected_answers": [rng.choice(answers)]}, student_token
+        if scenario == "quiz_retrieve":
+            return "get", reverse("quiz-detail", args=[rng.choice(self.quiz_ids)]), None, student_token
+        if scenario == "textbook_list":
+            return "get", reverse("textbook-list"), None, student_token
+        if scenario == "user_answers_filtered":
+            teacher_token, school_id = rng.choice(self.teachers)
+            query = f"?school={school_id}&quiz={rng.choice(self.quiz_ids)}"
+            return "get", reverse("user-answer-list") + query, None, teacher_token
+        if scenario == "my_progress":
+            return "get", reverse("my-progress"), None, student_token
+        raise ValueError(f"Неизвестный сценарий: {scenario}")
+
+
+def percentile(values, p):
+    """Перцентиль методом ближайшего ранга по отсортированным значениям"""
+    if not values:
+        return None
+    index = max(0, min(len(values), math.ceil(p / 100 * len(values))) - 1)
+    return values[index]
+
+
+def summarize(latencies, errors, elapsed, queries=None):
+    latencies = sorted(latencies)
+    stats = {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(mean(latencies), 2) if latencies else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "queries_mean": round(mean(queries), 1) if queries else None,
+        "queries_max": max(queries) if queries else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(latencies, p)
+        stats[f"p{p}_ms"] = round(value, 2) if value is not None else None
+    return stats
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and host != "*"]
+    return hosts[0].lstrip(".") if hosts else "localhost"
+
+
+def run_inprocess(context, scenario, requests, warmup=5):
+    """Запросы через тестовый клиент: задержка без сети и число SQL-запросов на запрос"""
+    client = APIClient(HTTP_HOST=_host())
+    latencies, queries, errors = [], [], 0
+    for n in range(warmup + requests):
+        method, path, body, token = context.request(scenario)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, body, format="json")
+            latency = (time.perf_counter() - started) * 1000
+        if n < warmup:
+            continue
+        latencies.append(latency)
+        queries.append(len(captured))
+        errors += response.status_code >= 400
+    return latencies, errors, queries
+
+
+def run_http(context, scenario, requests, url, concurrency=8, warmup=5, timeout=30):
+    """Параллельные запросы к запущенному серверу по `url`"""
+    import requests as http
+
+    planned = [context.request(scenario) for _ in range(warmup + requests)]
+    session = http.Session()
+    session.mount(url, http.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def call(request):
+        method, path, body, token = request
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url.rstrip("/") + path, json=body, timeout=timeout,
+                                       headers={"Authorization": f"Bearer {token}"})
+            failed = response.status_code >= 400
+        except http.RequestException:
+            failed = True
+        return (time.perf_counter() - started) * 1000, failed
+
+    for request in planned[:warmup]:
+        call(request)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, planned[warmup:]))
+    return [latency for latency, _ in results], sum(failed for _, failed in results), None
+
+
+def middleware_overhead(requests=500, warmup=20):
+    """
+    Задержка и число SQL-запросов цепочек middleware на запрос API с токеном и cookie сессии
+    (после входа через dj-rest-auth у браузера есть и то, и другое)
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session["_auth_user_id"] = "0"
+    session.create()
+    factory = APIRequestFactory()
+    token = str(RefreshToken.for_user(CustomUser(id=0)).access_token)
+    try:
+        results = {}
+        for name, paths in (("full", settings.FULL_MIDDLEWARE), ("lean", settings.LEAN_MIDDLEWARE)):
+            chain = None
+
+            def view(request):
+                for process_view in chain.view:
+                    process_view(request, view, (), {})
+                return HttpResponse(b"{}", content_type="application/json")
+
+            chain = Chain(paths, view)
+            latencies, queries = [], []
+            for n in range(warmup + requests):
+                request = factory.get(reverse("my-progress"), HTTP_AUTHORIZATION=f"Bearer {token}")
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+                with CaptureQueriesContext(connection) as captured:
+                    request_started = time.perf_counter()
+                    chain.handler(request)
+                    latency = (time.perf_counter() - request_started) * 1000
+                if n >= warmup:
+                    latencies.append(latency)
+                    queries.append(len(captured))
+            results[name] = summarize(latencies, 0, sum(latencies) / 1000, queries)
+    finally:
+        session.delete()
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios=SCENARIOS, requests=200, mode="inprocess", url=None, concurrency=8, users=50, warmup=5,
+        random_seed=1):
+    """Прогоняет сценарии и возвращает результат для сохранения в JSON"""
+    context = Context(users, random.Random(random_seed))
+    results = {}
+    for scenario in scenarios:
+        started = time.perf_counter()
+        if mode == "http":
+            latencies, errors, queries = run_http(context, scenario, requests, url, concurrency, warmup)
+        else:
+            latencies, errors, queries = run_inprocess(context, scenario, requests, warmup)
+        results[scenario] = summarize(latencies, errors, time.perf_counter() - started, queries)
+    return {
+        "commit": current_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "url": url,
+        "concurrency": concurrency if mode == "http" else 1,
+        "requests": requests,
+        "scenarios": results,
+    }
+
+
+def save(result, directory):
+    """Сохраняет результат в `directory` как <дата>-<коммит>-<режим>.json и возвращает путь"""
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = result["created_at"].replace(":", "").replace("-", "")
+    path = directory / f"{stamp}-{result['commit'] or 'nocommit'}-{result['mode']}.json"
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+    return path
+
+
+def compare(baseline, result, metrics=("p50_ms", "p95_ms", "rps", "queries_mean")):
+    """Строки сравнения с прежним прогоном: (сценарий, метрика, было, стало, изменение в %)"""
+    rows = []
+    for scenario, stats in result["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), stats.get(metric)
+            change = round((new - old) * 100 / old, 1) if old and new is not None else None
+            rows.append((scenario, metric, old, new, change))
+    return rows
@@ -0,0 +1,150 @@
+"""
+Черновики ответов незавершенных попыток.
+
+Во время прохождения теста ответы автосохраняются только в кэш: по одному
+черновику на (пользователь, тест), последний ответ на каждый вопрос.
+В базу (UserAnswer / UserQuizProgress) ответы попадают один раз — при
+завершении попытки или автоматически, когда черновик долго не менялся
+(задача flush_expired_drafts).
+
+Время истечения каждого черновика хранится в sorted set Redis
+(QUIZ_REDIS_URL, член — ключ черновика): задача выбирает истекшие черновики
+по баллу, а автосохранение обновляет балл одной командой без общей блокировки.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import serializers
+
+from .grading import get_quiz_key
+from .models import Quiz
+from .redis_client import get_client
+from .services import build_answers, save_answers
+from .shuffling import finish_attempt
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "quizzes:drafts:expires"
+FLUSH_BATCH_SIZE = 500
+
+
+class DraftLocked(Exception):
+    """Черновик занят другим запросом дольше времени ожидания блокировки"""
+
+
+def get_draft_cache():
+    return caches[settings.QUIZ_DRAFT_CACHE]
+
+
+def get_draft_index():
+    return get_client(settings.QUIZ_REDIS_URL)
+
+
+def draft_key(user_id, quiz_id):
+    return f"quizzes:draft:{user_id}:{quiz_id}"
+
+
+class _Lock:
+    """Короткая блокировка на кэше (cache.add атомарен и в LocMem, и в Redis)"""
+
+    def __init__(self, key, timeout=30, attempts=50):
+        self.key, self.timeout, self.attempts = f"{key}:lock", timeout, attempts
+        self.acquired = False
+
+    def __enter__(self):
+        cache = get_draft_cache()
+        for _ in range(self.attempts):
+            if cache.add(self.key, 1, self.timeout):
+                self.acquired = True
+                return self
+            time.sleep(0.01)
+        raise DraftLocked(self.key)
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            get_draft_cache().delete(self.key)
+
+
+def get_draft(user_id, quiz_id):
+    return get_draft_cache().get(draft_key(user_id, quiz_id))
+
+
+def save_draft(user_id, quiz_id, items):
+    """Сохраняет ответы (поля как у AnswerDataSerializer) в черновик; последний ответ на вопрос заменяет прежний"""
+    cache = get_draft_cache()
+    key = draft_key(user_id, quiz_id)
+    now = time.time()
+    with _Lock(key):
+        draft = cache.get(key)
+        if draft is None:
+            draft = {"user": user_id, "quiz": quiz_id, "answers": {}, "created_at": now}
+        for item in items:
+            draft["answers"][str(item["question"])] = item
+        draft["updated_at"] = now
+        draft["expires_at"] = now + settings.QUIZ_DRAFT_IDLE_TIMEOUT
+        cache.set(key, draft, settings.QUIZ_DRAFT_TIMEOUT)
+        get_draft_index().zadd(INDEX_KEY, {key: draft["expires_at"]})
+    return draft
+
+
+def discard_draft(user_id, quiz_id):
+    key = draft_key(user_id, quiz_id)
+    get_draft_cache().delete(key)
+    get_draft_index().zrem(INDEX_KEY, key)
+
+
+def flush_draft(user_id, quiz_id, quiz=None):
+    """
+    Проверяет ответы черновика и сохраняет их в одной транзакции.
+    Возвращает (ответы, прогресс) или None, если черновика нет.
+    """
+    cache = get_draft_cache()
+    key = draft_key(user_id, quiz_id)
+    with _Lock(key):
+        draft = cache.get(key)
+        if not draft or not draft["answers"]:
+            cache.delete(key)
+            result = None
+        else:
+            quiz = quiz or Quiz.objects.get(pk=quiz_id)
+            quiz_key = get_quiz_key(quiz)
+            # Вопросы, удаленные из теста во время попытки, пропускаются
+            items = [item for item in draft["answers"].values() if quiz_key.get(item["question"])]
+            answers = build_answers(user_id, quiz_key, items)
+            progress = save_answers(user_id, quiz_key, answers) if answers else None
+            if progress is not None:
+                finish_attempt(user_id, quiz_id)
+            result = answers, progress
+            cache.delete(key)
+        get_draft_index().zrem(INDEX_KEY, key)
+    return result
+
+
+def flush_expired_drafts(now=None, batch_size=FLUSH_BATCH_SIZE):
+    """Сохраняет черновики, которые не менялись дольше QUIZ_DRAFT_IDLE_TIMEOUT. Возвращает их число"""
+    cache, index = get_draft_cache(), get_draft_index()
+    now = now or time.time()
+    flushed, kept = 0, 0
+    while True:
+        # Сохраненные и пропавшие черновики уходят из индекса; оставшиеся (ошибка, занят) пропускаем смещением
+        keys = index.zrangebyscore(INDEX_KEY, "-inf", now, start=kept, num=batch_size)
+        for key in keys:
+            draft = cache.get(key)
+            if draft is None:
+                index.zrem(INDEX_KEY, key)
+                continue
+            if draft["expires_at"] > now:
+                continue  # Обновлен после выборки — в индексе уже новое время
+            try:
+                if flush_draft(draft["user"], draft["quiz"]) is not None:
+                    flushed += 1
+                continue
+            except DraftLocked:
+                pass  # Ученик как раз сохраняет ответ — черновик уже не брошен
+            except (Quiz.DoesNotExist, serializers.ValidationError):
+                logger.warning("Не удалось сохранить черновик %s", key, exc_info=True)
+            kept += 1
+        if len(keys) < batch_size:
+            return flushed
@@ -0,0 +1,113 @@
+"""
+Потоковая выгрузка ответов и прогресса учеников в CSV или NDJSON.
+
+Строки читаются серверным курсором (`.iterator(chunk_size=…)`) как кортежи
+`values_list` и сразу кодируются в байты, при необходимости сжимаются gzip
+на лету. Память не зависит от размера выгрузки: в процессе держится одна
+порция строк. Используется API (action export) и командой export_quiz_results.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+
+from .models import UserAnswer, UserAnswerSelection, UserQuizProgress
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = {CSV: "text/csv", NDJSON: "application/x-ndjson"}
+
+ANSWER_COLUMNS = (
+    "id", "user_id", "quiz_id", "question_id", "school_id", "school_class_id", "school_class_prefix_id",
+    "is_correct", "score", "answered_at", "selected_answers", "selected_option_id", "input_text", "selected_values",
+    "selected_order", "selected_matching", "selected_grouping",
+)
+PROGRESS_COLUMNS = (
+    "id", "user_id", "quiz_id", "school_id", "school_class_id", "school_class_prefix_id", "total_questions",
+    "answered_questions", "correct_answers", "total_points", "earned_points", "score_percentage", "completed_at",
+)
+
+
+def answer_rows(queryset):
+    """Кортежи ANSWER_COLUMNS; выбранные варианты — массивом из подзапроса, без размножения строк"""
+    selected = UserAnswerSelection.objects.filter(useranswer_id=OuterRef("pk")).values("answer_id")
+    queryset = queryset.prefetch_related(None).annotate(selected_answer_ids=ArraySubquery(selected))
+    columns = ["selected_answer_ids" if c == "selected_answers" else c for c in ANSWER_COLUMNS]
+    return queryset.order_by("-answered_at", "-id").values_list(*columns)
+
+
+def progress_rows(queryset):
+    """Кортежи PROGRESS_COLUMNS"""
+    return queryset.prefetch_related(None).order_by("-completed_at", "-id").values_list(*PROGRESS_COLUMNS)
+
+
+EXPORTS = {
+    "answers": (UserAnswer, ANSWER_COLUMNS, answer_rows),
+    "progress": (UserQuizProgress, PROGRESS_COLUMNS, progress_rows),
+}
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def encode_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_cell(value) for value in row])
+    yield buffer.getvalue().encode()
+
+
+def encode_ndjson(columns, rows):
+    for row in rows:
+        yield (json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n").encode()
+
+
+def batched(chunks, size=64 * 1024):
+    """Склеивает мелкие куски до `size` байт: меньше вызовов записи в сокет и сжатия"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 — формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(rows, columns, output=CSV, gzip=False):
+    """Итератор байтов выгрузки; `rows` — queryset из answer_rows/progress_rows"""
+    encode = encode_ndjson if output == NDJSON else encode_csv
+    chunks = batched(encode(columns, rows.iterator(chunk_size=settings.QUIZ_EXPORT_CHUNK_SIZE)))
+    return gzipped(chunks) if gzip else chunks
+
+
+def filename(name, output=CSV, gzip=False):
+    return f"{name}.{output}{'.gz' if gzip else ''}"
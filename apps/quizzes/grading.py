@@ -0,0 +1,361 @@
+"""
+Проверка ответов по скомпилированным ключам.
+
+Ключ теста (`QuizKey`) собирается один раз на версию содержимого теста
+(`Quiz.content_version`) и хранится в памяти процесса и в общем кэше.
+Проверка ответа после этого — чистый Python без запросов к базе.
+
+Баллы за ответ — `Question.points`, умноженные на долю верного: для Ordering —
+длина наибольшей возрастающей подпоследовательности позиций (O(n log n)),
+для Matching и Grouping — число верных пар/элементов (O(n) по множествам ключа).
+Остальные типы засчитываются целиком или никак.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_DOWN
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Question, QuestionPool, QuestionType
+from .normalization import normalize, variants, within_distance
+
+# Меняется при изменении формата ключа, чтобы не читать из кэша старые объекты
+KEY_FORMAT = 5
+
+# Точность UserAnswer.score
+SCORE_QUANTUM = Decimal("0.0001")
+
+_local_keys = {}
+_local_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class AnswerKey:
+    """Правильный ответ на один вопрос"""
+    question_id: int
+    question_type: str
+    position: int = 0  # Индекс бита в UserQuizProgress
+    points: Decimal = Decimal(1)  # Вес вопроса (Question.points)
+    difficulty: int = 2  # Question.difficulty
+    options: frozenset = frozenset()  # Все варианты ответа (Single/Multiple Choice)
+    correct: frozenset = frozenset()  # Правильные варианты (Single/Multiple Choice)
+    ordering: tuple = ()  # id элементов в правильном порядке (Ordering)
+    ranks: dict = field(default_factory=dict)  # id элемента → место в правильном порядке (Ordering)
+    pairs: frozenset = frozenset()  # (левая часть, правая часть) (Matching)
+    placement: frozenset = frozenset()  # (id элемента, id группы) (Grouping)
+    blanks: tuple = ()  # (id пропуска, нормализованные допустимые тексты, допустимые опечатки) (Input)
+    selects: tuple = ()  # (id пропуска, правильный текст) (Select)
+
+
+@dataclass(frozen=True, slots=True)
+class QuizKey:
+    """Ключи всех вопросов теста для конкретной версии содержимого"""
+    quiz_id: int
+    version: int
+    questions: dict = field(default_factory=dict)
+    pool_size: int = 0  # Вопросов в выборке ученика (QuestionPool.size), 0 — все вопросы
+    strata: tuple = ()  # id вопросов по группам выборки (QuestionPool.stratify_by), по Question.position
+
+    @property
+    def total_questions(self):
+        return len(self.questions)
+
+    @property
+    def total_points(self):
+        return sum((k.points for k in self.questions.values()), Decimal(0))
+
+    def subset(self, positions=None):
+        """Ключи вопросов с позициями из `positions` (выборка ученика); None — все вопросы"""
+        if positions is None:
+            return list(self.questions.values())
+        return [k for k in self.questions.values() if k.position in positions]
+
+    @property
+    def bits_size(self):
+        """Сколько байт нужно битовым картам прогресса"""
+        return max((k.position for k in self.questions.values()), default=-1) // 8 + 1
+
+    def get(self, question_id):
+        return self.questions.get(question_id)
+
+
+def compile_question(question):
+    """Собирает ключ вопроса из уже загруженных (prefetch) дочерних объектов"""
+    question_type = question.question_type
+    data = {}
+
+    if question_type in (QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE):
+        answers = list(question.answers.all())
+        data["options"] = frozenset(a.id for a in answers)
+        data["correct"] = frozenset(a.id for a in answers if a.is_correct)
+
+    elif question_type == QuestionType.ORDERING:
+        items = sorted(question.ordering_items.all(), key=lambda i: i.order)
+        data["ordering"] = tuple(i.id for i in items)
+        data["ranks"] = {item_id: rank for rank, item_id in enumerate(data["ordering"])}
+
+    elif question_type == QuestionType.MATCHING:
+        data["pairs"] = frozenset(
+            (normalize(p.left_side), normalize(p.right_side)) for p in question.matching_pairs.all()
+        )
+
+    elif question_type == QuestionType.GROUPING:
+        data["placement"] = frozenset(
+            (item.id, group.id) for group in question.groups.all() for item in group.items.all()
+        )
+
+    elif question_type == QuestionType.INPUT:
+        # Варианты нормализованы при сохранении; пересчет — только для записей, сохраненных до этого
+        data["blanks"] = tuple(
+            (item.id, frozenset(item.input_correct_normalized or variants(item.input_correct_text)), item.max_typos)
+            for input_answer in question.input_answers.all()
+            for item in input_answer.input_answer.all()
+        )
+
+    elif question_type == QuestionType.SELECT:
+        data["selects"] = tuple(
+            (item.id, normalize(item.select_correct_text))
+            for option in question.select_options.all()
+            for item in option.select_option.all()
+        )
+
+    return AnswerKey(question_id=question.id, question_type=question_type, position=question.position,
+                     points=Decimal(str(question.points)), difficulty=question.difficulty, **data)
+
+
+def compile_quiz(quiz_id, version):
+    """Загружает вопросы теста со всеми дочерними объектами и собирает ключ"""
+    questions = Question.objects.filter(quiz_id=quiz_id).prefetch_related(
+        "answers", "ordering_items", "matching_pairs", "groups__items",
+        "input_answers__input_answer", "select_options__select_option",
+    )
+    questions = list(questions)
+    _assign_positions(quiz_id, questions)
+    pool = QuestionPool.objects.filter(quiz_id=quiz_id).first()
+    strata = {}
+    if pool:
+        for question in sorted(questions, key=lambda q: q.position):
+            label = getattr(question, pool.stratify_by) if pool.stratify_by else ""
+            strata.setdefault(label, []).append(question.id)
+    return QuizKey(
+        quiz_id=quiz_id,
+        version=version,
+        questions={q.id: compile_question(q) for q in questions},
+        pool_size=pool.size if pool else 0,
+        strata=tuple((label, tuple(ids)) for label, ids in sorted(strata.items(), key=lambda s: str(s[0]))),
+    )
+
+
+def _assign_positions(quiz_id, questions):
+    """Нумерует вопросы, созданные до появления Question.position (один раз)"""
+    missing = [q for q in questions if q.position is None]
+    if not missing:
+        return
+    position = max((q.position for q in questions if q.position is not None), default=-1)
+    for question in sorted(missing, key=lambda q: q.id):
+        position += 1
+        question.position = position
+    Question.objects.bulk_update(missing, ["position"])
+
+
+def _cache_key(quiz_id, version):
+    return f"quizzes:answer-key:{KEY_FORMAT}:{quiz_id}:{version}"
+
+
+def get_quiz_key(quiz):
+    """
+    Возвращает ключ теста: память процесса → общий кэш → сборка из базы.
+    Версия берется из `quiz.content_version`, поэтому устаревший ключ не используется.
+    """
+    version = quiz.content_version
+    quiz_key = _local_keys.get(quiz.pk)
+    if quiz_key is not None and quiz_key.version == version:
+        return quiz_key
+
+    cache_key = _cache_key(quiz.pk, version)
+    quiz_key = cache.get(cache_key)
+    if quiz_key is None:
+        quiz_key = compile_quiz(quiz.pk, version)
+        cache.set(cache_key, quiz_key, settings.QUIZ_ANSWER_KEY_TIMEOUT)
+
+    with _local_lock:
+        if len(_local_keys) >= settings.QUIZ_ANSWER_KEY_LOCAL_SIZE:
+            _local_keys.pop(next(iter(_local_keys)))
+        _local_keys[quiz.pk] = quiz_key
+    return quiz_key
+
+
+def get_answer_key(question):
+    """Ключ одного вопроса (вопрос должен быть загружен с select_related("quiz"))"""
+    return get_quiz_key(question.quiz).get(question.pk)
+
+
+def _pk(value):
+    return getattr(value, "pk", value)
+
+
+def _pair(value):
+    """Пара Matching из {"left_side": .., "right_side": ..}, {"left": .., "right": ..} или [left, right]"""
+    if isinstance(value, dict):
+        left = value.get("left_side", value.get("left"))
+        right = value.get("right_side", value.get("right"))
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        left, right = value
+    else:
+        return None
+    return normalize(left), normalize(right)
+
+
+def _placements(value):
+    """Размещение Grouping из {"group": id, "items": [id, ...]} или {"group": id, "item": id}"""
+    if not isinstance(value, dict):
+        return []
+    group = value.get("group")
+    items = value.get("items", [value.get("item")])
+    return [(int(item), int(group)) for item in items if item is not None and group is not None]
+
+
+def _values(key_items, data):
+    """Ответы по пропускам: {id пропуска: текст}; `input_text` заполняет первый пропуск"""
+    values = {str(k): v for k, v in (data.get("selected_values") or {}).items()}
+    if not values and data.get("input_text") and key_items:
+        values[str(key_items[0][0])] = data["input_text"]
+    return values
+
+
+def _grade_choice(key, data):
+    selected = {_pk(a) for a in data.get("selected_answers") or []}
+    if key.question_type == QuestionType.SINGLE_CHOICE and len(selected) != 1:
+        return False
+    return bool(key.correct) and selected == key.correct
+
+
+def _grade_ordering(key, data):
+    return bool(key.ordering) and tuple(data.get("selected_order") or ()) == key.ordering
+
+
+def _grade_matching(key, data):
+    submitted = data.get("selected_matching") or []
+    pairs = {_pair(p) for p in submitted}
+    return bool(key.pairs) and len(submitted) == len(key.pairs) and pairs == key.pairs
+
+
+def _submitted_placement(data):
+    try:
+        return [p for value in data.get("selected_grouping") or [] for p in _placements(value)]
+    except (TypeError, ValueError):
+        return None
+
+
+def _grade_grouping(key, data):
+    placement = _submitted_placement(data)
+    return (bool(key.placement) and placement is not None and len(placement) == len(key.placement)
+            and set(placement) == key.placement)
+
+
+def _matches(value, accepted, max_typos):
+    """Точное совпадение — поиск в множестве; с опечатками — ограниченное расстояние до каждого варианта"""
+    return value in accepted or (max_typos > 0 and bool(value)
+                                 and any(within_distance(value, v, max_typos) for v in accepted))
+
+
+def _grade_input(key, data):
+    values = _values(key.blanks, data)
+    return bool(key.blanks) and all(
+        _matches(normalize(values.get(str(blank_id))), accepted, max_typos)
+        for blank_id, accepted, max_typos in key.blanks
+    )
+
+
+def _grade_select(key, data):
+    values = _values(key.selects, data)
+    return bool(key.selects) and all(
+        normalize(values.get(str(item_id))) == correct for item_id, correct in key.selects
+    )
+
+
+_GRADERS = {
+    QuestionType.SINGLE_CHOICE: _grade_choice,
+    QuestionType.MULTIPLE_CHOICE: _grade_choice,
+    QuestionType.ORDERING: _grade_ordering,
+    QuestionType.MATCHING: _grade_matching,
+    QuestionType.GROUPING: _grade_grouping,
+    QuestionType.INPUT: _grade_input,
+    QuestionType.SELECT: _grade_select,
+}
+
+
+def grade(key, data):
+    """Проверяет ответ (поля как у SubmitAnswerSerializer) по ключу вопроса"""
+    grader = _GRADERS.get(key.question_type)
+    return bool(grader and grader(key, data))
+
+
+def _longest_increasing(values):
+    """Длина наибольшей строго возрастающей подпоследовательности (O(n log n))"""
+    tails = []
+    for value in values:
+        index = bisect_left(tails, value)
+        if index == len(tails):
+            tails.append(value)
+        else:
+            tails[index] = value
+    return len(tails)
+
+
+def _credit_ordering(key, data):
+    """Элементы, стоящие в правильном порядке относительно друг друга; лишние элементы уменьшают долю"""
+    submitted = list(data.get("selected_order") or ())
+    ranks = [key.ranks[item] for item in submitted if item in key.ranks]
+    return _longest_increasing(ranks), max(len(key.ordering), len(submitted))
+
+
+def _unique_hits(submitted, expected):
+    """Верные пары (a, b), у которых a указан один раз: несколько ответов на один элемент не засчитываются"""
+    counts = Counter(a for a, _ in submitted)
+    return len({pair for pair in submitted if counts[pair[0]] == 1 and pair in expected}), len(counts)
+
+
+def _credit_matching(key, data):
+    submitted = [pair for pair in map(_pair, data.get("selected_matching") or []) if pair]
+    hits, lefts = _unique_hits(submitted, key.pairs)
+    return hits, max(len(key.pairs), lefts)
+
+
+def _credit_grouping(key, data):
+    placement = _submitted_placement(data)
+    if placement is None:
+        return 0, 1
+    hits, items = _unique_hits(placement, key.placement)
+    return hits, max(len(key.placement), items)
+
+
+_PARTIAL = {
+    QuestionType.ORDERING: _credit_ordering,
+    QuestionType.MATCHING: _credit_matching,
+    QuestionType.GROUPING: _credit_grouping,
+}
+
+
+def score(key, data, is_correct=None):
+    """Баллы за ответ: все `points` за верный, доля — за частично верный, иначе 0"""
+    if is_correct is None:
+        is_correct = grade(key, data)
+    if is_correct:
+        return key.points
+    partial = _PARTIAL.get(key.question_type)
+    if partial is None:
+        return Decimal(0)
+    hits, total = partial(key, data)
+    if not hits or not total:
+        return Decimal(0)
+    return (key.points * hits / total).quantize(SCORE_QUANTUM, ROUND_DOWN)
+
+
+def evaluate(key, data):
+    """(верен ли ответ, баллы за него)"""
+    is_correct = grade(key, data)
+    return is_correct, score(key, data, is_correct)
@@ -0,0 +1,109 @@
+"""
+Повторы отправки ответов с заголовком Idempotency-Key.
+
+Клиент, не дождавшийся ответа, повторяет запрос с тем же ключом и получает
+сохраненный ответ: ответы не проверяются и не записываются второй раз.
+
+Запрос сначала занимает ключ — INSERT … ON CONFLICT DO NOTHING в той же
+транзакции, что и запись ответов. Одновременный дубль ждет на уникальном
+индексе, пока первый запрос не завершится, и затем читает его результат; если
+первый запрос откатился, ключ свободен и дубль выполняется сам. Готовые ответы
+кэшируются на QUIZ_IDEMPOTENCY_CACHE_TIMEOUT, чтобы частые повторы не ходили в базу.
+Если запрос завершился исключением или ошибкой сервера (5xx), ключ освобождается
+вместе с откатом транзакции — такой запрос можно повторить.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _cache_key(user_id, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"quizzes:idempotency:{user_id}:{digest}"
+
+
+def fingerprint(request):
+    """Хеш запроса: тот же ключ с другим телом — ошибка клиента, а не повтор"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim(user_id, key, request_fingerprint):
+    """Занимает ключ; False — ключ уже занят (при гонке — после завершения первого запроса)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {IdempotencyRecord._meta.db_table} (user_id, key, fingerprint, created_at)
+            VALUES (%s, %s, %s, now())
+            ON CONFLICT (user_id, key) DO NOTHING
+            RETURNING id
+        """, [user_id, key, request_fingerprint])
+        return cursor.fetchone() is not None
+
+
+def _replay(stored, request_fingerprint):
+    stored_fingerprint, status_code, data = stored
+    if stored_fingerprint != request_fingerprint:
+        return Response({"error": "Ключ идемпотентности уже использован для другого запроса."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(data, status=status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(view):
+    """Декоратор действия ViewSet: без заголовка Idempotency-Key запрос выполняется как обычно"""
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"Ключ идемпотентности длиннее {MAX_KEY_LENGTH} символов."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user_id, request_fingerprint = request.user.pk, fingerprint(request)
+        cache_key = _cache_key(user_id, key)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored, request_fingerprint)
+
+        with transaction.atomic():
+            if not _claim(user_id, key, request_fingerprint):
+                stored = (IdempotencyRecord.objects.filter(user_id=user_id, key=key)
+                          .values_list("fingerprint", "status_code", "response").get())
+                cache.set(cache_key, stored, settings.QUIZ_IDEMPOTENCY_CACHE_TIMEOUT)
+                return _replay(stored, request_fingerprint)
+
+            response = view(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+            # Храним данные в том виде, в каком их получил клиент (Decimal → число и т.п.)
+            data = json.loads(JSONRenderer().render(response.data) or "null")
+            IdempotencyRecord.objects.filter(user_id=user_id, key=key).update(
+                status_code=response.status_code, response=data)
+            stored = (request_fingerprint, response.status_code, data)
+            transaction.on_commit(lambda: cache.set(cache_key, stored, settings.QUIZ_IDEMPOTENCY_CACHE_TIMEOUT))
+        return response
+
+    return wrapper
+
+
+def prune(ttl=None):
+    """Удаляет записи старше QUIZ_IDEMPOTENCY_TTL. Возвращает число удаленных"""
+    ttl = settings.QUIZ_IDEMPOTENCY_TTL if ttl is None else ttl
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl)).delete()
+    return deleted
@@ -0,0 +1,252 @@
+"""
+Импорт и экспорт теста целиком (формат обмена).
+
+JSON: {"version": 1, "title", "description", "shuffle", "pool": {"size", "stratify_by"} | null,
+"questions": [{"text", "question_type", "points", "difficulty",
+"answers" | "ordering_items" | "matching_pairs" | "groups" (+ "items") | "input_answers"
+(+ "items") | "select_options" (+ "items")}]} — см. QuizTreeSerializer. Без "shuffle" и
+"pool" импортируется тест с перемешиванием и без пула.
+
+Табличный вариант (CSV/XLSX через tablib): одна строка на объект, колонка kind —
+тип объекта, question — номер вопроса в файле, parent — номер группы/поля
+ввода/списка внутри вопроса для их элементов. Списки в ячейках — JSON.
+Перемешивание и пул — в колонках shuffle, pool_size и stratify_by строки quiz.
+
+Импорт проверяет файл целиком до записи и создает каждый уровень дерева одним
+bulk_create в одной транзакции. Экспорт читает тест постоянным числом запросов.
+"""
+import json
+
+import tablib
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .api.serializers import QUIZ_PREFETCH, QuestionPoolSerializer, QuizTreeSerializer, TreeQuestionSerializer
+from .models import (
+    Quiz, Question, Difficulty, Answer, OrderingItem, MatchingPair, Group, GroupItem,
+    InputAnswer, InputAnswerItem, SelectOption, SelectOptionItem, QuestionPool
+)
+
+VERSION = 1
+JSON = "json"
+CSV = "csv"
+XLSX = "xlsx"
+FORMATS = {
+    JSON: "application/json",
+    CSV: "text/csv",
+    XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+COLUMNS = ("kind", "question", "parent", "text", "description", "question_type", "points", "difficulty",
+           "is_correct", "order", "left_side", "right_side", "number", "placeholder", "correct_text", "options",
+           "max_typos", "shuffle", "pool_size", "stratify_by")
+
+# kind строки → (список в вопросе, поля {колонка: поле}); для элементов — список в родителе
+QUESTION_ROWS = {
+    "answer": ("answers", {"text": "text", "is_correct": "is_correct"}),
+    "ordering_item": ("ordering_items", {"text": "text", "order": "order"}),
+    "matching_pair": ("matching_pairs", {"left_side": "left_side", "right_side": "right_side"}),
+    "group": ("groups", {"text": "name"}),
+    "input_answer": ("input_answers", {"text": "text"}),
+    "select_option": ("select_options", {"text": "text"}),
+}
+ITEM_ROWS = {
+    "group_item": ("groups", {"text": "text"}),
+    "input_answer_item": ("input_answers", {"number": "number", "placeholder": "input_placeholder",
+                                            "correct_text": "input_correct_text", "max_typos": "max_typos"}),
+    "select_option_item": ("select_options", {"number": "number", "placeholder": "select_placeholder",
+                                              "correct_text": "select_correct_text",
+                                              "options": "select_option_text"}),
+}
+LIST_FIELDS = {"input_correct_text", "select_option_text"}
+
+
+def format_of(filename):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension not in FORMATS:
+        raise serializers.ValidationError({"file": "Поддерживаются файлы .json, .csv и .xlsx."})
+    return extension
+
+
+def load_quiz(quiz_id):
+    """Тест со всем деревом: постоянное число запросов при любом числе вопросов"""
+    questions = Prefetch("questions", queryset=Question.objects.order_by("position", "id"))
+    return Quiz.objects.select_related("pool").prefetch_related(questions, *QUIZ_PREFETCH).get(pk=quiz_id)
+
+
+def dump(quiz):
+    """Дерево теста (quiz — из load_quiz)"""
+    return {"version": VERSION, **QuizTreeSerializer(quiz).data}
+
+
+def iter_json(quiz):
+    """JSON теста по частям: вопросы сериализуются по одному по мере отправки"""
+    pool = getattr(quiz, "pool", None)
+    head = json.dumps({"version": VERSION, "title": quiz.title, "description": quiz.description,
+                       "shuffle": quiz.shuffle, "pool": QuestionPoolSerializer(pool).data if pool else None},
+                      ensure_ascii=False)
+    yield f'{head[:-1]}, "questions": ['.encode()
+    for index, question in enumerate(quiz.questions.all()):
+        data = json.dumps(TreeQuestionSerializer(question).data, ensure_ascii=False)
+        yield f"{', ' if index else ''}{data}".encode()
+    yield b"]}"
+
+
+def _cell(value):
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+
+
+def to_dataset(tree):
+    """Дерево теста → tablib.Dataset (одна строка на объект)"""
+    dataset = tablib.Dataset(headers=COLUMNS)
+
+    def add(kind, question="", parent="", **values):
+        dataset.append([kind, question, parent] + [_cell(values.get(column, "")) for column in COLUMNS[3:]])
+
+    pool = tree.get("pool") or {}
+    add("quiz", text=tree["title"], description=tree.get("description") or "", shuffle=tree.get("shuffle", ""),
+        pool_size=pool.get("size", ""), stratify_by=pool.get("stratify_by", ""))
+    for number, question in enumerate(tree["questions"], start=1):
+        add("question", number, text=question["text"], question_type=question["question_type"],
+            points=question.get("points", ""), difficulty=question.get("difficulty", ""))
+        for kind, (name, fields) in QUESTION_ROWS.items():
+            item_kind = next((k for k, (parent_name, _) in ITEM_ROWS.items() if parent_name == name), None)
+            for parent, child in enumerate(question.get(name) or [], start=1):
+                add(kind, number, **{column: child[field] for column, field in fields.items()})
+                for item in child.get("items") or []:
+                    add(item_kind, number, parent,
+                        **{column: item[field] for column, field in ITEM_ROWS[item_kind][1].items()})
+    return dataset
+
+
+def _value(field, value):
+    if value is None:
+        return [] if field in LIST_FIELDS else ""
+    if field in LIST_FIELDS:
+        value = str(value).strip()
+        if not value:
+            return []
+        try:
+            return json.loads(value) if value.startswith("[") else [value]
+        except ValueError:
+            raise ValueError(f"Неверный список: {value}")
+    return value
+
+
+def from_dataset(dataset):
+    """tablib.Dataset → дерево теста (проверка значений — в QuizTreeSerializer)"""
+    missing = {"kind", "question", "text"} - set(dataset.headers or [])
+    if missing:
+        raise serializers.ValidationError({"file": f"Нет колонок: {', '.join(sorted(missing))}."})
+    tree, questions = {"questions": []}, {}
+    for line, row in enumerate(dataset.dict, start=2):
+        kind = str(row.get("kind") or "").strip()
+        number = str(row.get("question") or "").strip()
+        try:
+            if kind == "quiz":
+                tree["title"] = _value("title", row.get("text"))
+                tree["description"] = _value("description", row.get("description"))
+                shuffle = _value("shuffle", row.get("shuffle"))
+                if shuffle != "":
+                    tree["shuffle"] = shuffle
+                size = _value("size", row.get("pool_size"))
+                if size != "":
+                    tree["pool"] = {"size": size, "stratify_by": _value("stratify_by", row.get("stratify_by"))}
+            elif kind == "question":
+                if number in questions:
+                    raise ValueError(f"Вопрос {number} уже объявлен.")
+                questions[number] = {"text": _value("text", row.get("text")),
+                                     "question_type": _value("question_type", row.get("question_type"))}
+                for field in ("points", "difficulty"):
+                    value = _value(field, row.get(field))
+                    if value != "":
+                        questions[number][field] = value
+                tree["questions"].append(questions[number])
+            elif kind in QUESTION_ROWS or kind in ITEM_ROWS:
+                if number not in questions:
+                    raise ValueError(f"Вопрос {number} не объявлен выше.")
+                if kind in QUESTION_ROWS:
+                    name, fields = QUESTION_ROWS[kind]
+                    target = questions[number].setdefault(name, [])
+                else:
+                    name, fields = ITEM_ROWS[kind]
+                    parents = questions[number].get(name) or []
+                    parent = str(row.get("parent") or "").strip()
+                    if not parent.isdigit() or not 1 <= int(parent) <= len(parents):
+                        raise ValueError(f"Нет родителя {parent} для {kind}.")
+                    target = parents[int(parent) - 1].setdefault("items", [])
+                # Пустые ячейки не передаются: для поля берется значение по умолчанию модели
+                values = {field: _value(field, row.get(column)) for column, field in fields.items()}
+                target.append({field: value for field, value in values.items() if value != ""})
+            else:
+                raise ValueError(f"Неизвестный тип строки: {kind}.")
+        except ValueError as e:
+            raise serializers.ValidationError({"file": f"Строка {line}: {e}"})
+    return tree
+
+
+def export_table(quiz, output):
+    """CSV (строка) или XLSX (байты) теста; quiz — из load_quiz. Без openpyxl XLSX недоступен"""
+    return to_dataset(dump(quiz)).export(output)
+
+
+def parse(content, output):
+    """Содержимое файла → дерево теста"""
+    try:
+        if output == JSON:
+            return json.loads(content)
+        return from_dataset(tablib.Dataset().load(content.decode("utf-8-sig") if output == CSV else content,
+                                                  format=output))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise serializers.ValidationError({"file": f"Не удалось прочитать файл: {e}"})
+    except tablib.UnsupportedFormat:
+        raise serializers.ValidationError({"file": f"Формат {output} недоступен на сервере."})
+
+
+def import_quiz(data):
+    """
+    Проверяет дерево теста целиком и создает новый тест.
+    Ошибки — serializers.ValidationError; в базу ничего не пишется, пока весь файл не проверен.
+    """
+    serializer = QuizTreeSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    tree = serializer.validated_data
+
+    with transaction.atomic():
+        quiz = Quiz.objects.create(title=tree["title"], description=tree.get("description"),
+                                   shuffle=tree.get("shuffle", Quiz._meta.get_field("shuffle").default))
+        if tree.get("pool"):
+            QuestionPool.objects.create(quiz=quiz, **tree["pool"])
+        questions = Question.objects.bulk_create(
+            Question(quiz=quiz, text=q["text"], question_type=q["question_type"], points=q.get("points", 1),
+                     difficulty=q.get("difficulty", Difficulty.MEDIUM), position=position)
+            for position, q in enumerate(tree["questions"])
+        )
+        pairs = list(zip(questions, tree["questions"]))
+
+        def children(model, name):
+            return [model(question=question, **child) for question, data in pairs for child in data.get(name, [])]
+
+        def level(model, name, parent_field, items_field, item_model):
+            """Создает объекты уровня, затем их элементы со ссылками на уже созданных родителей"""
+            parents, sources = [], []
+            for question, data in pairs:
+                for child in data.get(name, []):
+                    fields = {k: v for k, v in child.items() if k != items_field}
+                    parents.append(model(question=question, **fields))
+                    sources.append(child.get(items_field, []))
+            parents = model.objects.bulk_create(parents)
+            items = [item_model(**{parent_field: parent}, **item) for parent, items in zip(parents, sources)
+                     for item in items]
+            if item_model is InputAnswerItem:
+                items = [item.normalize() for item in items]
+            item_model.objects.bulk_create(items)
+
+        Answer.objects.bulk_create(children(Answer, "answers"))
+        OrderingItem.objects.bulk_create(children(OrderingItem, "ordering_items"))
+        MatchingPair.objects.bulk_create(children(MatchingPair, "matching_pairs"))
+        level(Group, "groups", "group", "items", GroupItem)
+        level(InputAnswer, "input_answers", "inputAnswer", "input_answer", InputAnswerItem)
+        level(SelectOption, "select_options", "selectOption", "select_option", SelectOptionItem)
+    return quiz
@@ -0,0 +1,155 @@
+"""
+Рейтинги учеников по тестам: школа, город, область и вся страна.
+
+Баллы хранятся уже отсортированными в sorted sets Redis (QUIZ_REDIS_URL):
+топ, место ученика (ZREVRANK) и соседи по рейтингу — O(log n) без сортировки
+прогресса и подсчета строк выше ученика. При равных баллах выше тот, чей id
+больше в строковом порядке (порядок членов в Redis). В тестах (memory://)
+рейтинги хранятся в MemoryRedis. Рейтинг обновляется при каждой отправке
+ответов (services.save_answers), удаленный прогресс убирается из всех
+рейтингов теста (signals.progress_deleted). Запись в Redis идет после
+фиксации транзакции, ее ошибка только пишется в лог; пропущенные обновления
+исправляет команда rebuild_leaderboards, пересобирая рейтинги из UserQuizProgress.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.education.models import School
+from .models import LeaderboardScope, UserQuizProgress
+from .redis_client import get_client
+
+SCHOOL_SCOPES_TIMEOUT = 60 * 60
+
+_backend = None
+
+
+def school_scopes(school_id):
+    """{область рейтинга: id} для ученика школы; город и область берутся из School → City"""
+    scopes = {LeaderboardScope.NATIONAL: 0}
+    if not school_id:
+        return scopes
+    key = f"quizzes:leaderboard:school:{school_id}"
+    parents = cache.get(key)
+    if parents is None:
+        parents = School.objects.filter(pk=school_id).values_list("city_id", "city__region_id").first()
+        parents = tuple(parents or (None, None))
+        cache.set(key, parents, SCHOOL_SCOPES_TIMEOUT)
+    city_id, region_id = parents
+    scopes[LeaderboardScope.SCHOOL] = school_id
+    if city_id:
+        scopes[LeaderboardScope.CITY] = city_id
+    if region_id:
+        scopes[LeaderboardScope.REGION] = region_id
+    return scopes
+
+
+class RedisLeaderboard:
+    """Рейтинги в sorted sets Redis: ключ на (тест, область, id), член — id ученика"""
+
+    def __init__(self, url):
+        self.client = get_client(url)
+        self.prefix = "quizzes:leaderboard"
+
+    def _key(self, quiz_id, scope, scope_id):
+        return f"{self.prefix}:{quiz_id}:{scope}:{scope_id}"
+
+    def _user_key(self, quiz_id, user_id):
+        return f"{self.prefix}:{quiz_id}:user:{user_id}"
+
+    def update(self, quiz_id, user_id, score, scopes):
+        # Redis вне транзакции базы: пишем только после фиксации ответов, ошибка Redis не отменяет ответ
+        transaction.on_commit(lambda: self._update(quiz_id, user_id, score, scopes), robust=True)
+
+    def _update(self, quiz_id, user_id, score, scopes):
+        user_key = self._user_key(quiz_id, user_id)
+        previous = self.client.hgetall(user_key)
+        pipe = self.client.pipeline()
+        for scope, scope_id in previous.items():
+            if str(scopes.get(scope)) != scope_id:
+                pipe.zrem(self._key(quiz_id, scope, scope_id), user_id)
+        for scope, scope_id in scopes.items():
+            pipe.zadd(self._key(quiz_id, scope, scope_id), {user_id: score})
+        pipe.delete(user_key)
+        pipe.hset(user_key, mapping={str(scope): scope_id for scope, scope_id in scopes.items()})
+        pipe.execute()
+
+    def remove(self, quiz_id, user_id, scopes):
+        transaction.on_commit(lambda: self._remove(quiz_id, user_id, scopes), robust=True)
+
+    def _remove(self, quiz_id, user_id, scopes):
+        user_key = self._user_key(quiz_id, user_id)
+        scopes = {**{str(scope): scope_id for scope, scope_id in scopes.items()}, **self.client.hgetall(user_key)}
+        pipe = self.client.pipeline()
+        for scope, scope_id in scopes.items():
+            pipe.zrem(self._key(quiz_id, scope, scope_id), user_id)
+        pipe.delete(user_key)
+        pipe.execute()
+
+    def top(self, quiz_id, scope, scope_id, limit, offset=0):
+        rows = self.client.zrevrange(self._key(quiz_id, scope, scope_id), offset, offset + limit - 1,
+                                     withscores=True)
+        return [(int(user_id), score) for user_id, score in rows]
+
+    def around(self, quiz_id, scope, user_id, count):
+        scope_id = self.client.hget(self._user_key(quiz_id, user_id), str(scope))
+        if scope_id is None:
+            return None
+        key = self._key(quiz_id, scope, scope_id)
+        rank = self.client.zrevrank(key, user_id)
+        if rank is None:
+            return None
+        rows = self.client.zrevrange(key, max(rank - count, 0), rank + count, withscores=True)
+        return int(scope_id), rank + 1, [(int(member), score) for member, score in rows]
+
+    def rebuild(self, quiz_id=None, chunk_size=5000):
+        pattern = f"{self.prefix}:{quiz_id or '*'}:*"
+        for key in self.client.scan_iter(pattern, count=chunk_size):
+            self.client.unlink(key)
+        progress = UserQuizProgress.objects.values_list("quiz_id", "user_id", "school_id", "score_percentage")
+        if quiz_id:
+            progress = progress.filter(quiz_id=quiz_id)
+        total, pipe = 0, self.client.pipeline(transaction=False)
+        for total, (quiz, user_id, school_id, score) in enumerate(progress.iterator(chunk_size), start=1):
+            scopes = school_scopes(school_id)
+            for scope, scope_id in scopes.items():
+                pipe.zadd(self._key(quiz, scope, scope_id), {user_id: score})
+            pipe.hset(self._user_key(quiz, user_id), mapping={str(s): i for s, i in scopes.items()})
+            if total % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+        return total
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = RedisLeaderboard(settings.QUIZ_REDIS_URL)
+    return _backend
+
+
+def record(progress):
+    """Обновляет место ученика во всех рейтингах теста по новому прогрессу"""
+    get_backend().update(progress.quiz_id, progress.user_id, progress.score_percentage,
+                         school_scopes(progress.school_id))
+
+
+def discard(progress):
+    """Убирает ученика из всех рейтингов теста (прогресс удален)"""
+    get_backend().remove(progress.quiz_id, progress.user_id, school_scopes(progress.school_id))
+
+
+def top(quiz_id, scope, scope_id, limit, offset=0):
+    """[(место, id ученика, балл)] начиная с offset"""
+    rows = get_backend().top(quiz_id, scope, scope_id, limit, offset)
+    return [(offset + index, user_id, score) for index, (user_id, score) in enumerate(rows, start=1)]
+
+
+def position(quiz_id, scope, user_id, count=5):
+    """Место ученика и по `count` соседей сверху и снизу: (id области, место, [(место, id, балл)]) или None"""
+    found = get_backend().around(quiz_id, scope, user_id, count)
+    if found is None:
+        return None
+    scope_id, rank, rows = found
+    first = rank - next(i for i, (row_user, _) in enumerate(rows) if row_user == user_id)
+    return scope_id, rank, [(first + i, row_user, score) for i, (row_user, score) in enumerate(rows)]
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quizzes import partitions
+
+# python manage.py archive_answer_partitions --retention-months 12 --output-dir /var/backups/answers
+
+class Command(BaseCommand):
+    help = "Выгружает секции ответов старше срока хранения в .csv.gz и удаляет их из базы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-months", type=int, default=12, help="Сколько полных месяцев хранить в базе")
+        parser.add_argument("--output-dir", required=True, help="Каталог для архивных файлов")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError("Таблицы ответов не секционированы (см. create_answer_partitions --convert)")
+        try:
+            archived = partitions.archive_partitions(options["retention_months"], options["output_dir"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for path in archived:
+            self.stdout.write(path)
+        self.stdout.write(self.style.SUCCESS(f"Секций выгружено: {len(archived)}"))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from apps.quizzes.models import Question, UserAnswer, UserQuizProgress
+from apps.users.models import UserProfile
+
+# python manage.py backfill_answer_scopes --batch-size 20000
+
+class Command(BaseCommand):
+    help = "Заполняет тест, школу и класс в UserAnswer и UserQuizProgress (для записей, созданных до этих полей)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000, help="Сколько id обрабатывать за транзакцию")
+        parser.add_argument("--sleep", type=float, default=0, help="Пауза между пачками, секунд")
+
+    def handle(self, *args, **options):
+        answers = UserAnswer._meta.db_table
+        progress = UserQuizProgress._meta.db_table
+        questions = Question._meta.db_table
+        profiles = UserProfile._meta.db_table
+
+        # Старые ответы узнаются по пустому quiz_id; повторный запуск продолжает с места остановки
+        updated = self.backfill(UserAnswer, options, f"""
+            UPDATE {answers} AS a
+            SET quiz_id = q.quiz_id,
+                (school_id, school_class_id, school_class_prefix_id) = (
+                    SELECT pr.school_id, pr.school_class_id, pr.school_class_prefix_id
+                    FROM {profiles} AS pr WHERE pr.user_id = a.user_id
+                )
+            FROM {questions} AS q
+            WHERE q.id = a.question_id AND a.quiz_id IS NULL AND a.id >= %s AND a.id < %s
+        """)
+        self.stdout.write(self.style.SUCCESS(f"Ответов обновлено: {updated}"))
+
+        # Прогресс всегда один на (пользователь, тест) — сверяем с текущим профилем
+        updated = self.backfill(UserQuizProgress, options, f"""
+            UPDATE {progress} AS p
+            SET school_id = pr.school_id, school_class_id = pr.school_class_id,
+                school_class_prefix_id = pr.school_class_prefix_id
+            FROM {profiles} AS pr
+            WHERE pr.user_id = p.user_id AND p.id >= %s AND p.id < %s
+              AND (p.school_id IS DISTINCT FROM pr.school_id
+                   OR p.school_class_id IS DISTINCT FROM pr.school_class_id
+                   OR p.school_class_prefix_id IS DISTINCT FROM pr.school_class_prefix_id)
+        """)
+        self.stdout.write(self.style.SUCCESS(f"Записей прогресса обновлено: {updated}"))
+
+    def backfill(self, model, options, sql):
+        """Выполняет UPDATE по диапазонам id, каждый диапазон — отдельная короткая транзакция"""
+        bounds = model.objects.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            return 0
+        total, batch_size = 0, options["batch_size"]
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [start, start + batch_size])
+                total += cursor.rowcount
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{model.__name__}: id до {start + batch_size}, обновлено {total}")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        return total
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.quizzes import benchmarks
+
+# python manage.py benchmark_api --requests 500
+# python manage.py benchmark_api --mode http --url http://localhost:8000 --concurrency 16 --compare benchmarks/prev.json
+# python manage.py benchmark_api --middleware --requests 1000
+
+class Command(BaseCommand):
+    help = "Замеряет задержки, пропускную способность и число запросов к базе ключевых эндпоинтов API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=benchmarks.SCENARIOS,
+                            help="Сценарий (можно несколько раз); по умолчанию — все")
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+        parser.add_argument("--warmup", type=int, default=5, help="Запросов прогрева (не учитываются)")
+        parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess",
+                            help="inprocess — в этом процессе (с числом SQL-запросов), http — к серверу по --url")
+        parser.add_argument("--url", default="http://localhost:8000", help="Адрес сервера для --mode http")
+        parser.add_argument("--concurrency", type=int, default=8, help="Параллельных запросов в режиме http")
+        parser.add_argument("--users", type=int, default=50, help="Сколько синтетических пользователей задействовать")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно выбора пользователей и запросов")
+        parser.add_argument("--output", default=str(Path(settings.BASE_DIR) / "benchmarks"),
+                            help="Каталог для результатов")
+        parser.add_argument("--compare", help="JSON прежнего прогона для сравнения")
+        parser.add_argument("--middleware", action="store_true",
+                            help="Сравнить только цепочки FULL_MIDDLEWARE и LEAN_MIDDLEWARE на запросе API")
+
+    def handle(self, *args, **options):
+        if options["middleware"]:
+            results = benchmarks.middleware_overhead(options["requests"], options["warmup"])
+            for name, stats in results.items():
+                percentiles = " ".join(f"p{p}={stats[f'p{p}_ms']}" for p in benchmarks.PERCENTILES)
+                self.stdout.write(f"{name:6} {percentiles} мс, SQL: {stats['queries_mean']}")
+            saved = results["full"]["p50_ms"] - results["lean"]["p50_ms"]
+            self.stdout.write(self.style.SUCCESS(f"Экономия на запрос (p50): {saved:.2f} мс"))
+            return
+
+        try:
+            result = benchmarks.run(
+                scenarios=options["scenario"] or benchmarks.SCENARIOS, requests=options["requests"],
+                mode=options["mode"], url=options["url"], concurrency=options["concurrency"],
+                users=options["users"], warmup=options["warmup"], random_seed=options["seed"],
+            )
+        except ValueError as exc:
+            self.stdout.write(self.style.ERROR(str(exc)))
+            return
+
+        for scenario, stats in result["scenarios"].items():
+            percentiles = " ".join(f"p{p}={stats[f'p{p}_ms']}" for p in benchmarks.PERCENTILES)
+            self.stdout.write(f"{scenario:24} {percentiles} мс, {stats['rps']} запр/с, "
+                              f"SQL: {stats['queries_mean']}, ошибок: {stats['errors']}")
+        path = benchmarks.save(result, Path(options["output"]))
+        self.stdout.write(self.style.SUCCESS(f"Результат сохранен: {path}"))
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            self.stdout.write(f"Сравнение с {baseline.get('commit')} ({baseline.get('created_at')}):")
+            for scenario, metric, old, new, change in benchmarks.compare(baseline, result):
+                self.stdout.write(f"{scenario:24} {metric:13} {old} → {new} ({change:+}%)" if change is not None
+                                  else f"{scenario:24} {metric:13} {old} → {new}")
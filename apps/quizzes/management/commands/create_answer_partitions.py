@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quizzes import partitions
+
+# python manage.py create_answer_partitions --months-ahead 3 [--convert]
+
+class Command(BaseCommand):
+    help = "Создает помесячные секции ответов учеников на будущие месяцы (--convert — первичный перевод таблиц)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="На сколько месяцев вперед создать секции")
+        parser.add_argument("--convert", action="store_true",
+                            help="Перевести существующие таблицы в секционированные (блокирует их на время переноса)")
+
+    def handle(self, *args, **options):
+        if options["convert"] and partitions.convert(options["months_ahead"]):
+            self.stdout.write(self.style.SUCCESS("Таблицы ответов переведены в секционированные"))
+        if not partitions.is_partitioned():
+            raise CommandError("Таблицы ответов не секционированы; запустите команду с --convert")
+        created = partitions.create_partitions(options["months_ahead"])
+        for name in created:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(f"Секций создано: {len(created)}"))
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from tablib import UnsupportedFormat
+
+from apps.quizzes import interchange
+from apps.quizzes.models import Quiz
+
+# python manage.py export_quiz 42 --output csv --file quiz-42.csv
+
+class Command(BaseCommand):
+    help = "Выгружает тест целиком (вопросы, варианты, правильные ответы) в формате обмена"
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz", type=int, help="id теста")
+        parser.add_argument("--output", choices=list(interchange.FORMATS), default=interchange.JSON, help="Формат")
+        parser.add_argument("--file", help="Файл для записи; по умолчанию — стандартный вывод")
+
+    def handle(self, *args, **options):
+        try:
+            quiz = interchange.load_quiz(options["quiz"])
+        except Quiz.DoesNotExist:
+            raise CommandError(f"Тест {options['quiz']} не найден")
+        if options["output"] == interchange.JSON:
+            chunks = interchange.iter_json(quiz)
+        else:
+            try:
+                content = interchange.export_table(quiz, options["output"])
+            except UnsupportedFormat:
+                raise CommandError(f"Формат {options['output']} недоступен (нужен openpyxl)")
+            chunks = [content.encode() if isinstance(content, str) else content]
+        out = open(options["file"], "wb") if options["file"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if options["file"]:
+                out.close()
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apps.quizzes import exports
+
+# python manage.py export_quiz_results answers --school 12 --output ndjson --gzip --file answers.ndjson.gz
+
+FILTERS = ("school", "school_class", "school_class_prefix", "quiz", "user")
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка ответов или прогресса учеников в CSV/NDJSON (фильтры как в API)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(exports.EXPORTS), help="Что выгружать")
+        parser.add_argument("--output", choices=list(exports.FORMATS), default=exports.CSV, help="Формат")
+        parser.add_argument("--gzip", action="store_true", help="Сжать выгрузку gzip")
+        parser.add_argument("--file", help="Файл для записи; по умолчанию — стандартный вывод")
+        for name in FILTERS:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"Фильтр по {name} (ID)")
+
+    def handle(self, *args, **options):
+        model, columns, rows = exports.EXPORTS[options["kind"]]
+        queryset = model.objects.filter(**{f"{name}_id": options[name] for name in FILTERS
+                                           if options[name] is not None})
+        chunks = exports.stream(rows(queryset), columns, options["output"], options["gzip"])
+        if options["file"]:
+            with open(options["file"], "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
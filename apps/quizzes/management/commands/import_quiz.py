@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from apps.quizzes import interchange
+
+# python manage.py import_quiz bank.xlsx
+
+class Command(BaseCommand):
+    help = "Создает тест из файла формата обмена (.json, .csv, .xlsx) одной транзакцией"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл теста")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "rb") as fh:
+                data = interchange.parse(fh.read(), interchange.format_of(options["path"]))
+            quiz = interchange.import_quiz(data)
+        except OSError as e:
+            raise CommandError(str(e))
+        except ValidationError as e:
+            raise CommandError(f"Файл не прошел проверку: {e.detail}")
+        self.stdout.write(self.style.SUCCESS(f"Тест создан: {quiz.id} «{quiz.title}», "
+                                             f"вопросов: {quiz.questions.count()}"))
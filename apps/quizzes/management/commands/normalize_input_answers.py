@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.quizzes.models import InputAnswerItem
+from apps.quizzes.normalization import variants
+from apps.quizzes.signals import bump_content_version
+
+# python manage.py normalize_input_answers --batch-size 2000
+
+class Command(BaseCommand):
+    help = "Пересчитывает нормализованные варианты текстовых ответов (после изменения правил нормализации)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Сколько записей обновлять за раз")
+
+    def handle(self, *args, **options):
+        items = InputAnswerItem.objects.only("id", "input_correct_text", "input_correct_normalized").order_by("id")
+        changed, batch = [], []
+        for item in items.iterator(chunk_size=options["batch_size"]):
+            normalized = variants(item.input_correct_text)
+            if normalized != item.input_correct_normalized:
+                item.input_correct_normalized = normalized
+                batch.append(item)
+            if len(batch) >= options["batch_size"]:
+                changed += self.flush(batch)
+                batch = []
+        changed += self.flush(batch)
+        self.stdout.write(self.style.SUCCESS(f"Обновлено вариантов ответа: {len(changed)}"))
+
+    def flush(self, batch):
+        """Сохраняет пачку и меняет версию затронутых тестов — ключи ответов пересоберутся"""
+        if not batch:
+            return []
+        ids = [item.id for item in batch]
+        with transaction.atomic():
+            InputAnswerItem.objects.bulk_update(batch, ["input_correct_normalized"])
+            bump_content_version(questions__input_answers__input_answer__id__in=ids)
+        return ids
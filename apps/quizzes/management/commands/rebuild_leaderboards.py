@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.quizzes import leaderboards
+
+# python manage.py rebuild_leaderboards [--quiz 42]
+
+class Command(BaseCommand):
+    help = "Пересобирает рейтинги тестов из UserQuizProgress (все тесты или один)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quiz", type=int, help="id теста; по умолчанию — все тесты")
+
+    def handle(self, *args, **options):
+        count = leaderboards.get_backend().rebuild(options["quiz"])
+        self.stdout.write(self.style.SUCCESS(f"Рейтинги пересобраны, записей: {count}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quizzes import partitions
+
+# python manage.py restore_answer_partition /var/backups/answers/quizzes_useranswer_y2024m01.csv.gz
+
+class Command(BaseCommand):
+    help = "Возвращает в базу секции ответов, выгруженные archive_answer_partitions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Файлы секций (.csv.gz)")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                name = partitions.restore_partition(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Секция восстановлена: {name}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from apps.quizzes import synthetic
+
+# python manage.py seed_synthetic --students 100000 --quizzes 50 --questions 21 --quizzes-per-user 3
+# python manage.py seed_synthetic --flush
+
+class Command(BaseCommand):
+    help = "Создает синтетические данные в объемах production для нагрузочных замеров (или удаляет их)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=100_000, help="Сколько учеников создать")
+        parser.add_argument("--quizzes", type=int, default=50, help="Сколько тестов создать")
+        parser.add_argument("--questions", type=int, default=21, help="Вопросов в тесте (типы идут по кругу)")
+        parser.add_argument("--quizzes-per-user", type=int, default=3, help="Сколько тестов проходит каждый ученик")
+        parser.add_argument("--schools-per-city", type=int, default=20, help="Сколько школ создать в каждом городе")
+        parser.add_argument("--subscribed", type=float, default=0.3, help="Доля учеников и школ с подпиской")
+        parser.add_argument("--days", type=int, default=90, help="За сколько последних дней распределить ответы")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Сколько строк вставлять за раз")
+        parser.add_argument("--password", default="synthetic", help="Пароль всех синтетических пользователей")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора (одинаковые данные при повторе)")
+        parser.add_argument("--flush", action="store_true", help="Удалить ранее созданные синтетические данные")
+
+    def handle(self, *args, **options):
+        if options["flush"]:
+            deleted = synthetic.flush()
+            self.stdout.write(self.style.SUCCESS(f"Синтетические данные удалены: {deleted}"))
+            return
+        if options["questions"] < 1:
+            self.stdout.write(self.style.ERROR("В тесте должен быть хотя бы один вопрос."))
+            return
+
+        counts = synthetic.seed(
+            students=options["students"], quiz_count=options["quizzes"], questions=options["questions"],
+            quizzes_per_user=options["quizzes_per_user"], schools_per_city=options["schools_per_city"],
+            subscribed=options["subscribed"], days=options["days"], batch_size=options["batch_size"],
+            password=options["password"], random_seed=options["seed"], log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Синтетические данные созданы: {counts}"))
@@ -1,7 +1,15 @@
-from django.db import models
+import uuid
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from apps.users.models import UserProfile
+from .normalization import variants
 
 
 class QuestionType(models.TextChoices):
@@ -14,11 +22,38 @@ class QuestionType(models.TextChoices):
     SELECT = "select", "Select"
 
 
+class Difficulty(models.IntegerChoices):
+    EASY = 1, "Легкий"
+    MEDIUM = 2, "Средний"
+    HARD = 3, "Сложный"
+
+
+class StratifyBy(models.TextChoices):
+    NONE = "", "Без разбиения"
+    QUESTION_TYPE = "question_type", "По типу вопроса"
+    DIFFICULTY = "difficulty", "По сложности"
+
+
+class LeaderboardScope(models.TextChoices):
+    SCHOOL = "school", "Школа"
+    CITY = "city", "Город"
+    REGION = "region", "Область"
+    NATIONAL = "national", "Вся страна"
+
+
 class Quiz(models.Model):
     """Тест, содержащий вопросы"""
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Перемешивать вопросы и варианты для каждого ученика (см. shuffling.py); действует после публикации
+    shuffle = models.BooleanField(default=True)
+    # Увеличивается при любом изменении вопросов и вариантов (см. signals.py)
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+    published_snapshot = models.ForeignKey("QuizSnapshot", on_delete=models.SET_NULL, blank=True, null=True,
+                                           editable=False, related_name="+")
+    # Номер для следующего вопроса (Question.position): номера удаленных вопросов не выдаются повторно
+    next_question_position = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
@@ -26,19 +61,53 @@ class Quiz(models.Model):
     def __str__(self):
         return self.title
 
+    # Меняются только через update(), обычное сохранение не должно затирать их старыми значениями
+    MANAGED_FIELDS = {"content_version", "published_snapshot", "next_question_position"}
+
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name not in self.MANAGED_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Question(models.Model):
     """Вопрос, принадлежащий тесту"""
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="questions")
     text = models.TextField()
     question_type = models.CharField(max_length=50, choices=QuestionType.choices)
+    # Постоянный номер вопроса в тесте — индекс бита в UserQuizProgress, не переиспользуется
+    position = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    # Вес вопроса: за верный ответ — все баллы, за частично верный (Ordering/Matching/Grouping) — доля
+    points = models.DecimalField(max_digits=6, decimal_places=2, default=1, validators=[MinValueValidator(Decimal(0))])
+    difficulty = models.PositiveSmallIntegerField(choices=Difficulty.choices, default=Difficulty.MEDIUM)
 
     class Meta:
         ordering = ["quiz", "id"]
+        constraints = [models.UniqueConstraint(fields=["quiz", "position"], name="unique_question_position")]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        if self.position is not None:
+            return super().save(*args, **kwargs)
+        # Строка теста заблокирована до фиксации: одновременно созданные вопросы получают разные номера
+        with transaction.atomic():
+            self.position = Question.next_position(self.quiz_id)
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def next_position(quiz_id):
+        """Выдает номер следующего вопроса теста; вызывать внутри транзакции"""
+        counter = Quiz.objects.select_for_update().filter(pk=quiz_id).values_list(
+            "next_question_position", flat=True).get()
+        last = Question.objects.filter(quiz_id=quiz_id).aggregate(last=models.Max("position"))["last"]
+        # Номера вопросов, созданных bulk_create (импорт, синтетика), счетчик не учитывает
+        position = max(counter, 0 if last is None else last + 1)
+        Quiz.objects.filter(pk=quiz_id).update(next_question_position=position + 1)
+        return position
+
 
 class Answer(models.Model):
     """Вариант ответа для Single и Multiple Choice"""
@@ -111,11 +180,29 @@ class InputAnswerItem(models.Model):
         blank=True,
         null=True
     )
+    # Нормализованные варианты (normalization.variants) — заполняются при сохранении, по ним идет проверка
+    input_correct_normalized = ArrayField(models.CharField(max_length=255), default=list, blank=True, editable=False)
+    max_typos = models.PositiveSmallIntegerField(default=0)  # Допустимое число опечаток (расстояние Левенштейна)
+
     class Meta:
         ordering = ["id"]
+        indexes = [GinIndex(fields=["input_correct_normalized"], name="input_item_normalized_idx")]
+
     def __str__(self):
         return self.input_placeholder
 
+    def normalize(self):
+        """Пересчитывает нормализованные варианты (bulk_create не вызывает save)"""
+        self.input_correct_normalized = variants(self.input_correct_text)
+        return self
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "input_correct_text" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "input_correct_normalized"}
+        super().save(*args, **kwargs)
+
 
 class SelectOption(models.Model):
     """Варианты ответа для выпадающего списка (Select)"""
@@ -143,25 +230,142 @@ class SelectOptionItem(models.Model):
         ordering = ["id"]
     def __str__(self):
         return self.select_placeholder
+
+
+class QuizSnapshot(models.Model):
+    """Опубликованный неизменяемый снимок теста (готовый JSON для учеников и для сотрудников)"""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="snapshots")
+    content_version = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)  # sha256 полного (staff) варианта
+    student_payload = models.BinaryField()  # Без правильных ответов
+    staff_payload = models.BinaryField()
+    published_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-published_at"]
+        constraints = [models.UniqueConstraint(fields=["quiz", "content_hash"], name="unique_quiz_snapshot_hash")]
+
+    def __str__(self):
+        return f"{self.quiz} ({self.content_hash[:12]})"
+
+
+class QuestionPool(models.Model):
+    """
+    Случайная выборка вопросов теста: каждый ученик получает `size` вопросов из всех вопросов теста,
+    поровну по долям типов или сложности (`stratify_by`). Выборка ученика хранится в QuestionDraw.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name="pool")
+    size = models.PositiveIntegerField(validators=[MinValueValidator(1)])  # Сколько вопросов получает ученик
+    stratify_by = models.CharField(max_length=20, choices=StratifyBy.choices, blank=True, default=StratifyBy.NONE)
+
+    def __str__(self):
+        return f"{self.quiz}: {self.size}"
+
+
+class QuestionDraw(models.Model):
+    """Вопросы, выпавшие ученику из пула теста: битовая карта по Question.position (см. pools.py)"""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="+")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="draws")
+    drawn_bits = models.BinaryField(editable=False)
+    total_questions = models.PositiveIntegerField(default=0)
+    drawn_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "quiz"], name="unique_question_draw")]
+
+    def __str__(self):
+        return f"{self.user_id} / {self.quiz_id} ({self.total_questions})"
+
+
+SCOPE_FIELDS = ("school_id", "school_class_id", "school_class_prefix_id")
+
+
+def user_scope(user):
+    """
+    Школа, класс и префикс класса пользователя из профиля: {"school_id": .., ...}.
+    `user` — id или пользователь; у пользователя из токена (apps.users.principal) они уже есть, без запроса.
+    """
+    scope = getattr(user, "scope", None)
+    if scope is not None:
+        return dict(scope)
+    scope = UserProfile.objects.filter(user_id=getattr(user, "pk", user)).values(*SCOPE_FIELDS).first()
+    return scope or dict.fromkeys(SCOPE_FIELDS)
+
+
 class UserAnswer(models.Model):
     """Ответ пользователя на вопрос"""
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="user_answers")
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="user_answers")
-    selected_answers = models.ManyToManyField(Answer, blank=True)  # Для Single и Multiple Choice
+    selected_answers = models.ManyToManyField(Answer, blank=True, through="UserAnswerSelection")  # Single/Multiple
     input_text = models.CharField(max_length=255, blank=True, null=True)  # Для Input
     selected_order = ArrayField(models.PositiveIntegerField(), blank=True, null=True)  # Для Ordering
     selected_matching = ArrayField(models.JSONField(), blank=True, null=True)  # Для Matching (хранение пар)
     selected_grouping = ArrayField(models.JSONField(), blank=True, null=True)  # Для Grouping (группы и элементы)
     selected_option = models.ForeignKey(SelectOption, on_delete=models.SET_NULL, blank=True, null=True)  # Для Select
+    selected_values = models.JSONField(blank=True, null=True)  # Для Input/Select: {id пропуска: значение}
     is_correct = models.BooleanField(default=False)  # Верный ли ответ
+    score = models.DecimalField(max_digits=10, decimal_places=4, default=0)  # Баллы с учетом частичного зачета
     answered_at = models.DateTimeField(auto_now_add=True)  # Дата и время ответа
+    # Копия теста и школы/класса ученика на момент ответа — фильтры без JOIN через вопрос и профиль
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, blank=True, null=True, editable=False,
+                             related_name="user_answers", db_index=False)
+    school = models.ForeignKey("education.School", on_delete=models.SET_NULL, blank=True, null=True,
+                               editable=False, related_name="+", db_index=False)
+    school_class = models.ForeignKey("education.SchoolClass", on_delete=models.SET_NULL, blank=True, null=True,
+                                     editable=False, related_name="+", db_index=False)
+    school_class_prefix = models.ForeignKey("education.SchoolClassPrefix", on_delete=models.SET_NULL, blank=True,
+                                            null=True, editable=False, related_name="+", db_index=False)
 
     class Meta:
         ordering = ["-answered_at"]
+        # Для постраничного вывода по ключу (api/pagination.py) с фильтрами UserAnswerFilter
+        indexes = [
+            models.Index(fields=["-answered_at", "-id"], name="user_answer_answered_at_idx"),
+            models.Index(fields=["user", "-answered_at", "-id"], name="user_answer_user_answered_idx"),
+            models.Index(fields=["quiz", "-answered_at", "-id"], name="user_answer_quiz_answered_idx"),
+            models.Index(fields=["school", "-answered_at", "-id"], name="user_answer_school_idx"),
+            models.Index(fields=["school_class", "-answered_at", "-id"], name="user_answer_class_idx"),
+            models.Index(fields=["school_class_prefix", "-answered_at", "-id"], name="user_answer_prefix_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} → {self.question} ({'✔' if self.is_correct else '✘'})"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.quiz_id is None:
+                self.quiz_id = Question.objects.values_list("quiz_id", flat=True).get(pk=self.question_id)
+            if self.school_id is None:
+                for field, value in user_scope(self.user_id).items():
+                    setattr(self, field, value)
+        super().save(*args, **kwargs)
+
+
+class UserAnswerSelection(models.Model):
+    """
+    Выбранный вариант ответа (связь UserAnswer.selected_answers).
+    Хранит answered_at ответа: таблица секционируется по месяцам вместе с UserAnswer (см. partitions.py),
+    поэтому внешний ключ на UserAnswer не создается в базе.
+    """
+    useranswer = models.ForeignKey(UserAnswer, on_delete=models.CASCADE, db_constraint=False,
+                                   related_name="selections")
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name="+")
+    answered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "quizzes_useranswer_selected_answers"  # Таблица прежнего автоматического ManyToMany
+        constraints = [
+            models.UniqueConstraint(fields=["useranswer", "answer", "answered_at"], name="unique_user_answer_selection"),
+        ]
+
+    def __str__(self):
+        return f"{self.useranswer_id} → {self.answer_id}"
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.useranswer_id:
+            self.answered_at = self.useranswer.answered_at  # Та же месячная секция, что у ответа
+        super().save(*args, **kwargs)
+
 
 class UserQuizProgress(models.Model):
     """Прогресс пользователя в тесте"""
@@ -170,22 +374,179 @@ class UserQuizProgress(models.Model):
     total_questions = models.PositiveIntegerField(default=0)
     answered_questions = models.PositiveIntegerField(default=0)
     correct_answers = models.PositiveIntegerField(default=0)
-    score_percentage = models.FloatField(default=0.0)  # Процент правильных ответов
+    score_percentage = models.FloatField(default=0.0)  # Процент набранных баллов
+    total_points = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Сумма весов вопросов
+    earned_points = models.DecimalField(max_digits=12, decimal_places=4, default=0)  # Баллы последних ответов
     completed_at = models.DateTimeField(blank=True, null=True)  # Когда тест завершен
+    # Завершенных попыток (drafts.flush_draft): номер текущей попытки для перемешивания (shuffling.py)
+    finished_attempts = models.PositiveIntegerField(db_default=0, editable=False)
+    # Битовые карты по Question.position: бит n — байт n // 8, бит n % 8 (как set_bit/get_bit в PostgreSQL)
+    answered_bits = models.BinaryField(default=bytes, editable=False)
+    correct_bits = models.BinaryField(default=bytes, editable=False)
+    # Баллы последнего ответа по Question.position (элемент n + 1): повторный ответ заменяет прежние баллы
+    scores = ArrayField(models.DecimalField(max_digits=10, decimal_places=4, null=True), default=list, editable=False)
+    # Школа и класс ученика на момент последнего ответа (см. UserAnswer)
+    school = models.ForeignKey("education.School", on_delete=models.SET_NULL, blank=True, null=True,
+                               editable=False, related_name="+", db_index=False)
+    school_class = models.ForeignKey("education.SchoolClass", on_delete=models.SET_NULL, blank=True, null=True,
+                                     editable=False, related_name="+", db_index=False)
+    school_class_prefix = models.ForeignKey("education.SchoolClassPrefix", on_delete=models.SET_NULL, blank=True,
+                                            null=True, editable=False, related_name="+", db_index=False)
 
     class Meta:
         ordering = ["-completed_at"]
+        constraints = [models.UniqueConstraint(fields=["user", "quiz"], name="unique_user_quiz_progress")]
+        indexes = [
+            models.Index(fields=["-completed_at", "-id"], name="user_progress_completed_at_idx"),
+            models.Index(fields=["user", "-completed_at", "-id"], name="user_progress_user_done_idx"),
+            models.Index(fields=["school", "-completed_at", "-id"], name="user_progress_school_idx"),
+            models.Index(fields=["school_class", "-completed_at", "-id"], name="user_progress_class_idx"),
+            models.Index(fields=["school_class_prefix", "-completed_at", "-id"], name="user_progress_prefix_idx"),
+        ]
+
+    def has_bit(self, bits, position):
+        bits = bytes(bits or b"")
+        return position // 8 < len(bits) and bool(bits[position // 8] >> (position % 8) & 1)
+
+    def is_answered(self, position):
+        return self.has_bit(self.answered_bits, position)
+
+    def is_correct(self, position):
+        return self.has_bit(self.correct_bits, position)
+
+    def score_at(self, position):
+        """Баллы последнего ответа на вопрос (None, если ответа нет)"""
+        scores = self.scores or []
+        return scores[position] if position < len(scores) else None
 
     def update_progress(self):
-        """Обновляет статистику прохождения теста"""
-        self.answered_questions = UserAnswer.objects.filter(user=self.user, question__quiz=self.quiz).count()
-        self.correct_answers = UserAnswer.objects.filter(user=self.user, question__quiz=self.quiz,
-                                                         is_correct=True).count()
-        self.total_questions = self.quiz.questions.count()
-        self.score_percentage = (self.correct_answers / self.total_questions) * 100 if self.total_questions else 0
-        if self.answered_questions == self.total_questions:
+        """
+        Полностью пересчитывает прогресс по последним ответам на каждый вопрос.
+        При отправке ответов не используется (см. progress.record_answers) — нужен для сверки данных.
+        """
+        from .grading import get_quiz_key
+        from .pools import recorded
+        from .progress import make_bits
+
+        quiz_key = get_quiz_key(self.quiz)
+        drawn = recorded(self.user_id, self.quiz_id) if quiz_key.pool_size else None
+        keys = quiz_key.subset(drawn)
+        latest = (UserAnswer.objects.filter(user=self.user, question__quiz=self.quiz)
+                  .order_by("question_id", "-answered_at", "-id").distinct("question_id")
+                  .values_list("question_id", "is_correct", "score"))
+        results, scores = {}, {}
+        for question_id, is_correct, score in latest:
+            key = quiz_key.get(question_id)
+            if key is not None and (drawn is None or key.position in drawn):
+                results[key.position] = is_correct
+                scores[key.position] = score
+
+        self.answered_bits = make_bits(results)
+        self.correct_bits = make_bits(p for p, is_correct in results.items() if is_correct)
+        self.answered_questions = len(results)
+        self.correct_answers = sum(results.values())
+        self.total_questions = len(keys)
+        self.scores = [scores.get(position) for position in range(max(scores, default=-1) + 1)]
+        self.earned_points = sum(scores.values(), Decimal(0))
+        self.total_points = sum((k.points for k in keys), Decimal(0))
+        self.score_percentage = float(self.earned_points * 100 / self.total_points) if self.total_points else 0
+        if self.answered_questions >= self.total_questions and not self.completed_at:
             self.completed_at = timezone.now()
         self.save()
 
     def __str__(self):
         return f"{self.user} - {self.quiz} ({self.score_percentage:.2f}%)"
+
+
+class SubmissionStatus(models.TextChoices):
+    PENDING = "pending", "В очереди"
+    DONE = "done", "Проверено"
+    FAILED = "failed", "Ошибка"
+
+
+class AnswerSubmission(models.Model):
+    """
+    Принятая, но еще не проверенная отправка ответов (асинхронный режим, см. submissions.py).
+    Хранит ответы как пришли; после проверки — результат или ошибку.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="+")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="+")
+    answers = models.JSONField()  # Поля как у AnswerDataSerializer
+    status = models.CharField(max_length=10, choices=SubmissionStatus.choices, default=SubmissionStatus.PENDING)
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    error = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            # Очередь: только непроверенные отправки в порядке поступления
+            models.Index(fields=["created_at"], name="answer_submission_pending_idx",
+                         condition=models.Q(status="pending")),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} / {self.quiz_id} ({self.status})"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Результат отправки ответов под ключом Idempotency-Key (см. idempotency.py).
+    Повтор запроса с тем же ключом получает сохраненный ответ без повторной проверки и записи.
+    """
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # Хеш метода, пути и тела запроса
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} / {self.key}"
+
+
+HISTOGRAM_BUCKETS = 10  # Шаг 10%: [0, 10), [10, 20), …, [90, 100]
+
+
+class QuizRollup(models.Model):
+    """
+    Сводка результатов теста по классу: число попыток, завершений, сумма баллов и гистограмма.
+    Обновляется при каждой отправке ответов (см. rollups.py), сверяется задачей reconcile_rollups.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="rollups")
+    school = models.ForeignKey("education.School", on_delete=models.CASCADE, blank=True, null=True,
+                               related_name="+")
+    school_class = models.ForeignKey("education.SchoolClass", on_delete=models.CASCADE, blank=True, null=True,
+                                     related_name="+")
+    school_class_prefix = models.ForeignKey("education.SchoolClassPrefix", on_delete=models.CASCADE, blank=True,
+                                            null=True, related_name="+")
+    attempts = models.PositiveIntegerField(default=0)  # Учеников, начавших тест
+    completed = models.PositiveIntegerField(default=0)  # Учеников, ответивших на все вопросы
+    score_sum = models.FloatField(default=0.0)  # Сумма score_percentage
+    histogram = ArrayField(models.PositiveIntegerField(), size=HISTOGRAM_BUCKETS, default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["quiz", "school", "school_class", "school_class_prefix"]
+        constraints = [
+            models.UniqueConstraint(fields=["quiz", "school", "school_class", "school_class_prefix"],
+                                    nulls_distinct=False, name="unique_quiz_rollup_scope"),
+        ]
+        indexes = [models.Index(fields=["school", "quiz"], name="quiz_rollup_school_idx")]
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0.0
+
+    def __str__(self):
+        return f"{self.quiz} / {self.school_id}-{self.school_class_id}{self.school_class_prefix_id or ''}"
@@ -0,0 +1,67 @@
+"""
+Нормализация текстовых ответов для сравнения.
+
+Ответ ученика и правильные варианты приводятся к одному виду:
+Unicode NFKC → casefold → замена строчных латинских букв, похожих на
+кириллические в любом регистре, на кириллические (и латинских казахских на
+кириллические казахские, ё на е) → знаки препинания заменяются пробелами →
+повторные пробелы схлопываются. Знаки, от которых зависит значение, остаются:
+минус перед цифрой и дефис между буквами или цифрами («-5», «темно-синий»),
+«/», «.» и «,» между цифрами («1/2», «3.14», «2,5»). Замена после casefold: у каждой буквы одна
+замена, поэтому «Book» и «book», «HTML» и «html» нормализуются одинаково.
+
+После изменения замен сохраненные варианты пересчитывает команда
+normalize_input_answers.
+
+Правильные варианты нормализуются при сохранении (InputAnswerItem.save), при
+проверке нормализуется только ответ ученика и ищется в множестве вариантов.
+"""
+import re
+import unicodedata
+
+# Буквы, которые выглядят одинаково (строчные или заглавные): ученик мог набрать их в другой раскладке
+HOMOGLYPHS = str.maketrans({
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "i": "і", "k": "к", "m": "м", "o": "о", "p": "р",
+    "t": "т", "x": "х", "y": "у",
+    "ə": "ә", "ɵ": "ө",
+    "ё": "е",
+    # Минус и неразрывный дефис из формул и текстовых редакторов — как дефис с клавиатуры
+    "\u2010": "-", "\u2011": "-", "\u2212": "-",
+})
+
+# Знаки препинания, которые не заменяются пробелом: знак числа, дефис в слове, дробь и десятичная точка
+KEPT_PUNCTUATION = re.compile(r"-(?=\d)|(?<=\w)-(?=\w)|(?<=\d)[/.,](?=\d)")
+
+
+def normalize(value):
+    """Текст для сравнения ответов (пустая строка для None)"""
+    text = unicodedata.normalize("NFKC", str(value or "")).casefold().translate(HOMOGLYPHS)
+    kept = {match.start() for match in KEPT_PUNCTUATION.finditer(text)}
+    text = "".join(" " if unicodedata.category(char).startswith("P") and index not in kept else char
+                   for index, char in enumerate(text))
+    return " ".join(text.split())
+
+
+def variants(texts):
+    """Нормализованные правильные варианты без повторов и пустых строк"""
+    return sorted({normalized for normalized in map(normalize, texts or []) if normalized})
+
+
+def within_distance(a, b, limit):
+    """Расстояние Левенштейна между a и b не больше limit (O(len * limit), с досрочным выходом)"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if a == b:
+        return True
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i] + [limit + 1] * len(b)
+        # Вне полосы шириной limit вокруг диагонали расстояние заведомо больше limit
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[len(b)] <= limit
@@ -0,0 +1,236 @@
+"""
+Помесячное секционирование ответов учеников (UserAnswer и UserAnswerSelection).
+
+Обе таблицы секционируются по диапазонам answered_at: одна секция на
+календарный месяц (TIME_ZONE проекта) и секция по умолчанию для строк вне
+созданных диапазонов. Первичный ключ секционированной таблицы — (id, answered_at).
+
+- convert() — однократный перевод существующих таблиц (переносит все строки);
+- create_partitions() — заранее создает секции будущих месяцев;
+- archive_partitions() — выгружает старые секции в .csv.gz и удаляет их из базы;
+- restore_partition() — возвращает выгруженную секцию для проверок.
+
+Запросы по ключу (-answered_at, -id) с LIMIT читают секции от новых к старым
+и останавливаются на последних месяцах.
+"""
+import gzip
+import os
+import re
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import UserAnswer, UserAnswerSelection
+
+PARTITION_KEY = "answered_at"
+NAME_RE = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+def tables():
+    """Секционируемые таблицы; ответы идут первыми (на них ссылаются выбранные варианты)"""
+    return [UserAnswer._meta.db_table, UserAnswerSelection._meta.db_table]
+
+
+def month_start(year, month):
+    """Начало месяца в часовом поясе проекта; month может выходить за 1..12"""
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def partition_name(table, start):
+    return f"{table}_y{start.year:04d}m{start.month:02d}"
+
+
+def is_partitioned(table=None):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table or tables()[0]])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def partitions(table):
+    """{начало месяца: имя секции} для присоединенных помесячных секций"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, [table])
+        names = [row[0] for row in cursor.fetchall()]
+    found = {}
+    for name in names:
+        match = NAME_RE.match(name)
+        if match and match["table"] == table:
+            found[month_start(int(match["year"]), int(match["month"]))] = name
+    return found
+
+
+def _definitions(cursor, table):
+    """Индексы, ограничения уникальности и внешние ключи таблицы (кроме первичного ключа)"""
+    cursor.execute("""
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index AS x JOIN pg_class AS i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint AS c WHERE c.conrelid = x.indrelid AND c.conindid = x.indexrelid)
+    """, [table])
+    indexes = cursor.fetchall()
+    cursor.execute("""
+        SELECT conname, contype, pg_get_constraintdef(oid), confrelid::regclass::text
+        FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+    """, [table])
+    return indexes, cursor.fetchall()
+
+
+def _attach(cursor, table, start, end):
+    """Создает секцию месяца; строки этого месяца из секции по умолчанию переносятся в нее"""
+    name = partition_name(table, start)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)")
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default WHERE {PARTITION_KEY} >= %s AND {PARTITION_KEY} < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, [start, end])
+    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    return name
+
+
+@transaction.atomic
+def create_partitions(months_ahead=3):
+    """Создает недостающие секции от текущего месяца на `months_ahead` вперед. Возвращает их имена"""
+    now = timezone.localtime()
+    created = []
+    with connection.cursor() as cursor:
+        for table in tables():
+            existing = partitions(table)
+            for offset in range(months_ahead + 1):
+                start = month_start(now.year, now.month + offset)
+                if start not in existing:
+                    created.append(_attach(cursor, table, start, month_start(start.year, start.month + 1)))
+    return created
+
+
+@transaction.atomic
+def convert(months_ahead=3):
+    """
+    Переводит таблицы ответов в секционированные (если еще не переведены).
+    Таблица блокируется на время переноса строк — выполнять в окно обслуживания.
+    """
+    answers, selections = tables()
+    if is_partitioned(answers):
+        return False
+    with connection.cursor() as cursor:
+        # Отложенные проверки внешних ключей не дают менять таблицы в транзакции
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        definitions = {}
+        for table in reversed(tables()):
+            indexes, constraints = _definitions(cursor, table)
+            definitions[table] = indexes, constraints
+            for name, _ in indexes:
+                cursor.execute(f"DROP INDEX {name}")
+            for name, _, _, _ in sorted(constraints, key=lambda c: c[1] == "p"):
+                cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+
+        # Таблица прежнего автоматического ManyToMany не хранила дату ответа
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s
+        """, [f"{selections}_legacy", PARTITION_KEY])
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {selections}_legacy ADD COLUMN {PARTITION_KEY} timestamp with time zone")
+            cursor.execute(f"""
+                UPDATE {selections}_legacy AS s SET {PARTITION_KEY} = a.{PARTITION_KEY}
+                FROM {answers}_legacy AS a WHERE a.id = s.useranswer_id
+            """)
+            cursor.execute(f"DELETE FROM {selections}_legacy WHERE {PARTITION_KEY} IS NULL")
+            cursor.execute(f"ALTER TABLE {selections}_legacy ALTER COLUMN {PARTITION_KEY} SET NOT NULL")
+
+        cursor.execute(f"SELECT MIN({PARTITION_KEY}) FROM {answers}_legacy")
+        first = timezone.localtime(cursor.fetchone()[0] or timezone.now())
+        now = timezone.localtime()
+        months = (now.year - first.year) * 12 + now.month - first.month + months_ahead + 1
+
+        for table in tables():
+            cursor.execute(f"""
+                CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+                                      INCLUDING IDENTITY INCLUDING STORAGE)
+                PARTITION BY RANGE ({PARTITION_KEY})
+            """)
+            cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+            for offset in range(months):
+                start = month_start(first.year, first.month + offset)
+                end = month_start(start.year, start.month + 1)
+                cursor.execute(f"CREATE TABLE {partition_name(table, start)} PARTITION OF {table} "
+                               f"FOR VALUES FROM (%s) TO (%s)", [start, end])
+            cursor.execute(f"INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM {table}_legacy")
+            cursor.execute(f"DROP TABLE {table}_legacy")
+
+            # Индексы создаются после переноса строк; уникальность — только вместе с ключом секционирования
+            indexes, constraints = definitions[table]
+            cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {PARTITION_KEY})")
+            for _, sql in indexes:
+                cursor.execute(sql)
+            for name, kind, sql, target in constraints:
+                if kind == "u" and PARTITION_KEY not in sql:
+                    sql = f"{sql[:sql.rindex(')')]}, {PARTITION_KEY}{sql[sql.rindex(')'):]}"
+                if kind == "u" or (kind == "f" and target != answers):
+                    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {sql}")
+            cursor.execute(f"""
+                SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL)
+                FROM {table}
+            """, [table])
+    return True
+
+
+def _copy_out(cursor, name, path):
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wb") as fh:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+    os.replace(tmp, path)
+
+
+def archive_partitions(retention_months, output_dir):
+    """
+    Выгружает секции старше `retention_months` полных месяцев в `output_dir`/<секция>.csv.gz
+    и удаляет их из базы. Файл записывается до удаления секции. Возвращает пути файлов.
+    """
+    if retention_months < 1:
+        raise ValueError("Срок хранения — не меньше одного месяца")
+    now = timezone.localtime()
+    cutoff = month_start(now.year, now.month - retention_months)
+    os.makedirs(output_dir, exist_ok=True)
+    archived = []
+    # Сначала выбранные варианты, затем сами ответы: в базе не остается вариантов без ответа
+    for table in reversed(tables()):
+        for start, name in sorted(partitions(table).items()):
+            if start >= cutoff:
+                continue
+            path = os.path.join(output_dir, f"{name}.csv.gz")
+            with transaction.atomic(), connection.cursor() as cursor:
+                _copy_out(cursor, name, path)
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                cursor.execute(f"DROP TABLE {name}")
+            archived.append(path)
+    return archived
+
+
+@transaction.atomic
+def restore_partition(path):
+    """Загружает выгруженную секцию из файла archive_partitions и присоединяет ее обратно. Возвращает имя"""
+    match = NAME_RE.match(os.path.basename(path).removesuffix(".csv.gz"))
+    if not match or match["table"] not in tables():
+        raise ValueError(f"Не файл секции ответов: {path}")
+    table = match["table"]
+    start = month_start(int(match["year"]), int(match["month"]))
+    end = month_start(start.year, start.month + 1)
+    name = partition_name(table, start)
+    with gzip.open(path, "rb") as fh:
+        header = fh.readline().decode().strip().split(",")
+        columns = ", ".join(connection.ops.quote_name(column.strip('"')) for column in header)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+                           f"INCLUDING STORAGE)")
+            cursor.copy_expert(f"COPY {name} ({columns}) FROM STDIN WITH (FORMAT csv)", fh)
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                           [start, end])
+    return name
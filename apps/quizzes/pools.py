@@ -0,0 +1,102 @@
+"""
+Случайные выборки вопросов из пула теста (QuestionPool).
+
+id вопросов пула разбиты на группы (по типу или сложности) и лежат в ключе
+теста (grading.QuizKey.strata): он собирается один раз на версию содержимого
+и пересобирается при изменении вопросов или настроек пула. Выборка ученика —
+O(k): число вопросов из каждой группы пропорционально ее размеру (метод
+наибольших остатков), внутри группы — алгоритм Флойда без перебора группы.
+
+Выборка делается один раз, при первом обращении ученика, и хранится битовой
+картой по Question.position (QuestionDraw): по ней проверяются ответы и
+считается UserQuizProgress.total_questions. Если опубликованный снимок старше
+текущего содержимого, вопросы выбираются только из тех, что есть в снимке, —
+ученик видит все вопросы своей выборки, и тест можно завершить.
+"""
+import hashlib
+import random
+
+from django.db import connection
+
+from . import shuffling, snapshots
+from .models import QuestionDraw
+from .progress import bit_positions, make_bits
+
+
+def allocate(sizes, k):
+    """Сколько вопросов взять из каждой группы: пропорционально размерам, всего min(k, сумма)"""
+    total = sum(sizes)
+    k = min(k, total)
+    if not total:
+        return [0] * len(sizes)
+    quotas = [size * k / total for size in sizes]
+    counts = [int(quota) for quota in quotas]
+    remainders = sorted(range(len(sizes)), key=lambda i: counts[i] - quotas[i])
+    for i in remainders[:k - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def sample(ids, k, rng=random):
+    """k различных элементов `ids` за O(k) (алгоритм Флойда)"""
+    n = len(ids)
+    chosen = set()
+    for j in range(n - k, n):
+        index = rng.randrange(j + 1)
+        chosen.add(j if index in chosen else index)
+    return [ids[index] for index in chosen]
+
+
+def draw(quiz_key, rng=random, allowed=None):
+    """id вопросов новой выборки ученика (только из `allowed`, если задано)"""
+    strata = quiz_key.strata
+    if allowed is not None:
+        strata = [(name, [question_id for question_id in ids if question_id in allowed]) for name, ids in strata]
+    counts = allocate([len(ids) for _, ids in strata], quiz_key.pool_size)
+    return [question_id for (_, ids), count in zip(strata, counts) for question_id in sample(ids, count, rng)]
+
+
+def published_ids(quiz_key):
+    """id вопросов опубликованного снимка, если он не совпадает с версией ключа; иначе None"""
+    published = snapshots.get_published(quiz_key.quiz_id, snapshots.STUDENT)
+    if published is None or published[2] == quiz_key.version:
+        return None
+    etag, payload, _ = published
+    return {question["id"] for question in shuffling.parsed_snapshot(etag, payload)["questions"]}
+
+
+def recorded(user_id, quiz_id):
+    """Позиции вопросов сохраненной выборки ученика или None"""
+    bits = QuestionDraw.objects.filter(user_id=user_id, quiz_id=quiz_id).values_list("drawn_bits", flat=True).first()
+    return None if bits is None else bit_positions(bits)
+
+
+def drawn(user_id, quiz_key):
+    """
+    Позиции вопросов выборки ученика (frozenset) или None, если у теста нет пула.
+    При первом обращении выборка делается и сохраняется; при гонке остается первая сохраненная.
+    """
+    if not quiz_key.pool_size:
+        return None
+    existing = recorded(user_id, quiz_key.quiz_id)
+    if existing is not None:
+        return existing
+    positions = [quiz_key.get(question_id).position
+                 for question_id in draw(quiz_key, allowed=published_ids(quiz_key))]
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {QuestionDraw._meta.db_table} AS d (user_id, quiz_id, drawn_bits, total_questions, drawn_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (user_id, quiz_id) DO UPDATE SET drawn_bits = d.drawn_bits
+            RETURNING drawn_bits
+        """, [user_id, quiz_key.quiz_id, make_bits(positions), len(positions)])
+        return bit_positions(cursor.fetchone()[0])
+
+
+def question_ids(quiz_key, positions):
+    return {key.question_id for key in quiz_key.subset(positions)}
+
+
+def fingerprint(ids):
+    """Короткий отпечаток выборки для ETag"""
+    return hashlib.blake2b(",".join(map(str, sorted(ids))).encode(), digest_size=6).hexdigest()
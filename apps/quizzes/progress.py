@@ -0,0 +1,152 @@
+"""
+Учет прогресса прохождения теста.
+
+Прогресс хранится битовыми картами по `Question.position` (отвечен / верен),
+массивом баллов последних ответов и счетчиками. Отправка ответов обновляет их
+одним запросом INSERT … ON CONFLICT DO UPDATE: стоимость не зависит от числа
+ответов, а повторный ответ на вопрос заменяет прежний результат, а не
+добавляется к нему. Набранные баллы меняются на разницу с прежними баллами
+этих вопросов, без пересчета строк ответов.
+
+Отправки одного ученика по одному тесту выполняются по очереди (advisory-блокировка
+на транзакцию): иначе две одновременные первые отправки обе видят «прогресса нет»
+и ученик дважды учитывается в сводках.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import UserQuizProgress, SCOPE_FIELDS
+
+
+def make_bits(positions, size=0):
+    """Битовая карта с установленными битами `positions` (нумерация как в PostgreSQL set_bit)"""
+    positions = list(positions)
+    bits = bytearray(max([size] + [p // 8 + 1 for p in positions]))
+    for position in positions:
+        bits[position // 8] |= 1 << (position % 8)
+    return bytes(bits)
+
+
+def bit_positions(bits):
+    """Номера установленных битов (обратное make_bits)"""
+    bits = bytes(bits or b"")
+    return frozenset(i * 8 + bit for i, byte in enumerate(bits) if byte for bit in range(8) if byte >> bit & 1)
+
+
+def _lock_key(user_id, quiz_id):
+    """Ключ advisory-блокировки прогресса: одно число bigint, не пересекается с парами ключей сводок"""
+    return (int(user_id) & 0x7FFFFFFF) << 32 | int(quiz_id) & 0xFFFFFFFF
+
+
+def _padded(column, size):
+    return f"(p.{column} || decode(repeat('00', greatest({size} - length(p.{column}), 0)), 'hex'))"
+
+
+def record_answers(user_id, quiz_key, results, scope=None, drawn=None):
+    """
+    Атомарно учитывает результаты проверки в прогрессе пользователя.
+
+    `results` — тройки (Question.position, верно ли, баллы); при повторе позиции берется последняя.
+    `scope` — школа и класс ученика (models.user_scope), записываются в прогресс.
+    `drawn` — позиции вопросов выборки ученика (pools.drawn), если у теста есть пул.
+    Возвращает обновленный UserQuizProgress (без повторного чтения из базы); в `previous` —
+    балл, завершение и школа до обновления (None для новой записи), для rollups.apply_change.
+    """
+    results = {position: (is_correct, Decimal(score)) for position, is_correct, score in results}
+    if not results:
+        return None
+    scope = scope or dict.fromkeys(SCOPE_FIELDS)
+    size = max(quiz_key.bits_size, max(results) // 8 + 1)
+    keys = quiz_key.subset(drawn)
+    total = len(keys)
+    total_points = sum((k.points for k in keys), Decimal(0))
+    answered = _padded("answered_bits", size)
+    correct = _padded("correct_bits", size)
+
+    set_answered, set_correct = answered, correct
+    answered_delta, correct_delta, points_delta, set_scores = [], [], [], []
+    for position, (is_correct, score) in results.items():
+        set_answered = f"set_bit({set_answered}, {int(position)}, 1)"
+        set_correct = f"set_bit({set_correct}, {int(position)}, {int(bool(is_correct))})"
+        answered_delta.append(f"1 - get_bit({answered}, {int(position)})")
+        correct_delta.append(f"{int(bool(is_correct))} - get_bit({correct}, {int(position)})")
+        # Баллы — Decimal, вычисленные при проверке: в SQL подставляется только число
+        points_delta.append(f"{score:f} - COALESCE(p.scores[{int(position) + 1}], 0)")
+        set_scores.append(f"WHEN {int(position) + 1} THEN {score:f}")
+    new_answered = f"(p.answered_questions + {' + '.join(answered_delta)})"
+    new_correct = f"(p.correct_answers + {' + '.join(correct_delta)})"
+    new_earned = f"(p.earned_points + {' + '.join(points_delta)})"
+    new_scores = (f"ARRAY(SELECT CASE i {' '.join(set_scores)} ELSE p.scores[i] END "
+                  f"FROM generate_series(1, greatest(cardinality(p.scores), {max(results) + 1})) AS i ORDER BY i)")
+
+    n_answered = len(results)
+    n_correct = sum(1 for is_correct, _ in results.values() if is_correct)
+    earned = sum((score for _, score in results.values()), Decimal(0))
+    scores = [results[p][1] if p in results else None for p in range(max(results) + 1)]
+    now = timezone.now()
+    table = UserQuizProgress._meta.db_table
+    sql = f"""
+        INSERT INTO {table} AS p (user_id, quiz_id, answered_bits, correct_bits, scores, total_questions,
+                                  answered_questions, correct_answers, total_points, earned_points,
+                                  score_percentage, completed_at, {", ".join(SCOPE_FIELDS)})
+        VALUES (%s, %s, %s, %s, %s::numeric[], %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id, quiz_id) DO UPDATE SET
+            {", ".join(f"{field} = EXCLUDED.{field}" for field in SCOPE_FIELDS)},
+            answered_bits = {set_answered},
+            correct_bits = {set_correct},
+            scores = {new_scores},
+            total_questions = EXCLUDED.total_questions,
+            answered_questions = {new_answered},
+            correct_answers = {new_correct},
+            total_points = EXCLUDED.total_points,
+            earned_points = {new_earned},
+            score_percentage = CASE WHEN EXCLUDED.total_points > 0
+                THEN ({new_earned} * 100 / EXCLUDED.total_points)::double precision ELSE 0 END,
+            completed_at = CASE WHEN p.completed_at IS NULL AND {new_answered} >= EXCLUDED.total_questions
+                THEN %s ELSE p.completed_at END
+        RETURNING id, answered_bits, correct_bits, scores, total_questions, answered_questions, correct_answers,
+                  total_points, earned_points, score_percentage, completed_at
+    """
+    params = [
+        user_id, quiz_key.quiz_id,
+        make_bits(results, size), make_bits((p for p, (v, _) in results.items() if v), size), scores,
+        total, n_answered, n_correct, total_points, earned,
+        float(earned * 100 / total_points) if total_points else 0,
+        now if n_answered >= total else None,
+        *(scope[field] for field in SCOPE_FIELDS),
+        now,
+    ]
+    previous_fields = ["score_percentage", "completed_at", *SCOPE_FIELDS]
+    with connection.cursor() as cursor:
+        # Блокировка (ученик, тест) до конца транзакции, даже если строки еще нет: прежние значения
+        # не изменятся до нашего обновления, а вторая первая отправка увидит уже созданную строку
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_lock_key(user_id, quiz_key.quiz_id)])
+        cursor.execute(f"SELECT {', '.join(previous_fields)} FROM {table} WHERE user_id = %s AND quiz_id = %s "
+                       f"FOR UPDATE", [user_id, quiz_key.quiz_id])
+        previous = cursor.fetchone()
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    fields = ["id", "answered_bits", "correct_bits", "scores", "total_questions", "answered_questions",
+              "correct_answers", "total_points", "earned_points", "score_percentage", "completed_at"]
+    progress = UserQuizProgress(user_id=user_id, quiz_id=quiz_key.quiz_id, **scope, **dict(zip(fields, row)))
+    progress.previous = dict(zip(previous_fields, previous)) if previous else None
+    return progress
+
+
+def question_states(progress, quiz_key, drawn=None):
+    """Состояние каждого вопроса (выборки ученика) для продолжения теста (в порядке Question.position)"""
+    keys = sorted(quiz_key.subset(drawn), key=lambda k: k.position)
+    return [
+        {
+            "question": key.question_id,
+            "position": key.position,
+            "answered": bool(progress and progress.is_answered(key.position)),
+            "is_correct": progress.is_correct(key.position) if progress and progress.is_answered(key.position)
+            else None,
+            "score": progress.score_at(key.position) if progress else None,
+        }
+        for key in keys
+    ]
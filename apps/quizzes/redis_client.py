@@ -0,0 +1,123 @@
+"""
+Клиент Redis для sorted sets квизов (индекс черновиков, сверка сводок, рейтинги).
+
+get_client(url) возвращает redis.Redis для redis:// и MemoryRedis для
+memory:// — хранилище в памяти процесса с нужным подмножеством команд для
+тестов и запуска без Redis (как брокер memory:// у Celery).
+"""
+import bisect
+import fnmatch
+
+_clients = {}
+
+
+class MemoryRedis:
+    """Sorted sets и хеши в памяти процесса; порядок при равных баллах — по члену, как в Redis"""
+
+    def __init__(self):
+        self.sets = {}  # ключ → [(балл, член)] по возрастанию
+        self.hashes = {}
+
+    def flushdb(self):
+        self.sets.clear()
+        self.hashes.clear()
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def delete(self, *keys):
+        return sum((self.sets.pop(key, None) or self.hashes.pop(key, None)) is not None for key in keys)
+
+    unlink = delete
+
+    def scan_iter(self, match="*", count=None):
+        return [key for key in [*self.sets, *self.hashes] if fnmatch.fnmatchcase(key, match)]
+
+    def hset(self, key, mapping):
+        values = self.hashes.setdefault(key, {})
+        added = len(set(map(str, mapping)) - set(values))
+        values.update({str(field): str(value) for field, value in mapping.items()})
+        return added
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(str(field))
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def _members(self, key):
+        return self.sets.get(key, [])
+
+    def zadd(self, key, mapping):
+        entries = self.sets.setdefault(key, [])
+        added = 0
+        for member, score in mapping.items():
+            member = str(member)
+            added += self._remove(entries, member) == 0
+            bisect.insort(entries, (float(score), member))
+        return added
+
+    @staticmethod
+    def _remove(entries, member):
+        for index, (_, current) in enumerate(entries):
+            if current == member:
+                del entries[index]
+                return 1
+        return 0
+
+    def zrem(self, key, *members):
+        entries = self._members(key)
+        removed = sum(self._remove(entries, str(member)) for member in members)
+        if not entries:
+            self.sets.pop(key, None)
+        return removed
+
+    def zscore(self, key, member):
+        member = str(member)
+        return next((score for score, current in self._members(key) if current == member), None)
+
+    def zrevrank(self, key, member):
+        member = str(member)
+        entries = self._members(key)
+        return next((len(entries) - 1 - index for index, (_, current) in enumerate(entries)
+                     if current == member), None)
+
+    def zrevrange(self, key, start, end, withscores=False):
+        rows = [(member, score) for score, member in reversed(self._members(key))]
+        rows = rows[start:None if end == -1 else end + 1]
+        return rows if withscores else [member for member, _ in rows]
+
+    def zrangebyscore(self, key, min, max, start=None, num=None, withscores=False):
+        low = float("-inf") if min == "-inf" else float(min)
+        high = float("inf") if max == "+inf" else float(max)
+        rows = [(member, score) for score, member in self._members(key) if low <= score <= high]
+        if start is not None:
+            rows = rows[start:start + num if num is not None and num >= 0 else None]
+        return rows if withscores else [member for member, _ in rows]
+
+
+class _Pipeline:
+    """Команды MemoryRedis, выполняемые по execute()"""
+
+    def __init__(self, client):
+        self.client, self.commands = client, []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.commands.append((method, args, kwargs)) or self
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+def get_client(url):
+    """Клиент по URL; один на процесс"""
+    if url not in _clients:
+        if url.startswith("memory://"):
+            _clients[url] = MemoryRedis()
+        else:
+            import redis
+
+            _clients[url] = redis.Redis.from_url(url, decode_responses=True)
+    return _clients[url]
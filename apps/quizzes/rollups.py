@@ -0,0 +1,134 @@
+"""
+Сводки результатов тестов по классам (QuizRollup).
+
+Каждая отправка ответов меняет сводку на разницу между прежним и новым
+состоянием прогресса ученика (apply_change). Периодическая задача
+reconcile_rollups пересобирает сводки из UserQuizProgress и исправляет
+возможные расхождения (удаленные ученики, пересчеты, гонки первых ответов).
+Сверяются только тесты, отмеченные mark_dirty (отправка ответов, удаление
+прогресса): отметки хранятся в sorted set Redis (QUIZ_REDIS_URL) со временем
+отметки, задача разбирает их порциями по QUIZ_ROLLUP_BATCH_SIZE. Отметка
+ставится после фиксации транзакции, а ошибка Redis только пишется в лог —
+отправка ответов и удаление ученика от Redis не зависят.
+
+Инкрементальные обновления берут разделяемую advisory-блокировку теста,
+пересборка — исключительную, поэтому они не теряют изменений друг друга.
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import HISTOGRAM_BUCKETS, SCOPE_FIELDS, QuizRollup, UserQuizProgress
+from .redis_client import get_client
+
+# Первый ключ advisory-блокировки (второй — id теста)
+LOCK_CLASS = 7301
+DIRTY_KEY = "quizzes:rollups:dirty"
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_key(quiz_id):
+    return int(quiz_id) & 0x7FFFFFFF
+
+
+def mark_dirty(quiz_id):
+    """Отмечает тест для сверки сводок задачей reconcile_rollups после фиксации транзакции"""
+    transaction.on_commit(lambda: _mark(quiz_id))
+
+
+def _mark(quiz_id):
+    try:
+        get_client(settings.QUIZ_REDIS_URL).zadd(DIRTY_KEY, {quiz_id: time.time()})
+    except Exception:
+        # Ответы уже сохранены: без отметки сводка теста останется инкрементальной
+        logger.warning("Не удалось отметить тест %s для сверки сводок", quiz_id, exc_info=True)
+
+
+def bucket(score):
+    """Номер столбца гистограммы для балла в процентах (как в SQL пересборки)"""
+    return min(max(math.floor(score * HISTOGRAM_BUCKETS / 100), 0), HISTOGRAM_BUCKETS - 1)
+
+
+def _add(deltas, scope, sign, score, completed):
+    delta = deltas.setdefault(scope, {"attempts": 0, "completed": 0, "score_sum": 0.0,
+                                      "histogram": [0] * HISTOGRAM_BUCKETS})
+    delta["attempts"] += sign
+    delta["completed"] += sign * bool(completed)
+    delta["score_sum"] += sign * score
+    delta["histogram"][bucket(score)] += sign
+
+
+def apply_change(quiz_id, previous, progress):
+    """Учитывает в сводках изменение прогресса (`previous` — из record_answers, None для нового ученика)"""
+    deltas = {}
+    if previous:
+        _add(deltas, tuple(previous[f] for f in SCOPE_FIELDS), -1,
+             previous["score_percentage"], previous["completed_at"])
+    _add(deltas, tuple(getattr(progress, f) for f in SCOPE_FIELDS), 1,
+         progress.score_percentage, progress.completed_at)
+
+    table = QuizRollup._meta.db_table
+    sql = f"""
+        INSERT INTO {table} AS r (quiz_id, {", ".join(SCOPE_FIELDS)}, attempts, completed, score_sum,
+                                  histogram, updated_at)
+        SELECT %s, %s, %s, %s, GREATEST(%s, 0), GREATEST(%s, 0), GREATEST(%s, 0),
+               ARRAY(SELECT GREATEST(d, 0) FROM unnest(%s::integer[]) AS d), %s
+        FROM (SELECT pg_advisory_xact_lock_shared({LOCK_CLASS}, %s)) AS lock
+        ON CONFLICT (quiz_id, {", ".join(SCOPE_FIELDS)}) DO UPDATE SET
+            attempts = GREATEST(r.attempts + %s, 0),
+            completed = GREATEST(r.completed + %s, 0),
+            score_sum = GREATEST(r.score_sum + %s, 0),
+            histogram = ARRAY(SELECT GREATEST(COALESCE(x, 0) + COALESCE(y, 0), 0)
+                              FROM unnest(r.histogram, %s::integer[]) AS t(x, y)),
+            updated_at = EXCLUDED.updated_at
+    """
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        for scope, delta in deltas.items():
+            values = [delta["attempts"], delta["completed"], delta["score_sum"], delta["histogram"]]
+            cursor.execute(sql, [quiz_id, *scope, *values, now, _lock_key(quiz_id), *values])
+    mark_dirty(quiz_id)
+
+
+def reconcile(quiz_id):
+    """Пересобирает сводки теста из UserQuizProgress"""
+    table = QuizRollup._meta.db_table
+    progress = UserQuizProgress._meta.db_table
+    scope = ", ".join(SCOPE_FIELDS)
+    bucket_sql = f"LEAST(GREATEST(FLOOR(score_percentage * {HISTOGRAM_BUCKETS} / 100), 0), {HISTOGRAM_BUCKETS - 1})"
+    histogram = ", ".join(f"COUNT(*) FILTER (WHERE {bucket_sql} = {i})" for i in range(HISTOGRAM_BUCKETS))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SELECT pg_advisory_xact_lock({LOCK_CLASS}, %s)", [_lock_key(quiz_id)])
+        cursor.execute(f"DELETE FROM {table} WHERE quiz_id = %s", [quiz_id])
+        cursor.execute(f"""
+            INSERT INTO {table} (quiz_id, {scope}, attempts, completed, score_sum, histogram, updated_at)
+            SELECT quiz_id, {scope}, COUNT(*), COUNT(completed_at), COALESCE(SUM(score_percentage), 0),
+                   ARRAY[{histogram}], %s
+            FROM {progress}
+            WHERE quiz_id = %s
+            GROUP BY quiz_id, {scope}
+        """, [timezone.now(), quiz_id])
+        return cursor.rowcount
+
+
+def reconcile_dirty(batch_size=None, max_batches=None):
+    """Пересобирает сводки тестов, отмеченных до запуска, порциями. Возвращает число тестов"""
+    batch_size = batch_size or settings.QUIZ_ROLLUP_BATCH_SIZE
+    index = get_client(settings.QUIZ_REDIS_URL)
+    started, reconciled = time.time(), 0
+    for _ in range(max_batches or settings.QUIZ_ROLLUP_MAX_BATCHES):
+        marked = index.zrangebyscore(DIRTY_KEY, "-inf", started, start=0, num=batch_size, withscores=True)
+        for quiz_id, marked_at in marked:
+            reconcile(int(quiz_id))
+            # Отметка, поставленная во время пересборки, остается до следующего запуска
+            if index.zscore(DIRTY_KEY, quiz_id) == marked_at:
+                index.zrem(DIRTY_KEY, quiz_id)
+        reconciled += len(marked)
+        if len(marked) < batch_size:
+            break
+    return reconciled
@@ -0,0 +1,114 @@
+"""
+Прием ответов: проверка по ключу, сохранение пачкой и обновление прогресса.
+
+Используется одиночной и пакетной отправкой ответов.
+"""
+from django.db import transaction
+from rest_framework import serializers
+
+from . import leaderboards, pools
+from .grading import evaluate
+from .models import UserAnswer, SelectOption, user_scope
+from .progress import record_answers
+from .rollups import apply_change
+
+
+def _pk(value):
+    return getattr(value, "pk", value)
+
+
+def build_answer(user, answer_key, data):
+    """Проверяет ответ по ключу и возвращает несохраненный UserAnswer (`user` — объект или id)"""
+    selected = list(dict.fromkeys(data.get("selected_answers") or []))
+    if not set(selected) <= answer_key.options:
+        raise serializers.ValidationError({"selected_answers": ["Варианты ответа не относятся к этому вопросу."]})
+
+    is_correct, score = evaluate(answer_key, data)
+    user_answer = UserAnswer(
+        user_id=_pk(user),
+        question_id=answer_key.question_id,
+        input_text=(data.get("input_text") or "").strip() or None,
+        selected_order=data.get("selected_order"),
+        selected_matching=data.get("selected_matching"),
+        selected_grouping=data.get("selected_grouping"),
+        selected_option_id=_pk(data.get("selected_option")),
+        selected_values=data.get("selected_values"),
+        is_correct=is_correct,
+        score=score,
+    )
+    user_answer.selected_answer_ids = selected
+    return user_answer
+
+
+def build_answers(user, quiz_key, items):
+    """
+    Проверяет ответы на вопросы одного теста.
+    Вопросы и варианты сверяются с ключом, SelectOption — одним запросом на всю пачку.
+    """
+    errors = {}
+    option_ids = {item["selected_option"] for item in items if item.get("selected_option")}
+    known_options = dict(
+        SelectOption.objects.filter(id__in=option_ids).values_list("id", "question_id")
+    ) if option_ids else {}
+
+    answers = []
+    for index, item in enumerate(items):
+        answer_key = quiz_key.get(item["question"])
+        if answer_key is None:
+            errors[index] = {"question": ["Вопрос не относится к этому тесту."]}
+            continue
+        option_id = item.get("selected_option")
+        if option_id and known_options.get(option_id) != answer_key.question_id:
+            errors[index] = {"selected_option": ["Вариант не относится к этому вопросу."]}
+            continue
+        try:
+            answers.append(build_answer(user, answer_key, item))
+        except serializers.ValidationError as exc:
+            errors[index] = exc.detail
+
+    if errors:
+        raise serializers.ValidationError({"answers": errors})
+    return answers
+
+
+def save_answers(user, quiz_key, answers):
+    """Сохраняет ответы и связи с вариантами пачкой и один раз обновляет прогресс, сводки класса и рейтинги"""
+    through = UserAnswer.selected_answers.through
+    drawn = pools.drawn(_pk(user), quiz_key)
+    if drawn is not None and any(quiz_key.get(a.question_id).position not in drawn for a in answers):
+        raise serializers.ValidationError({"question": ["Вопрос не входит в выборку ученика."]})
+    scope = user_scope(user)
+    for answer in answers:
+        answer.quiz_id = quiz_key.quiz_id
+        for field, value in scope.items():
+            setattr(answer, field, value)
+    with transaction.atomic():
+        UserAnswer.objects.bulk_create(answers)
+        through.objects.bulk_create([
+            through(useranswer_id=answer.id, answer_id=answer_id, answered_at=answer.answered_at)
+            for answer in answers
+            for answer_id in getattr(answer, "selected_answer_ids", ())
+        ])
+        progress = record_answers(
+            _pk(user), quiz_key,
+            [(quiz_key.get(answer.question_id).position, answer.is_correct, answer.score) for answer in answers],
+            scope=scope, drawn=drawn,
+        )
+        apply_change(quiz_key.quiz_id, progress.previous, progress)
+        leaderboards.record(progress)
+    return progress
+
+
+def attempt_result(answers, progress):
+    """Результаты проверки ответов попытки и итоговый прогресс"""
+    return {
+        "message": "Ответы приняты",
+        "results": [{"question": a.question_id, "is_correct": a.is_correct, "score": a.score} for a in answers],
+        "total_questions": progress.total_questions,
+        "answered_questions": progress.answered_questions,
+        "correct_answers": progress.correct_answers,
+        "total_points": progress.total_points,
+        "earned_points": progress.earned_points,
+        "score_percentage": progress.score_percentage,
+        "completed_at": progress.completed_at,
+    }
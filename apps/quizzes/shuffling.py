@@ -0,0 +1,110 @@
+"""
+Перемешивание вопросов и вариантов для каждого ученика и попытки без хранения перестановки.
+
+Зерно — HMAC(QUIZ_SHUFFLE_KEY, "пользователь:тест:попытка"). Место элемента в
+списке определяется ключевым хешем (зерно, вид списка, id элемента), поэтому
+перестановку можно получить заново по тем же трем числам и id из ключа ответов,
+не сохраняя ее в базе. Ответы проверяются по id, так что порядок на проверку не влияет.
+
+Перемешивается уже готовый вариант снимка для учеников (snapshots.student_view):
+меняется только порядок списков, сериализаторы и запросы к базе не нужны.
+
+Номер попытки берется с сервера — число завершенных попыток
+(UserQuizProgress.finished_attempts, кэшируется), а не из запроса: иначе
+ученик мог бы перебирать попытки и выбрать удобный порядок.
+"""
+import hashlib
+import hmac
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import UserQuizProgress
+
+ATTEMPT_CACHE_TIMEOUT = 60 * 60
+
+# Списки вопроса, которые перемешиваются; matching_right_sides — строки, у них нет id
+QUESTION_LISTS = ("answers", "ordering_items", "group_items")
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def seed(user_id, quiz_id, attempt=0):
+    """Зерно перестановки ученика для попытки `attempt`"""
+    message = f"{int(user_id)}:{int(quiz_id)}:{int(attempt)}".encode()
+    return hmac.new(settings.QUIZ_SHUFFLE_KEY.encode(), message, hashlib.sha256).digest()
+
+
+def _attempt_key(user_id, quiz_id):
+    return f"quizzes:attempt:{int(user_id)}:{int(quiz_id)}"
+
+
+def current_attempt(user_id, quiz_id):
+    """Номер текущей попытки ученика: сколько попыток он уже завершил"""
+    key = _attempt_key(user_id, quiz_id)
+    attempt = cache.get(key)
+    if attempt is None:
+        attempt = UserQuizProgress.objects.filter(user_id=user_id, quiz_id=quiz_id).values_list(
+            "finished_attempts", flat=True).first() or 0
+        cache.set(key, attempt, ATTEMPT_CACHE_TIMEOUT)
+    return attempt
+
+
+def finish_attempt(user_id, quiz_id):
+    """Завершает попытку: следующий запрос теста получит порядок новой попытки"""
+    progress = UserQuizProgress.objects.filter(user_id=user_id, quiz_id=quiz_id)
+    progress.update(finished_attempts=F("finished_attempts") + 1)
+    cache.set(_attempt_key(user_id, quiz_id), progress.values_list("finished_attempts", flat=True).first() or 0,
+              ATTEMPT_CACHE_TIMEOUT)
+
+
+def _rank(seed_bytes, kind, value):
+    return hashlib.blake2b(f"{kind}:{value}".encode(), key=seed_bytes, digest_size=8).digest()
+
+
+def order(seed_bytes, kind, values):
+    """Значения в порядке ученика; порядок не зависит от исходного порядка `values`"""
+    return sorted(values, key=lambda value: _rank(seed_bytes, kind, value))
+
+
+def _shuffled(seed_bytes, kind, items):
+    return sorted(items, key=lambda item: _rank(seed_bytes, kind, item["id"]))
+
+
+def shuffle_question(question, seed_bytes):
+    shuffled = {**question}
+    for kind in QUESTION_LISTS:
+        if question.get(kind):
+            shuffled[kind] = _shuffled(seed_bytes, f"{question['id']}:{kind}", question[kind])
+    if question.get("matching_right_sides"):
+        shuffled["matching_right_sides"] = order(seed_bytes, f"{question['id']}:right",
+                                                 question["matching_right_sides"])
+    return shuffled
+
+
+def shuffle_quiz(data, seed_bytes):
+    """Вариант теста для ученика: `data` — student_view, не изменяется"""
+    questions = _shuffled(seed_bytes, "questions", data["questions"])
+    return {**data, "questions": [shuffle_question(q, seed_bytes) for q in questions]}
+
+
+def permutation(quiz_key, user_id, attempt=0):
+    """Порядок вопросов (id), который видел ученик, — восстанавливается по ключу ответов без запросов"""
+    return order(seed(user_id, quiz_key.quiz_id, attempt), "questions", list(quiz_key.questions))
+
+
+def parsed_snapshot(snapshot_etag, payload):
+    """Разобранный JSON снимка; хранится в памяти процесса, пока снимок не сменится (ключ — ETag)"""
+    data = _parsed.get(snapshot_etag)
+    if data is None:
+        data = json.loads(payload)
+        with _parsed_lock:
+            if len(_parsed) >= settings.QUIZ_ANSWER_KEY_LOCAL_SIZE:
+                _parsed.pop(next(iter(_parsed)))
+            _parsed[snapshot_etag] = data
+    return data
+
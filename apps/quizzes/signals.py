@@ -0,0 +1,67 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import (
+    Quiz, Question, Answer, OrderingItem, MatchingPair, Group, GroupItem,
+    InputAnswer, InputAnswerItem, SelectOption, SelectOptionItem, QuestionPool, UserQuizProgress
+)
+from . import leaderboards
+from .rollups import mark_dirty
+from .snapshots import invalidate
+
+# Как по измененному объекту найти его тест
+CONTENT_LOOKUPS = {
+    Question: lambda obj: {"pk": obj.quiz_id},
+    Answer: lambda obj: {"questions__id": obj.question_id},
+    OrderingItem: lambda obj: {"questions__id": obj.question_id},
+    MatchingPair: lambda obj: {"questions__id": obj.question_id},
+    Group: lambda obj: {"questions__id": obj.question_id},
+    GroupItem: lambda obj: {"questions__groups__id": obj.group_id},
+    InputAnswer: lambda obj: {"questions__id": obj.question_id},
+    InputAnswerItem: lambda obj: {"questions__input_answers__id": obj.inputAnswer_id},
+    SelectOption: lambda obj: {"questions__id": obj.question_id},
+    SelectOptionItem: lambda obj: {"questions__select_options__id": obj.selectOption_id},
+    QuestionPool: lambda obj: {"pk": obj.quiz_id},  # Группы пула хранятся в ключе теста
+}
+
+
+def bump_content_version(**lookup):
+    """Увеличивает версию содержимого теста — ключи ответов будут пересобраны"""
+    Quiz.objects.filter(**lookup).update(content_version=F("content_version") + 1)
+
+
+def content_changed(sender, instance, **kwargs):
+    bump_content_version(**CONTENT_LOOKUPS[sender](instance))
+
+
+for model in CONTENT_LOOKUPS:
+    post_save.connect(content_changed, sender=model, dispatch_uid=f"quizzes_content_saved_{model.__name__}")
+    post_delete.connect(content_changed, sender=model, dispatch_uid=f"quizzes_content_deleted_{model.__name__}")
+
+
+@receiver(pre_save, sender=Question)
+def question_moved(sender, instance, **kwargs):
+    """Если вопрос переносят в другой тест, старый тест тоже меняет версию"""
+    if instance.pk:
+        Quiz.objects.filter(questions__pk=instance.pk).exclude(pk=instance.quiz_id).update(
+            content_version=F("content_version") + 1
+        )
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Название и описание тоже входят в снимок: сотрудники не должны видеть устаревшую публикацию"""
+    if not created and (update_fields is None or set(update_fields) - Quiz.MANAGED_FIELDS):
+        bump_content_version(pk=instance.pk)
+
+
+@receiver(post_delete, sender=Quiz)
+def quiz_deleted(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=UserQuizProgress)
+def progress_deleted(sender, instance, **kwargs):
+    """Удаление прогресса (вместе с учеником) сводки не уменьшает — тест сверит reconcile_rollups"""
+    mark_dirty(instance.quiz_id)
+    leaderboards.discard(instance)
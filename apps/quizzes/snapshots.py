@@ -0,0 +1,108 @@
+"""
+Публикация тестов в виде неизменяемых JSON-снимков.
+
+Снимок хранится в базе (QuizSnapshot) и в кэше. Чтение опубликованного теста —
+одно обращение к кэшу и отдача готовых байт с ETag, без сериализаторов и запросов к базе.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+
+from .models import Quiz, QuizSnapshot
+
+STUDENT, STAFF = "student", "staff"
+
+# Нет опубликованного снимка — запоминаем, чтобы не ходить в базу на каждый запрос
+_UNPUBLISHED = "unpublished"
+_UNPUBLISHED_TIMEOUT = 60
+
+
+def _cache_key(quiz_id, variant):
+    return f"quizzes:snapshot:{quiz_id}:{variant}"
+
+
+def _etag(content_hash, variant):
+    return f'"{content_hash[:32]}-{variant}"'
+
+
+def _student_question(question):
+    """Вопрос без правильных ответов: убираем is_correct, порядок, пары, распределение по группам и тексты ответов"""
+    return {
+        **question,
+        "answers": [{"id": a["id"], "text": a["text"]} for a in question["answers"]],
+        "ordering_items": sorted(({"id": i["id"], "text": i["text"]} for i in question["ordering_items"]),
+                                 key=lambda i: i["id"]),
+        "matching_pairs": [{"id": p["id"], "left_side": p["left_side"]} for p in question["matching_pairs"]],
+        "matching_right_sides": sorted(p["right_side"] for p in question["matching_pairs"]),
+        "groups": [{"id": g["id"], "name": g["name"]} for g in question["groups"]],
+        "group_items": sorted(({"id": i["id"], "text": i["text"]} for g in question["groups"] for i in g["items"]),
+                              key=lambda i: i["id"]),
+        "input_answers": [
+            {**a, "input_answer": [{k: v for k, v in i.items() if k != "input_correct_text"}
+                                   for i in a["input_answer"]]}
+            for a in question["input_answers"]
+        ],
+        "select_options": [
+            {**o, "select_option": [{k: v for k, v in i.items() if k != "select_correct_text"}
+                                    for i in o["select_option"]]}
+            for o in question["select_options"]
+        ],
+    }
+
+
+def student_view(data):
+    return {**data, "questions": [_student_question(q) for q in data["questions"]]}
+
+
+def render_quiz(quiz_id):
+    """Сериализует тест целиком (постоянное число запросов) и возвращает (версия, staff JSON, student JSON)"""
+    from .api.serializers import QuizSerializer, QUIZ_PREFETCH
+
+    quiz = Quiz.objects.select_related("pool").prefetch_related(*QUIZ_PREFETCH).get(pk=quiz_id)
+    data = QuizSerializer(quiz).data
+    renderer = JSONRenderer()
+    return quiz.content_version, renderer.render(data), renderer.render(student_view(data))
+
+
+def publish(quiz):
+    """Замораживает текущее содержимое теста в снимок и делает его опубликованным"""
+    version, staff_payload, student_payload = render_quiz(quiz.pk)
+    content_hash = hashlib.sha256(staff_payload).hexdigest()
+    with transaction.atomic():
+        snapshot, created = QuizSnapshot.objects.get_or_create(
+            quiz_id=quiz.pk, content_hash=content_hash,
+            defaults={"content_version": version, "staff_payload": staff_payload,
+                      "student_payload": student_payload},
+        )
+        Quiz.objects.filter(pk=quiz.pk).update(published_snapshot=snapshot)
+    _cache_snapshot(snapshot)
+    return snapshot
+
+
+def _cache_snapshot(snapshot):
+    for variant, payload in ((STUDENT, snapshot.student_payload), (STAFF, snapshot.staff_payload)):
+        cache.set(_cache_key(snapshot.quiz_id, variant),
+                  (_etag(snapshot.content_hash, variant), bytes(payload), snapshot.content_version), None)
+
+
+def get_published(quiz_id, variant):
+    """(ETag, JSON, версия содержимого) опубликованного снимка или None"""
+    cached = cache.get(_cache_key(quiz_id, variant))
+    if cached == _UNPUBLISHED:
+        return None
+    if cached is not None:
+        return cached
+
+    snapshot = QuizSnapshot.objects.filter(quiz_id=quiz_id, quiz__published_snapshot=F("pk")).first()
+    if snapshot is None:
+        cache.set(_cache_key(quiz_id, variant), _UNPUBLISHED, _UNPUBLISHED_TIMEOUT)
+        return None
+    _cache_snapshot(snapshot)
+    return cache.get(_cache_key(quiz_id, variant))
+
+
+def invalidate(quiz_id):
+    cache.delete_many([_cache_key(quiz_id, variant) for variant in (STUDENT, STAFF)])
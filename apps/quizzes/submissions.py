@@ -0,0 +1,153 @@
+"""
+Асинхронная проверка ответов (QUIZ_ASYNC_GRADING).
+
+Запрос только проверяет ответы по ключу теста (без записи) и сохраняет их как
+есть в AnswerSubmission — одна вставка — и сразу отвечает 202 с id отправки.
+Задача grade_submissions забирает очередь порциями (SELECT … FOR UPDATE SKIP
+LOCKED: воркеры не берут одни и те же строки). Отправки одного ученика по
+одному тесту в порции объединяются в один save_answers — один bulk_create
+ответов и одно обновление прогресса. Результат или ошибка записываются в
+отправку и доступны по ее id.
+
+Если брокер недоступен и задача не поставлена, отправку подберет
+периодический запуск grade_submissions (CELERY_BEAT_SCHEDULE).
+
+Без QUIZ_ASYNC_GRADING ответы проверяются и сохраняются в запросе, как раньше.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework import serializers
+
+from .grading import get_quiz_key
+from .models import AnswerSubmission, Quiz, SubmissionStatus
+from .services import attempt_result, build_answers, save_answers
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return settings.QUIZ_ASYNC_GRADING
+
+
+def raw_item(item):
+    """Ответ из validated_data для хранения в JSON: объекты заменяются их id"""
+    return {field: getattr(value, "pk", value) for field, value in item.items()}
+
+
+def enqueue(user_id, quiz_id, items):
+    """Сохраняет ответы в очередь и после фиксации транзакции запускает проверку"""
+    submission = AnswerSubmission.objects.create(user_id=user_id, quiz_id=quiz_id,
+                                                 answers=[raw_item(item) for item in items])
+    transaction.on_commit(_start_grading)
+    return submission
+
+
+def _start_grading():
+    from .tasks import grade_submissions
+
+    try:
+        grade_submissions.delay()
+    except Exception:
+        # Отправка уже сохранена: ответ 202 не должен зависеть от брокера
+        logger.warning("Не удалось поставить задачу проверки ответов", exc_info=True)
+
+
+def _grade(user_id, quiz, submissions):
+    """Проверяет и сохраняет отправки одного ученика по одному тесту одним save_answers"""
+    if quiz is None:
+        raise serializers.ValidationError({"quiz": ["Тест удален."]})
+    quiz_key = get_quiz_key(quiz)
+    answers = build_answers(user_id, quiz_key, [item for s in submissions for item in s.answers])
+    progress = save_answers(user_id, quiz_key, answers)
+    offset = 0
+    for submission in submissions:
+        own = answers[offset:offset + len(submission.answers)]
+        offset += len(submission.answers)
+        submission.status, submission.result = SubmissionStatus.DONE, attempt_result(own, progress)
+
+
+def _grade_isolated(user_id, quiz, submissions):
+    """Ошибка в отправке помечает только ее; остальные отправки группы сохраняются"""
+    try:
+        with transaction.atomic():
+            _grade(user_id, quiz, submissions)
+        return
+    except serializers.ValidationError as exc:
+        if len(submissions) == 1:
+            submissions[0].status, submissions[0].error = SubmissionStatus.FAILED, exc.detail
+            return
+    except Exception:
+        # Любая ошибка одной отправки не должна останавливать порцию и очередь
+        if len(submissions) == 1:
+            logger.exception("Ошибка при проверке отправки %s", submissions[0].pk)
+            submissions[0].status = SubmissionStatus.FAILED
+            submissions[0].error = {"error": "Внутренняя ошибка при проверке ответов."}
+            return
+    for submission in submissions:
+        _grade_isolated(user_id, quiz, [submission])
+
+
+def process_batch(size=None):
+    """Проверяет одну порцию очереди. Возвращает число обработанных отправок"""
+    size = size or settings.QUIZ_ASYNC_BATCH_SIZE
+    with transaction.atomic():
+        batch = list(AnswerSubmission.objects.select_for_update(skip_locked=True)
+                     .filter(status=SubmissionStatus.PENDING).order_by("created_at")[:size])
+        if not batch:
+            return 0
+        groups = {}
+        for submission in batch:
+            groups.setdefault((submission.user_id, submission.quiz_id), []).append(submission)
+
+        # Более ранние отправки того же ученика сейчас у другого воркера: ждем их, чтобы не нарушить порядок
+        earlier = (
+            AnswerSubmission.objects
+            .filter(status=SubmissionStatus.PENDING, user_id__in={user_id for user_id, _ in groups},
+                    created_at__lt=max(s.created_at for s in batch))
+            .exclude(pk__in=[s.pk for s in batch])
+            .values("user_id", "quiz_id").annotate(first=Min("created_at"))
+            .values_list("user_id", "quiz_id", "first")
+        )
+        blocked = {(user_id, quiz_id) for user_id, quiz_id, first in earlier
+                   if (user_id, quiz_id) in groups and first < groups[user_id, quiz_id][0].created_at}
+
+        quizzes = Quiz.objects.in_bulk({quiz_id for _, quiz_id in groups})
+        processed = []
+        for (user_id, quiz_id), submissions in groups.items():
+            if (user_id, quiz_id) in blocked:
+                continue
+            _grade_isolated(user_id, quizzes.get(quiz_id), submissions)
+            processed.extend(submissions)
+
+        now = timezone.now()
+        for submission in processed:
+            submission.processed_at = now
+        AnswerSubmission.objects.bulk_update(processed, ["status", "result", "error", "processed_at"])
+    return len(processed)
+
+
+def process_queue(max_batches=None):
+    """Проверяет очередь порциями, пока она не опустеет. Возвращает число обработанных отправок"""
+    total = 0
+    for _ in range(max_batches or settings.QUIZ_ASYNC_MAX_BATCHES):
+        processed = process_batch()
+        if not processed:
+            break
+        total += processed
+    return total
+
+
+def status(submission):
+    return {
+        "id": submission.id,
+        "quiz": submission.quiz_id,
+        "status": submission.status,
+        "result": submission.result,
+        "error": submission.error,
+        "created_at": submission.created_at,
+        "processed_at": submission.processed_at,
+    }
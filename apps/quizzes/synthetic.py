@@ -0,0 +1,356 @@
+"""
+Синтетические данные в объемах production для нагрузочных замеров (команды seed_synthetic и benchmark_api).
+
+Области и города загружаются из CSV проекта (команды load_*), школы,
+ученики с профилями, учителя, тесты со всеми типами вопросов, ответы,
+прогресс, подписки и учебники создаются bulk_create пачками по `batch_size`.
+Ответы проверяются настоящими ключами (grading.evaluate), прогресс
+собирается из них в памяти — так же, как его собрала бы отправка ответов;
+сводки и рейтинги пересобираются в конце.
+
+Синтетические записи помечены (почта @synthetic.local, префиксы названий и
+ISBN) и удаляются flush(). Генерация детерминирована зерном `random_seed`.
+"""
+import io
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group as AuthGroup
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from apps.education.models import City, Language, School, SchoolClass, SchoolClassPrefix, Subject
+from apps.subscriptions.models import Plan, Subscription
+from apps.textbooks.models import Lesson, Section, Textbook
+from apps.users.models import CustomUser, UserProfile
+
+from . import leaderboards, rollups
+from .grading import evaluate, get_quiz_key
+from .models import (
+    Answer, Group, GroupItem, InputAnswer, InputAnswerItem, MatchingPair, OrderingItem, Question, QuestionType,
+    Quiz, SelectOption, SelectOptionItem, UserAnswer, UserAnswerSelection, UserQuizProgress
+)
+from .progress import make_bits
+
+DOMAIN = "synthetic.local"
+QUIZ_PREFIX = "Синтетический тест"
+SCHOOL_PREFIX = "Синтетическая школа"
+ISBN_PREFIX = "979-0-"
+PLAN_PREFIX = "Синтетический"
+
+CSV_DIR = settings.BASE_DIR / "apps" / "education" / "csv"
+CSV_COMMANDS = [
+    ("load_cities", "cities_kz_full.csv"),
+    ("load_languages", "languages_kz.csv"),
+    ("load_subjects", "subjects.csv"),
+]
+GRADES = range(7, 12)
+PREFIXES = ["А", "Ә", "Б", "В"]
+
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """bulk_create с заданными датами: иначе auto_now_add заменяет их текущим временем"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def geography(schools_per_city, batch_size):
+    """Области, города, языки и предметы из CSV; по `schools_per_city` синтетических школ в каждом городе"""
+    for command, name in CSV_COMMANDS:
+        call_command(command, str(CSV_DIR / name), stdout=io.StringIO())
+    existing = Counter(School.objects.filter(name__startswith=SCHOOL_PREFIX).values_list("city_id", flat=True))
+    School.objects.bulk_create([
+        School(name=f"{SCHOOL_PREFIX} №{n + 1}", city_id=city_id)
+        for city_id in City.objects.values_list("id", flat=True)
+        for n in range(existing[city_id], schools_per_city)
+    ], batch_size=batch_size)
+    return list(School.objects.filter(name__startswith=SCHOOL_PREFIX).values_list("id", flat=True))
+
+
+def _create_users(kind, count, role, password, batch_size):
+    """Пользователи с одинаковым заранее посчитанным паролем; нумерация продолжает уже созданных"""
+    start = CustomUser.objects.filter(email__startswith=kind, email__endswith=f"@{DOMAIN}").count()
+    users = CustomUser.objects.bulk_create([
+        CustomUser(email=f"{kind}{n}@{DOMAIN}", first_name=kind.capitalize(), last_name=str(n), role=role,
+                   password=password)
+        for n in range(start, start + count)
+    ], batch_size=batch_size)
+    group, _ = AuthGroup.objects.get_or_create(name=role)
+    CustomUser.groups.through.objects.bulk_create(
+        [CustomUser.groups.through(customuser_id=user.id, group_id=group.id) for user in users],
+        batch_size=batch_size)
+    return users
+
+
+def people(students, school_ids, password, rng, batch_size):
+    """Ученики с профилями (школа, класс, префикс, язык) и по одному учителю на школу"""
+    password = make_password(password)
+    classes = [SchoolClass.objects.get_or_create(grade=grade)[0].id for grade in GRADES]
+    prefixes = [SchoolClassPrefix.objects.get_or_create(prefix=prefix)[0].id for prefix in PREFIXES]
+    languages = list(Language.objects.values_list("id", flat=True)) or [None]
+    subjects = list(Subject.objects.values_list("id", flat=True)) or [None]
+
+    scopes = []
+    for chunk in _chunks(range(students), batch_size):
+        users = _create_users("student", len(chunk), CustomUser.Role.STUDENT, password, batch_size)
+        profiles = [UserProfile(user_id=user.id, school_id=rng.choice(school_ids), school_class_id=rng.choice(classes),
+                                school_class_prefix_id=rng.choice(prefixes), language_id=rng.choice(languages))
+                    for user in users]
+        UserProfile.objects.bulk_create(profiles, batch_size=batch_size)
+        scopes += [(p.user_id, {"school_id": p.school_id, "school_class_id": p.school_class_id,
+                                "school_class_prefix_id": p.school_class_prefix_id}) for p in profiles]
+
+    teachers = _create_users("teacher", len(school_ids), CustomUser.Role.TEACHER, password, batch_size)
+    UserProfile.objects.bulk_create([
+        UserProfile(user_id=teacher.id, school_id=school_id, subject_id=rng.choice(subjects))
+        for teacher, school_id in zip(teachers, school_ids)
+    ], batch_size=batch_size)
+    return scopes
+
+
+def _question_content(question, n, batch):
+    """Дочерние объекты вопроса по его типу: добавляются в пачки `batch` по моделям"""
+    kind = question.question_type
+    if kind in (QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE):
+        correct = {0} if kind == QuestionType.SINGLE_CHOICE else {0, 2}
+        batch[Answer] += [Answer(question=question, text=f"Вариант {n}.{i}", is_correct=i in correct)
+                          for i in range(4)]
+    elif kind == QuestionType.ORDERING:
+        batch[OrderingItem] += [OrderingItem(question=question, text=f"Шаг {i + 1}", order=i) for i in range(4)]
+    elif kind == QuestionType.MATCHING:
+        batch[MatchingPair] += [MatchingPair(question=question, left_side=f"Термин {i}", right_side=f"Значение {i}")
+                                for i in range(3)]
+    elif kind == QuestionType.GROUPING:
+        batch[Group] += [Group(question=question, name=f"Группа {i}") for i in range(2)]
+    elif kind == QuestionType.INPUT:
+        batch[InputAnswer].append(InputAnswer(question=question, text=f"Впишите ответ {n}"))
+    elif kind == QuestionType.SELECT:
+        batch[SelectOption].append(SelectOption(question=question, text=f"Выберите ответ {n}"))
+
+
+def quizzes(count, questions, rng, batch_size):
+    """Тесты, в каждом — вопросы всех типов по кругу; возвращает id тестов"""
+    types = QuestionType.values
+    created = Quiz.objects.bulk_create([Quiz(title=f"{QUIZ_PREFIX} {n + 1}", description="Нагрузочные данные")
+                                        for n in range(count)], batch_size=batch_size)
+    batch = {model: [] for model in (Answer, OrderingItem, MatchingPair, Group, InputAnswer, SelectOption)}
+    all_questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=f"Вопрос {n + 1}", question_type=types[n % len(types)], position=n,
+                 points=rng.choice([1, 1, 2, 3]), difficulty=rng.choice([1, 2, 2, 3]))
+        for quiz in created for n in range(questions)
+    ], batch_size=batch_size)
+    for n, question in enumerate(all_questions):
+        _question_content(question, n, batch)
+    for model, objects in batch.items():
+        model.objects.bulk_create(objects, batch_size=batch_size)
+
+    GroupItem.objects.bulk_create([GroupItem(group=group, text=f"Элемент {group.id}.{i}")
+                                   for group in batch[Group] for i in range(2)], batch_size=batch_size)
+    InputAnswerItem.objects.bulk_create([
+        InputAnswerItem(inputAnswer=item, number=1, input_placeholder="Ответ",
+                        input_correct_text=[f"ответ {item.id}"], max_typos=1).normalize()
+        for item in batch[InputAnswer]
+    ], batch_size=batch_size)
+    SelectOptionItem.objects.bulk_create([
+        SelectOptionItem(selectOption=option, number=1, select_placeholder="Выбор",
+                         select_correct_text=f"верно {option.id}", select_option_text=[f"верно {option.id}", "неверно"])
+        for option in batch[SelectOption]
+    ], batch_size=batch_size)
+    return [quiz.id for quiz in created]
+
+
+def _submission(key, option_id, correct, rng):
+    """Данные ответа (как у SubmitAnswerSerializer): верные по ключу или с одной ошибкой"""
+    kind = key.question_type
+    if kind in (QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE):
+        wrong = sorted(key.options - key.correct)
+        selected = set(key.correct) if correct else {rng.choice(wrong)}
+        return {"selected_answers": sorted(selected)}
+    if kind == QuestionType.ORDERING:
+        order = list(key.ordering)
+        if not correct:
+            i = rng.randrange(len(order) - 1)
+            order[i], order[i + 1] = order[i + 1], order[i]
+        return {"selected_order": order}
+    if kind == QuestionType.MATCHING:
+        pairs = sorted(key.pairs)
+        rights = [right for _, right in pairs]
+        if not correct:
+            rights = rights[1:] + rights[:1]
+        return {"selected_matching": [[left, right] for (left, _), right in zip(pairs, rights)]}
+    if kind == QuestionType.GROUPING:
+        groups = {}
+        for item, group in sorted(key.placement):
+            groups.setdefault(group, []).append(item)
+        if not correct:
+            first, second = sorted(groups)[:2]
+            groups[second].append(groups[first].pop())
+        return {"selected_grouping": [{"group": group, "items": items} for group, items in groups.items()]}
+    if kind == QuestionType.INPUT:
+        return {"selected_values": {str(blank): sorted(accepted)[0] if correct else "не знаю"
+                                    for blank, accepted, _ in key.blanks}}
+    return {"selected_option": option_id,
+            "selected_values": {str(item): text if correct else "неверно" for item, text in key.selects}}
+
+
+def _attempt(user_id, scope, quiz_key, options, started, ability, rng):
+    """Ответы одной попытки ученика и его прогресс в тесте"""
+    keys = sorted(quiz_key.questions.values(), key=lambda k: k.position)
+    if rng.random() > 0.8:
+        keys = keys[:rng.randint(1, len(keys))]  # Часть попыток не завершена
+    answers, selections, answered_at = [], [], started
+    for key in keys:
+        answered_at += timedelta(seconds=rng.randint(20, 120))
+        data = _submission(key, options.get(key.question_id), rng.random() < ability - 0.1 * (key.difficulty - 2),
+                           rng)
+        is_correct, score = evaluate(key, data)
+        answer = UserAnswer(user_id=user_id, question_id=key.question_id, quiz_id=quiz_key.quiz_id,
+                            selected_order=data.get("selected_order"), selected_matching=data.get("selected_matching"),
+                            selected_grouping=data.get("selected_grouping"),
+                            selected_option_id=data.get("selected_option"), selected_values=data.get("selected_values"),
+                            is_correct=is_correct, score=score, answered_at=answered_at, **scope)
+        answer.selected_answer_ids = data.get("selected_answers", ())
+        answers.append(answer)
+
+    scores = {key.position: answer.score for key, answer in zip(keys, answers)}
+    total_points = quiz_key.total_points
+    earned = sum(scores.values(), Decimal(0))
+    progress = UserQuizProgress(
+        user_id=user_id, quiz_id=quiz_key.quiz_id, total_questions=quiz_key.total_questions,
+        answered_questions=len(answers), correct_answers=sum(a.is_correct for a in answers),
+        total_points=total_points, earned_points=earned,
+        score_percentage=float(earned * 100 / total_points) if total_points else 0,
+        completed_at=answered_at if len(answers) == quiz_key.total_questions else None,
+        answered_bits=make_bits(scores), correct_bits=make_bits(k.position for k, a in zip(keys, answers)
+                                                                if a.is_correct),
+        scores=[scores.get(position) for position in range(max(scores, default=-1) + 1)], **scope,
+    )
+    return answers, progress
+
+
+def _save_answers(answers, progress, batch_size):
+    with transaction.atomic():
+        UserAnswer.objects.bulk_create(answers, batch_size=batch_size)
+        UserAnswerSelection.objects.bulk_create([
+            UserAnswerSelection(useranswer_id=answer.id, answer_id=answer_id, answered_at=answer.answered_at)
+            for answer in answers for answer_id in answer.selected_answer_ids
+        ], batch_size=batch_size)
+        UserQuizProgress.objects.bulk_create(progress, batch_size=batch_size)
+
+
+def attempts(scopes, quiz_ids, quizzes_per_user, days, rng, batch_size, log):
+    """Попытки учеников: ответы на вопросы `quizzes_per_user` случайных тестов за последние `days` дней"""
+    quiz_keys = [get_quiz_key(quiz) for quiz in Quiz.objects.filter(id__in=quiz_ids)]
+    options = dict(SelectOption.objects.filter(question__quiz_id__in=quiz_ids).values_list("question_id", "id"))
+    now, window = timezone.now(), timedelta(days=days).total_seconds()
+    answers, progress, total = [], [], 0
+    fields = [UserAnswer._meta.get_field("answered_at")]
+    with _explicit_timestamps(*fields):
+        for user_id, scope in scopes:
+            ability = rng.uniform(0.3, 0.95)
+            for quiz_key in rng.sample(quiz_keys, min(quizzes_per_user, len(quiz_keys))):
+                started = now - timedelta(seconds=rng.uniform(3600, window))
+                attempt_answers, attempt_progress = _attempt(user_id, scope, quiz_key, options, started, ability, rng)
+                answers += attempt_answers
+                progress.append(attempt_progress)
+            if len(answers) >= batch_size:
+                _save_answers(answers, progress, batch_size)
+                total += len(answers)
+                log(f"Ответов: {total}")
+                answers, progress = [], []
+        _save_answers(answers, progress, batch_size)
+    return total + len(answers)
+
+
+def subscriptions(scopes, school_ids, share, rng, batch_size):
+    """Персональные подписки для доли `share` учеников и корпоративные — для той же доли школ"""
+    personal, _ = Plan.objects.get_or_create(name=f"{PLAN_PREFIX} персональный", plan_type="personal",
+                                             defaults={"price": Decimal(0), "duration_days": 365})
+    corporate, _ = Plan.objects.get_or_create(name=f"{PLAN_PREFIX} корпоративный", plan_type="corporate",
+                                              defaults={"price": Decimal(0), "duration_days": 365})
+    now = timezone.now()
+    created = Subscription.objects.bulk_create(
+        [Subscription(user_id=user_id, plan=personal, end_date=now + timedelta(days=rng.randint(-30, 365)))
+         for user_id, _ in scopes if rng.random() < share]
+        + [Subscription(school_id=school_id, plan=corporate, end_date=now + timedelta(days=rng.randint(-30, 365)))
+           for school_id in school_ids if rng.random() < share],
+        batch_size=batch_size)
+    return len(created)
+
+
+def textbooks(quiz_ids, rng, batch_size):
+    """Учебник на каждое сочетание предмета, класса и языка: разделы и уроки со ссылками на тесты"""
+    start = Textbook.objects.filter(isbn__startswith=ISBN_PREFIX).count()
+    combinations = [(subject, grade, language)
+                    for subject in Subject.objects.all()
+                    for grade in SchoolClass.objects.filter(grade__in=GRADES)
+                    for language in Language.objects.all()]
+    books = Textbook.objects.bulk_create([
+        Textbook(subject=subject, school_class=grade, language=language, isbn=f"{ISBN_PREFIX}{start + n:011d}",
+                 title=f"{subject.name}, {grade.grade} класс")
+        for n, (subject, grade, language) in enumerate(combinations)
+    ], batch_size=batch_size)
+    sections = Section.objects.bulk_create([Section(textbook=book, title=f"Раздел {i + 1}", text="Текст раздела")
+                                            for book in books for i in range(3)], batch_size=batch_size)
+    Lesson.objects.bulk_create([
+        Lesson(section=section, title=f"Урок {i + 1}", objective="Цель урока", description="Описание урока",
+               quiz_id=rng.choice(quiz_ids) if quiz_ids else None)
+        for section in sections for i in range(3)
+    ], batch_size=batch_size)
+    return len(books)
+
+
+def seed(students=100_000, quiz_count=50, questions=21, quizzes_per_user=3, schools_per_city=20, subscribed=0.3,
+         days=90, batch_size=5000, password="synthetic", random_seed=1, log=lambda message: None):
+    """Создает синтетические данные и возвращает число созданных записей по видам"""
+    rng = random.Random(random_seed)
+    school_ids = geography(schools_per_city, batch_size)
+    log(f"Школ: {len(school_ids)}")
+    scopes = people(students, school_ids, password, rng, batch_size)
+    log(f"Учеников: {len(scopes)}")
+    quiz_ids = quizzes(quiz_count, questions, rng, batch_size)
+    log(f"Тестов: {len(quiz_ids)}")
+    answers = attempts(scopes, quiz_ids, quizzes_per_user, days, rng, batch_size, log)
+    for quiz_id in quiz_ids:
+        rollups.reconcile(quiz_id)
+        leaderboards.get_backend().rebuild(quiz_id)
+    return {
+        "schools": len(school_ids),
+        "students": len(scopes),
+        "quizzes": len(quiz_ids),
+        "answers": answers,
+        "subscriptions": subscriptions(scopes, school_ids, subscribed, rng, batch_size),
+        "textbooks": textbooks(quiz_ids, rng, batch_size),
+    }
+
+
+def flush():
+    """Удаляет синтетические данные (ответы, прогресс и подписки удаляются каскадом)"""
+    deleted = {}
+    for name, queryset in [
+        ("textbooks", Textbook.objects.filter(isbn__startswith=ISBN_PREFIX)),
+        ("quizzes", Quiz.objects.filter(title__startswith=QUIZ_PREFIX)),
+        ("users", CustomUser.objects.filter(email__endswith=f"@{DOMAIN}")),
+        ("schools", School.objects.filter(name__startswith=SCHOOL_PREFIX)),
+        ("plans", Plan.objects.filter(name__startswith=PLAN_PREFIX)),
+    ]:
+        deleted[name] = queryset.delete()[0]
+    return deleted
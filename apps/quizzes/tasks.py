@@ -0,0 +1,37 @@
+from celery import shared_task
+
+from . import drafts, idempotency, partitions, rollups, submissions
+
+
+@shared_task
+def flush_expired_drafts():
+    """Сохраняет брошенные черновики попыток (запускается периодически, см. CELERY_BEAT_SCHEDULE)"""
+    return drafts.flush_expired_drafts()
+
+
+@shared_task
+def reconcile_rollups(quiz_id=None):
+    """Пересобирает сводки результатов из прогресса учеников (одного теста или измененных с прошлого запуска)"""
+    if quiz_id is not None:
+        return rollups.reconcile(quiz_id)
+    return rollups.reconcile_dirty()
+
+
+@shared_task
+def create_answer_partitions(months_ahead=3):
+    """Заранее создает помесячные секции ответов (если таблицы уже секционированы)"""
+    if not partitions.is_partitioned():
+        return []
+    return partitions.create_partitions(months_ahead)
+
+
+@shared_task
+def grade_submissions():
+    """Проверяет очередь асинхронных отправок ответов (запускается после каждой отправки и периодически)"""
+    return submissions.process_queue()
+
+
+@shared_task
+def prune_idempotency_records():
+    """Удаляет устаревшие ответы под ключами Idempotency-Key"""
+    return idempotency.prune()
@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes.models import Quiz, Question, Answer, QuestionType, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class SubmitBatchTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.url = reverse('user-answer-submit-batch')
+        self.quiz = Quiz.objects.create(title="Quiz")
+
+    def make_questions(self, count):
+        questions = []
+        for i in range(count):
+            question = Question.objects.create(quiz=self.quiz, text=str(i),
+                                               question_type=QuestionType.MULTIPLE_CHOICE)
+            question.right = [Answer.objects.create(question=question, text=f"r{j}", is_correct=True)
+                              for j in range(2)]
+            Answer.objects.create(question=question, text="w")
+            questions.append(question)
+        return questions
+
+    def payload(self, questions):
+        return {"quiz": self.quiz.id, "answers": [
+            {"question": q.id, "selected_answers": [a.id for a in q.right[:1 + i % 2]]}
+            for i, q in enumerate(questions)
+        ]}
+
+    def test_batch_submit(self):
+        """Все ответы попытки сохраняются за один запрос, прогресс обновляется один раз"""
+        questions = self.make_questions(6)
+        response = self.client.post(self.url, self.payload(questions), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual([r["is_correct"] for r in response.data["results"]], [False, True] * 3)
+        self.assertEqual(response.data["correct_answers"], 3)
+        self.assertEqual(response.data["score_percentage"], 50.0)
+        self.assertIsNotNone(response.data["completed_at"])
+
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(UserAnswer.selected_answers.through.objects.count(), 9)
+        progress = UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((progress.answered_questions, progress.correct_answers), (6, 3))
+
+    def test_query_count_does_not_grow(self):
+        """Число запросов не зависит от размера пачки"""
+        questions = self.make_questions(30)
+        self.client.post(self.url, self.payload(questions[:1]), format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.payload(questions[:2]), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.payload(questions), format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_batch_is_rejected_entirely(self):
+        """Ошибка в одном ответе отклоняет всю пачку"""
+        questions = self.make_questions(2)
+        other_quiz = Quiz.objects.create(title="Other")
+        foreign = Question.objects.create(quiz=other_quiz, text="x", question_type=QuestionType.SINGLE_CHOICE)
+        payload = self.payload(questions)
+        payload["answers"].append({"question": foreign.id, "selected_answers": []})
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(2, response.data["answers"])
+        self.assertFalse(UserAnswer.objects.exists())
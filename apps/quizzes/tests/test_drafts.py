@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import drafts, shuffling, tasks
+from apps.quizzes.models import UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class DraftTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.quiz, self.questions = self.create_quiz(3)
+
+    def autosave(self, question, correct):
+        answer = question.right if correct else question.wrong
+        response = self.client.post(reverse('user-answer-draft'), {"quiz": self.quiz.id, "answers": [
+            {"question": question.id, "selected_answers": [answer.id]}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def test_autosave_then_finish(self):
+        """Автосохранение не пишет в базу; завершение сохраняет последние ответы один раз"""
+        self.autosave(self.questions[0], correct=False)
+        self.autosave(self.questions[0], correct=True)
+        self.autosave(self.questions[1], correct=False)
+        self.assertFalse(UserAnswer.objects.exists())
+        self.assertFalse(UserQuizProgress.objects.exists())
+
+        response = self.client.get(reverse('user-answer-draft'), {"quiz": self.quiz.id})
+        self.assertEqual(len(response.data["answers"]), 2)
+
+        response = self.client.post(reverse('user-answer-finish'), {"quiz": self.quiz.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data["correct_answers"], 1)
+        self.assertEqual(UserAnswer.objects.count(), 2)
+        self.assertEqual(shuffling.current_attempt(self.user.id, self.quiz.id), 1)  # Следующая попытка — новый порядок
+
+        response = self.client.post(reverse('user-answer-finish'), {"quiz": self.quiz.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UserAnswer.objects.count(), 2)
+
+    def test_expired_drafts_are_flushed(self):
+        """Брошенный черновик сохраняет периодическая задача"""
+        self.autosave(self.questions[2], correct=True)
+        self.assertEqual(tasks.flush_expired_drafts(), 0)  # Еще не истек
+
+        with self.settings(QUIZ_DRAFT_IDLE_TIMEOUT=-1):
+            self.autosave(self.questions[1], correct=True)
+        self.assertEqual(tasks.flush_expired_drafts.delay().get(), 1)
+        progress = UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual(progress.correct_answers, 2)
+        self.assertEqual(tasks.flush_expired_drafts(), 0)
+
+    def test_expired_drafts_are_flushed_in_batches(self):
+        """Задача выбирает из индекса только истекшие черновики, порциями"""
+        with self.settings(QUIZ_DRAFT_IDLE_TIMEOUT=-1):
+            for i in range(3):
+                student = CustomUser.objects.create_user(email=f'student{i}@email.com', password='testpassword')
+                drafts.save_draft(student.id, self.quiz.id, [
+                    {"question": self.questions[0].id, "selected_answers": [self.questions[0].right.id]}])
+        self.autosave(self.questions[0], correct=True)  # Еще не истек
+
+        self.assertEqual(drafts.flush_expired_drafts(batch_size=2), 3)
+        self.assertEqual(UserQuizProgress.objects.count(), 3)
+        self.assertEqual(drafts.get_draft_index().zrangebyscore(drafts.INDEX_KEY, "-inf", "+inf"),
+                         [drafts.draft_key(self.user.id, self.quiz.id)])
+
+    def test_locked_draft(self):
+        """Если блокировку черновика не дождались, запрос отклоняется, а не пишет без нее"""
+        key = drafts.draft_key(self.user.id, self.quiz.id)
+        cache.add(f"{key}:lock", 1, 30)
+        response = self.client.post(reverse('user-answer-draft'), {"quiz": self.quiz.id, "answers": [
+            {"question": self.questions[0].id, "selected_answers": [self.questions[0].right.id]}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIsNone(drafts.get_draft(self.user.id, self.quiz.id))
@@ -0,0 +1,68 @@
+import csv
+import gzip
+import io
+import json
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.education.models import Region, City, School
+from apps.quizzes.models import Quiz, Question, Answer, QuestionType, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser, UserProfile
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        city = City.objects.create(name="Астана", region=Region.objects.create(name="Акмолинская"))
+        self.school = School.objects.create(name="НИШ", city=city)
+        self.student = self.create_user("student@email.com", CustomUser.Role.STUDENT, self.school)
+        self.other = self.create_user("other@email.com", CustomUser.Role.STUDENT)
+        self.teacher = self.create_user("teacher@email.com", CustomUser.Role.TEACHER, self.school)
+
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.question = Question.objects.create(quiz=self.quiz, text="?", question_type=QuestionType.MULTIPLE_CHOICE)
+        self.choices = [Answer.objects.create(question=self.question, text=str(i)) for i in range(2)]
+        for user in (self.student, self.other):
+            answer = UserAnswer.objects.create(user=user, question=self.question)
+            answer.selected_answers.set(self.choices, through_defaults={"answered_at": answer.answered_at})
+            UserQuizProgress.objects.create(user=user, quiz=self.quiz, school=UserProfile.objects.get(user=user).school)
+
+    def create_user(self, email, role, school=None):
+        user = CustomUser.objects.create_user(email=email, password='testpassword', role=role)
+        UserProfile.objects.filter(user=user).update(school=school)
+        return user
+
+    def export(self, user, name, **params):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_csv_respects_role_scope(self):
+        """Учитель выгружает ответы только своей школы; выбранные варианты — одной ячейкой"""
+        response = self.export(self.teacher, 'user-answer-export')
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([int(row["user_id"]) for row in rows], [self.student.id])
+        self.assertEqual(sorted(json.loads(rows[0]["selected_answers"])), [c.id for c in self.choices])
+
+    def test_ndjson_gzip_with_filters(self):
+        """NDJSON сжимается на лету; фильтры списка применяются к выгрузке"""
+        response = self.export(self.other, 'user-progress-export', output="ndjson", gzip=1, quiz=self.quiz.id)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("progress.ndjson.gz", response["Content-Disposition"])
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["user_id"] for line in lines], [self.other.id])
+
+        response = self.export(self.other, 'user-progress-export', quiz=self.quiz.id + 1)
+        self.assertEqual(b"".join(response.streaming_content).decode().strip(), ",".join(
+            ["id", "user_id", "quiz_id", "school_id", "school_class_id", "school_class_prefix_id", "total_questions",
+             "answered_questions", "correct_answers", "total_points", "earned_points", "score_percentage",
+             "completed_at"]))
+
+    def test_unknown_format(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.student).access_token))
+        response = self.client.get(reverse('user-answer-export'), {"output": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,174 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading
+from apps.quizzes.normalization import normalize, within_distance
+from apps.quizzes.models import (
+    Quiz, Question, Answer, OrderingItem, MatchingPair, Group, GroupItem,
+    InputAnswer, InputAnswerItem, SelectOption, SelectOptionItem, QuestionType, UserAnswer
+)
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class GradingTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Тест со всеми типами вопросов"""
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.url = reverse('user-answer-submit')
+
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.single = Question.objects.create(quiz=self.quiz, text="1", question_type=QuestionType.SINGLE_CHOICE)
+        self.right = Answer.objects.create(question=self.single, text="A", is_correct=True)
+        self.wrong = Answer.objects.create(question=self.single, text="B")
+
+        self.ordering = Question.objects.create(quiz=self.quiz, text="2", question_type=QuestionType.ORDERING)
+        self.second = OrderingItem.objects.create(question=self.ordering, text="b", order=2)
+        self.first = OrderingItem.objects.create(question=self.ordering, text="a", order=1)
+
+        self.matching = Question.objects.create(quiz=self.quiz, text="3", question_type=QuestionType.MATCHING)
+        MatchingPair.objects.create(question=self.matching, left_side="1", right_side="one")
+        MatchingPair.objects.create(question=self.matching, left_side="2", right_side="two")
+
+        self.grouping = Question.objects.create(quiz=self.quiz, text="4", question_type=QuestionType.GROUPING)
+        self.fruits = Group.objects.create(question=self.grouping, name="fruits")
+        self.apple = GroupItem.objects.create(group=self.fruits, text="apple")
+        self.colors = Group.objects.create(question=self.grouping, name="colors")
+        self.red = GroupItem.objects.create(group=self.colors, text="red")
+
+        self.input = Question.objects.create(quiz=self.quiz, text="5", question_type=QuestionType.INPUT)
+        input_answer = InputAnswer.objects.create(question=self.input, text="Столица — ___")
+        self.blank = InputAnswerItem.objects.create(inputAnswer=input_answer, number=1,
+                                                    input_correct_text=["Астана", "Нур-Султан"])
+
+        self.select = Question.objects.create(quiz=self.quiz, text="6", question_type=QuestionType.SELECT)
+        option = SelectOption.objects.create(question=self.select, text="2 + 2 = ___")
+        self.dropdown = SelectOptionItem.objects.create(selectOption=option, number=1, select_correct_text="4",
+                                                        select_option_text=["3", "4", "5"])
+
+    def submit(self, **data):
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data["is_correct"]
+
+    def test_all_question_types(self):
+        """Каждый тип вопроса проверяется по ключу"""
+        self.assertTrue(self.submit(question=self.single.id, selected_answers=[self.right.id]))
+        self.assertFalse(self.submit(question=self.single.id, selected_answers=[self.right.id, self.wrong.id]))
+        self.assertTrue(self.submit(question=self.ordering.id, selected_order=[self.first.id, self.second.id]))
+        self.assertFalse(self.submit(question=self.ordering.id, selected_order=[self.second.id, self.first.id]))
+        self.assertTrue(self.submit(question=self.matching.id, selected_matching=[
+            {"left_side": "1", "right_side": "one"}, ["2", "two"]]))
+        self.assertFalse(self.submit(question=self.matching.id, selected_matching=[["1", "two"], ["2", "one"]]))
+        self.assertTrue(self.submit(question=self.grouping.id, selected_grouping=[
+            {"group": self.fruits.id, "items": [self.apple.id]}, {"group": self.colors.id, "items": [self.red.id]}]))
+        self.assertFalse(self.submit(question=self.grouping.id, selected_grouping=[
+            {"group": self.fruits.id, "items": [self.apple.id, self.red.id]}]))
+        self.assertTrue(self.submit(question=self.input.id, input_text="  астана "))
+        self.assertTrue(self.submit(question=self.input.id, selected_values={str(self.blank.id): "Нур-Султан"}))
+        self.assertFalse(self.submit(question=self.input.id, input_text="Алматы"))
+        self.assertTrue(self.submit(question=self.select.id, selected_values={str(self.dropdown.id): "4"}))
+        self.assertFalse(self.submit(question=self.select.id, selected_values={str(self.dropdown.id): "5"}))
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 13)
+
+    def test_foreign_answer_rejected(self):
+        """Варианты чужого вопроса не принимаются"""
+        other = Question.objects.create(quiz=self.quiz, text="7", question_type=QuestionType.SINGLE_CHOICE)
+        foreign = Answer.objects.create(question=other, text="C", is_correct=True)
+        response = self.client.post(self.url, {"question": self.single.id, "selected_answers": [foreign.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_foreign_select_option_rejected(self):
+        """Выпадающий список чужого вопроса не принимается и при отправке одного ответа"""
+        other = Question.objects.create(quiz=self.quiz, text="7", question_type=QuestionType.SELECT)
+        foreign = SelectOption.objects.create(question=other, text="___")
+        response = self.client.post(self.url, {"question": self.select.id, "selected_option": foreign.id},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("selected_option", response.data)
+        self.assertFalse(UserAnswer.objects.exists())
+
+    def test_key_cached_and_rebuilt_on_change(self):
+        """Ключ собирается один раз на версию и пересобирается после изменения содержимого"""
+        question = Question.objects.select_related("quiz").get(pk=self.single.pk)
+        key = grading.get_answer_key(question)
+        self.assertEqual(key.correct, frozenset({self.right.id}))
+
+        with self.assertNumQueries(0):
+            grading.get_answer_key(question)
+
+        self.wrong.is_correct = True
+        self.wrong.save()
+        question = Question.objects.select_related("quiz").get(pk=self.single.pk)
+        self.assertEqual(grading.get_answer_key(question).correct, frozenset({self.right.id, self.wrong.id}))
+
+    def test_input_normalization_and_typos(self):
+        """Латиница вместо похожей кириллицы, пунктуация и пробелы не делают ответ неверным; опечатки — по настройке"""
+        self.blank.refresh_from_db()
+        self.assertEqual(self.blank.input_correct_normalized, ["астана", "нур-султан"])
+        self.assertTrue(InputAnswerItem.objects.filter(input_correct_normalized__contains=["астана"]).exists())
+
+        self.assertTrue(self.submit(question=self.input.id, input_text="AСTAHA!"))  # Латинские A, T, H
+        self.assertTrue(self.submit(question=self.input.id, input_text=" нур\u2010султан. "))
+        self.assertFalse(self.submit(question=self.input.id, input_text="Астна"))
+
+        self.blank.max_typos = 1
+        self.blank.save()
+        self.assertTrue(self.submit(question=self.input.id, input_text="Астна"))
+        self.assertFalse(self.submit(question=self.input.id, input_text="Аста"))
+
+    def test_signed_and_fraction_answers(self):
+        """Ответ «-5» не принимает «5», ответ «1/2» не принимает «1 2»; то же для выпадающего списка"""
+        self.blank.input_correct_text = ["-5", "1/2"]
+        self.blank.save()
+        self.assertTrue(self.submit(question=self.input.id, input_text="−5"))
+        self.assertFalse(self.submit(question=self.input.id, input_text="5"))
+        self.assertTrue(self.submit(question=self.input.id, input_text="1/2."))
+        self.assertFalse(self.submit(question=self.input.id, input_text="1 2"))
+
+        self.dropdown.select_correct_text = "-4"
+        self.dropdown.select_option_text = ["4", "-4"]
+        self.dropdown.save()
+        self.assertTrue(self.submit(question=self.select.id, selected_values={str(self.dropdown.id): "-4"}))
+        self.assertFalse(self.submit(question=self.select.id, selected_values={str(self.dropdown.id): "4"}))
+
+
+class NormalizationTests(TestCase):
+    def test_within_distance(self):
+        self.assertTrue(within_distance("астана", "астана", 0))
+        self.assertTrue(within_distance("астана", "остана", 1))
+        self.assertTrue(within_distance("астана", "астанаа", 1))
+        self.assertFalse(within_distance("астана", "оcтонa", 2))
+        self.assertFalse(within_distance("a", "abcd", 2))
+        self.assertTrue(within_distance("", "ab", 2))
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Ёлка,   Ə-ɵ ТЕСТ "), "елка ә-ө тест")
+        self.assertEqual(normalize("«Абай» — поэт."), "абай поэт")
+        self.assertEqual(normalize(None), "")
+
+    def test_normalize_keeps_numbers(self):
+        """Знак числа, дефис в слове, дроби и десятичные разделители не теряются"""
+        self.assertEqual(normalize("-5"), "-5")
+        self.assertEqual(normalize("−5"), "-5")
+        self.assertNotEqual(normalize("-5"), normalize("5"))
+        self.assertEqual(normalize("x = -2,5"), "х = -2,5")
+        self.assertEqual(normalize("1/2"), "1/2")
+        self.assertNotEqual(normalize("1/2"), normalize("1 2"))
+        self.assertEqual(normalize("3.14."), "3.14")
+        self.assertEqual(normalize("1, 2, 3"), "1 2 3")
+        self.assertEqual(normalize("Темно-синий"), "темно-синий")
+
+    def test_normalize_is_case_insensitive(self):
+        """Регистр не влияет на замену похожих букв: латиница и кириллица в любом регистре совпадают"""
+        for left, right in [("Book", "book"), ("HTML", "html"), ("BOOK", "воок"), ("Hello", "HELLO"),
+                            ("Ivan", "IVAN"), ("Тест", "TECT"), ("Мама", "MAMA"), ("Ыбырай", "ыбырай")]:
+            with self.subTest(left=left, right=right):
+                self.assertEqual(normalize(left), normalize(right))
+        self.assertNotEqual(normalize("book"), normalize("look"))
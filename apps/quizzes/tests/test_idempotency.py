@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import idempotency
+from apps.quizzes.models import Question, QuestionType, IdempotencyRecord, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class IdempotencyTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.quiz, (self.question,) = self.create_quiz(1)
+        self.right, self.wrong = self.question.right, self.question.wrong
+
+    def submit(self, answer, key="retry-1"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('user-answer-submit'),
+                                    {"question": self.question.id, "selected_answers": [answer.id]},
+                                    format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response(self):
+        first = self.submit(self.right)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", first)
+
+        replay = self.submit(self.right)
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 1)
+
+        # Без кэша ответ читается из базы
+        cache.clear()
+        self.assertEqual(self.submit(self.right).json(), first.json())
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 1)
+
+        # Другой ключ — новая отправка
+        self.assertNotIn("Idempotent-Replayed", self.submit(self.wrong, key="retry-2"))
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 2)
+
+    def test_key_reuse_with_other_body_is_rejected(self):
+        self.submit(self.right)
+        response = self.submit(self.wrong)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(UserQuizProgress.objects.get(user=self.user, quiz=self.quiz).correct_answers, 1)
+
+    def test_batch_and_finish_are_idempotent(self):
+        data = {"quiz": self.quiz.id, "answers": [{"question": self.question.id, "selected_answers": [self.right.id]}]}
+        for _ in range(2):
+            response = self.client.post(reverse('user-answer-submit-batch'), data, format='json',
+                                        HTTP_IDEMPOTENCY_KEY="batch")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 1)
+
+        self.client.post(reverse('user-answer-draft'), data, format='json')
+        first = self.client.post(reverse('user-answer-finish'), {"quiz": self.quiz.id}, format='json',
+                                 HTTP_IDEMPOTENCY_KEY="finish")
+        replay = self.client.post(reverse('user-answer-finish'), {"quiz": self.quiz.id}, format='json',
+                                  HTTP_IDEMPOTENCY_KEY="finish")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 2)
+
+    def test_failed_request_releases_key(self):
+        """Ошибка проверки откатывает транзакцию вместе с ключом: исправленный запрос проходит"""
+        other = Question.objects.create(quiz=self.quiz, text="2", question_type=QuestionType.SINGLE_CHOICE)
+        response = self.client.post(reverse('user-answer-submit'),
+                                    {"question": other.id, "selected_answers": [self.right.id]},
+                                    format='json', HTTP_IDEMPOTENCY_KEY="retry-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.assertEqual(self.submit(self.right).status_code, status.HTTP_200_OK)
+
+    def test_prune_removes_old_records(self):
+        self.submit(self.right)
+        self.assertEqual(idempotency.prune(), 0)
+        IdempotencyRecord.objects.update(created_at="2000-01-01T00:00:00Z")
+        self.assertEqual(idempotency.prune(), 1)
@@ -0,0 +1,111 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.quizzes import grading, interchange
+from apps.quizzes.models import Quiz, Question, QuestionType, GroupItem, SelectOptionItem, StratifyBy
+from apps.users.models import CustomUser
+
+TREE = {
+    "version": 1,
+    "title": "Банк вопросов",
+    "description": "Все типы",
+    "shuffle": False,
+    "pool": {"size": 4, "stratify_by": StratifyBy.DIFFICULTY},
+    "questions": [
+        {"text": "2+2", "question_type": QuestionType.SINGLE_CHOICE, "points": "1.00", "difficulty": 2,
+         "answers": [{"text": "4", "is_correct": True}, {"text": "5", "is_correct": False}]},
+        {"text": "Порядок", "question_type": QuestionType.ORDERING, "points": "2.50", "difficulty": 3,
+         "ordering_items": [{"text": "a", "order": 1}, {"text": "b", "order": 2}]},
+        {"text": "Пары", "question_type": QuestionType.MATCHING, "points": "1.00", "difficulty": 2,
+         "matching_pairs": [{"left_side": "Астана", "right_side": "Казахстан"}]},
+        {"text": "Группы", "question_type": QuestionType.GROUPING, "points": "1.00", "difficulty": 2,
+         "groups": [{"name": "Четные", "items": [{"text": "2"}, {"text": "4"}]}, {"name": "Нечетные", "items": []}]},
+        {"text": "Ввод", "question_type": QuestionType.INPUT, "points": "1.00", "difficulty": 2,
+         "input_answers": [{"text": "Столица — [1]", "items": [
+             {"number": 1, "input_placeholder": "город", "input_correct_text": ["Астана", "Astana"],
+              "max_typos": 1}]}]},
+        {"text": "Список", "question_type": QuestionType.SELECT, "points": "1.00", "difficulty": 2,
+         "select_options": [{"text": "[1] + [1]", "items": [
+             {"number": 1, "select_placeholder": None, "select_correct_text": "2",
+              "select_option_text": ["1", "2", "3"]}]}]},
+    ],
+}
+
+
+class InterchangeTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(email='admin@email.com', password='testpassword',
+                                                    role=CustomUser.Role.ADMIN)
+        self.login(self.admin)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+
+    def test_json_round_trip(self):
+        """Импорт создает дерево постоянным числом запросов; экспорт возвращает тот же документ"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('quiz-import-tree'), TREE, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        quiz = Quiz.objects.get(pk=response.data["id"])
+        self.assertEqual(response.data["questions"], 6)
+        self.assertLessEqual(len(queries), 20)
+        self.assertEqual(list(quiz.questions.order_by("position").values_list("position", flat=True)),
+                         list(range(6)))
+        # Ключ ответов собирается из импортированных объектов
+        self.assertEqual(len(grading.compile_quiz(quiz.id, quiz.content_version).questions), 6)
+        # Настройки выборки и перемешивания переносятся вместе с вопросами
+        self.assertFalse(quiz.shuffle)
+        self.assertEqual((quiz.pool.size, quiz.pool.stratify_by), (4, StratifyBy.DIFFICULTY))
+        self.assertEqual(grading.compile_quiz(quiz.id, quiz.content_version).pool_size, 4)
+
+        response = self.client.get(reverse('quiz-export-tree', args=[quiz.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), TREE)
+
+    def test_csv_round_trip(self):
+        quiz = interchange.import_quiz(TREE)
+        response = self.client.get(reverse('quiz-export-tree', args=[quiz.id]), {"output": "csv"})
+        content = response.content
+        upload = SimpleUploadedFile("bank.csv", content, content_type="text/csv")
+        response = self.client.post(reverse('quiz-import-tree'), {"file": upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(interchange.dump(interchange.load_quiz(response.data["id"])), TREE)
+
+    def test_defaults_without_pool(self):
+        """Файл без shuffle и pool — тест с перемешиванием без пула; экспорт пишет pool: null"""
+        tree = {key: value for key, value in TREE.items() if key not in ("shuffle", "pool")}
+        quiz = interchange.import_quiz(tree)
+        self.assertTrue(quiz.shuffle)
+        self.assertFalse(Quiz.objects.filter(pk=quiz.pk, pool__isnull=False).exists())
+        self.assertEqual(interchange.dump(interchange.load_quiz(quiz.id)), {**tree, "shuffle": True, "pool": None})
+        response = self.client.get(reverse('quiz-export-tree', args=[quiz.id]), {"output": "csv"})
+        upload = SimpleUploadedFile("bank.csv", response.content, content_type="text/csv")
+        response = self.client.post(reverse('quiz-import-tree'), {"file": upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertFalse(Quiz.objects.filter(pk=response.data["id"], pool__isnull=False).exists())
+
+    def test_invalid_file_writes_nothing(self):
+        """Ошибка в последнем вопросе отклоняет весь файл"""
+        tree = json.loads(json.dumps(TREE))
+        tree["questions"][-1]["answers"] = [{"text": "лишнее"}]
+        tree["questions"][1]["ordering_items"][1]["order"] = 1
+        response = self.client.post(reverse('quiz-import-tree'), tree, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("questions", response.data)
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(GroupItem.objects.exists() or SelectOptionItem.objects.exists())
+
+    def test_export_requires_staff(self):
+        quiz = interchange.import_quiz(TREE)
+        self.login(CustomUser.objects.create_user(email='student@email.com', password='testpassword'))
+        response = self.client.get(reverse('quiz-export-tree', args=[quiz.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('quiz-import-tree'), TREE, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,92 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.education.models import Region, City, School
+from apps.quizzes import leaderboards
+from apps.users.models import CustomUser, UserProfile
+
+from .utils import QuizTestMixin
+
+
+class LeaderboardTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = leaderboards.get_backend().client
+        region = Region.objects.create(name="Акмолинская")
+        city = City.objects.create(name="Астана", region=region)
+        self.schools = [School.objects.create(name="НИШ", city=city), School.objects.create(name="Лицей", city=city)]
+        self.quiz, self.questions = self.create_quiz(4)
+
+        # Ученик i отвечает верно на i вопросов: баллы 0, 25, 50, 75, 100
+        self.students = []
+        for i in range(5):
+            student = CustomUser.objects.create_user(email=f"s{i}@email.com", password='testpassword',
+                                                     first_name=f"Ученик{i}")
+            UserProfile.objects.filter(user=student).update(school=self.schools[i % 2])
+            self.login(student)
+            for question in self.questions[:i] or self.questions[:1]:
+                # Рейтинг в Redis обновляется после фиксации транзакции
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(reverse('user-answer-submit'), {
+                        "question": question.id, "selected_answers": [question.right.id] if i else [],
+                    }, format='json')
+            self.students.append(student)
+
+    def test_top_national_and_school(self):
+        self.login(self.students[0])
+        response = self.client.get(reverse('leaderboard-list'), {"quiz": self.quiz.id, "limit": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row["user"] for row in response.data["results"]],
+                         [self.students[4].id, self.students[3].id, self.students[2].id])
+        self.assertEqual(response.data["results"][0]["name"], "Ученик4")
+
+        # Без scope_id берется школа текущего пользователя
+        response = self.client.get(reverse('leaderboard-list'), {"quiz": self.quiz.id, "scope": "school"})
+        self.assertEqual(response.data["scope_id"], self.schools[0].id)
+        self.assertEqual([row["user"] for row in response.data["results"]],
+                         [self.students[4].id, self.students[2].id, self.students[0].id])
+
+    def test_my_rank_and_neighbours(self):
+        self.login(self.students[2])
+        response = self.client.get(reverse('leaderboard-me'), {"quiz": self.quiz.id, "limit": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rank"], 3)
+        self.assertEqual([(row["rank"], row["user"]) for row in response.data["neighbours"]],
+                         [(2, self.students[3].id), (3, self.students[2].id), (4, self.students[1].id)])
+
+    def test_rebuild_matches_incremental(self):
+        entries = lambda: sorted((key, member, score) for key in self.redis.scan_iter("quizzes:leaderboard:*")
+                                 if ":user:" not in key
+                                 for member, score in self.redis.zrevrange(key, 0, -1, withscores=True))
+        incremental = entries()
+        self.assertEqual(len(incremental), 5 * 4)
+        call_command("rebuild_leaderboards", stdout=StringIO())
+        self.assertEqual(incremental, entries())
+
+    def test_deleted_student_removed(self):
+        """Удаленный ученик пропадает из всех рейтингов теста"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students[4].delete()
+        self.assertFalse(any(self.redis.zscore(key, self.students[4].id) is not None
+                             for key in self.redis.scan_iter("quizzes:leaderboard:*") if ":user:" not in key))
+        self.assertEqual(self.redis.scan_iter(f"quizzes:leaderboard:{self.quiz.id}:user:{self.students[4].id}"), [])
+
+        self.login(self.students[0])
+        response = self.client.get(reverse('leaderboard-list'), {"quiz": self.quiz.id, "limit": 1})
+        self.assertEqual(response.data["results"][0]["user"], self.students[3].id)
+
+    def test_redis_outage_does_not_fail_submit(self):
+        """Ошибка Redis после фиксации ответов не превращает сохраненную отправку в 500"""
+        self.login(self.students[0])
+        with mock.patch.object(self.redis, "pipeline", side_effect=ConnectionError), \
+                self.assertLogs("django", "ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('user-answer-submit'), {
+                "question": self.questions[1].id, "selected_answers": [self.questions[1].right.id],
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.quizzes.models import Quiz, Question, QuestionType, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.question = Question.objects.create(quiz=self.quiz, text="?", question_type=QuestionType.INPUT)
+        # Одинаковое время у нескольких ответов — порядок определяет id
+        moment = timezone.now()
+        self.answers = UserAnswer.objects.bulk_create(
+            UserAnswer(user=self.user, question=self.question, quiz=self.quiz) for _ in range(7)
+        )
+        UserAnswer.objects.filter(id__in=[a.id for a in self.answers[2:5]]).update(answered_at=moment)
+
+    def walk(self, url, params):
+        ids, response = [], self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), params["page_size"])
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_answers_walk_all_pages(self):
+        """Все ответы выдаются ровно один раз в порядке (answered_at, id) по убыванию"""
+        ids = self.walk(reverse('user-answer-list'), {"page_size": 2, "quiz": self.quiz.id})
+        expected = list(UserAnswer.objects.order_by("-answered_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_uses_row_comparison(self):
+        """Следующая страница выбирается одним сравнением строк по индексу (answered_at, id)"""
+        first = self.client.get(reverse('user-answer-list'), {"page_size": 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data["next"])
+        sql = next(q["sql"] for q in queries if 'FROM "quizzes_useranswer"' in q["sql"])
+        self.assertIn('("quizzes_useranswer"."answered_at", "quizzes_useranswer"."id") < (', sql)
+
+    def test_new_rows_do_not_shift_pages(self):
+        """Ответы, добавленные во время обхода, не дублируют и не сдвигают следующую страницу"""
+        url = reverse('user-answer-list')
+        first = self.client.get(url, {"page_size": 3})
+        UserAnswer.objects.create(user=self.user, question=self.question)
+        second = self.client.get(first.data["next"])
+        seen = [row["id"] for row in first.data["results"] + second.data["results"]]
+        self.assertEqual(len(seen), len(set(seen)))
+        expected = list(UserAnswer.objects.order_by("-answered_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected[1:7])
+
+    def test_progress_with_unfinished_tests(self):
+        """Незавершенные тесты (completed_at = NULL) идут первыми и не теряются между страницами"""
+        for i in range(5):
+            quiz = Quiz.objects.create(title=str(i))
+            UserQuizProgress.objects.create(user=self.user, quiz=quiz,
+                                            completed_at=timezone.now() if i % 2 else None)
+        ids = self.walk(reverse('user-progress-list'), {"page_size": 2})
+        expected = list(UserQuizProgress.objects.order_by("-completed_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(UserQuizProgress.objects.get(id=ids[0]).completed_at)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('user-answer-list'), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('user-answer-list'), {"cursor": "WyJub3QgYSBkYXRlIiwgMV0"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,68 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.quizzes import grading, partitions, services
+from apps.quizzes.models import Quiz, Question, Answer, QuestionType, UserAnswer, UserAnswerSelection
+from apps.users.models import CustomUser
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="s@email.com", password="testpassword",
+                                                   role=CustomUser.Role.STUDENT)
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.question = Question.objects.create(quiz=self.quiz, text="?", question_type=QuestionType.SINGLE_CHOICE)
+        self.right = Answer.objects.create(question=self.question, text="right", is_correct=True)
+
+        # Ответ двухлетней давности и текущий
+        self.old = self.answer()
+        self.recent = self.answer()
+        now = timezone.localtime()
+        self.old_at = partitions.month_start(now.year - 2, now.month) + timedelta(days=1)
+        UserAnswer.objects.filter(pk=self.old.pk).update(answered_at=self.old_at)
+        UserAnswerSelection.objects.filter(useranswer=self.old).update(answered_at=self.old_at)
+
+    def answer(self):
+        answer = UserAnswer.objects.create(user=self.user, question=self.question, is_correct=True)
+        answer.selected_answers.add(self.right, through_defaults={"answered_at": answer.answered_at})
+        return answer
+
+    def test_convert_archive_restore(self):
+        self.assertTrue(partitions.convert(months_ahead=2))
+        self.assertTrue(partitions.is_partitioned())
+        self.assertFalse(partitions.convert())
+        self.assertEqual(UserAnswer.objects.count(), 2)
+        self.assertEqual(list(self.recent.selected_answers.all()), [self.right])
+
+        # Строки лежат в секциях своих месяцев; новые ответы сохраняются через ORM
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {UserAnswer._meta.db_table} WHERE id = %s",
+                           [self.old.pk])
+            self.assertEqual(cursor.fetchone()[0], partitions.partition_name(
+                UserAnswer._meta.db_table, timezone.localtime(self.old_at)))
+        quiz_key = grading.get_quiz_key(self.quiz)
+        saved = services.build_answer(self.user.id, quiz_key.get(self.question.id),
+                                      {"selected_answers": [self.right.id]})
+        services.save_answers(self.user.id, quiz_key, [saved])
+        self.assertGreater(saved.pk, self.recent.pk)
+        self.assertEqual(UserAnswerSelection.objects.filter(useranswer_id=saved.pk).count(), 1)
+        self.assertEqual(partitions.create_partitions(months_ahead=2), [])
+        self.assertEqual(len(partitions.create_partitions(months_ahead=3)), 2)
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            archived = partitions.archive_partitions(12, output_dir)
+            # Архивируются все месяцы старше года, в том числе пустые; текущие секции остаются
+            self.assertEqual(len(archived), 2 * 12)
+            self.assertTrue(all(os.path.exists(path) for path in archived))
+            self.assertTrue(UserAnswer.objects.filter(pk=self.recent.pk).exists())
+            self.assertFalse(UserAnswer.objects.filter(pk=self.old.pk).exists())
+            self.assertFalse(UserAnswerSelection.objects.filter(useranswer_id=self.old.pk).exists())
+
+            for path in archived:
+                partitions.restore_partition(path)
+        self.assertEqual(list(UserAnswer.objects.get(pk=self.old.pk).selected_answers.all()), [self.right])
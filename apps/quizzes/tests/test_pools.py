@@ -0,0 +1,120 @@
+import json
+import random
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading, pools
+from apps.quizzes.models import (
+    Quiz, Question, Answer, QuestionType, Difficulty, QuestionPool, QuestionDraw, StratifyBy, UserQuizProgress
+)
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class SamplingTests(SimpleTestCase):
+    def test_allocate_is_proportional(self):
+        self.assertEqual(pools.allocate([8, 4], 6), [4, 2])
+        self.assertEqual(pools.allocate([5, 3, 2], 5), [3, 1, 1])
+        self.assertEqual(sum(pools.allocate([1, 1, 1], 2)), 2)
+        self.assertEqual(pools.allocate([2, 1], 10), [2, 1])
+
+    def test_sample_is_distinct(self):
+        ids = list(range(100, 300))
+        rng = random.Random(1)
+        for k in (0, 1, 10, 200):
+            drawn = pools.sample(ids, k, rng)
+            self.assertEqual(len(set(drawn)), k)
+            self.assertTrue(set(drawn) <= set(ids))
+
+
+class PoolTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Пул из 12 вопросов (8 легких, 4 сложных), ученик получает 6"""
+        super().setUp()
+        self.manager = CustomUser.objects.create_user(email='manager@email.com', password='testpassword',
+                                                      role=CustomUser.Role.CONTENT_MANAGER)
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.quiz = Quiz.objects.create(title="Quiz", shuffle=False)
+        self.right = {}
+        for i in range(12):
+            difficulty = Difficulty.EASY if i < 8 else Difficulty.HARD
+            question = Question.objects.create(quiz=self.quiz, text=str(i), difficulty=difficulty,
+                                               question_type=QuestionType.SINGLE_CHOICE)
+            self.right[question.id] = Answer.objects.create(question=question, text="A", is_correct=True).id
+        QuestionPool.objects.create(quiz=self.quiz, size=6, stratify_by=StratifyBy.DIFFICULTY)
+        self.quiz.refresh_from_db()
+        self.url = reverse('quiz-detail', args=[self.quiz.id])
+
+    def drawn_ids(self):
+        self.login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q["id"] for q in json.loads(response.content)["questions"]]
+
+    def submit(self, question_id):
+        return self.client.post(reverse('user-answer-submit'),
+                                {"question": question_id, "selected_answers": [self.right[question_id]]},
+                                format='json')
+
+    def test_draw_is_stratified_and_recorded(self):
+        ids = self.drawn_ids()
+        self.assertEqual(len(ids), 6)
+        difficulties = list(Question.objects.filter(id__in=ids).values_list("difficulty", flat=True))
+        self.assertEqual(sorted(difficulties), [Difficulty.EASY] * 4 + [Difficulty.HARD] * 2)
+        self.assertEqual(self.drawn_ids(), ids)
+        self.assertEqual(QuestionDraw.objects.get(user=self.user, quiz=self.quiz).total_questions, 6)
+
+        # Опубликованный снимок отдает ту же выборку
+        self.login(self.manager)
+        self.client.post(reverse('quiz-publish', args=[self.quiz.id]))
+        self.assertEqual(self.drawn_ids(), ids)
+
+    def test_progress_counts_drawn_questions(self):
+        ids = self.drawn_ids()
+        outside = next(question_id for question_id in self.right if question_id not in ids)
+        self.assertEqual(self.submit(outside).status_code, status.HTTP_400_BAD_REQUEST)
+
+        for question_id in ids:
+            self.assertEqual(self.submit(question_id).status_code, status.HTTP_200_OK)
+        progress = UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((progress.total_questions, progress.correct_answers), (6, 6))
+        self.assertEqual(progress.score_percentage, 100.0)
+        self.assertIsNotNone(progress.completed_at)
+
+        response = self.client.get(reverse('user-progress-resume'), {"quiz": self.quiz.id})
+        self.assertEqual(response.data["total_questions"], 6)
+        self.assertEqual(sorted(state["question"] for state in response.data["questions"]), sorted(ids))
+
+        progress.update_progress()
+        self.assertEqual((progress.total_questions, progress.score_percentage), (6, 100.0))
+
+    def test_draw_from_published_snapshot(self):
+        """Вопросы, добавленные после публикации, в выборку не попадают: ученик видит всю выборку и завершает тест"""
+        self.login(self.manager)
+        self.client.post(reverse('quiz-publish', args=[self.quiz.id]))
+        published = set(self.right)
+        for i in range(20):
+            question = Question.objects.create(quiz=self.quiz, text=f"new {i}", difficulty=Difficulty.EASY,
+                                               question_type=QuestionType.SINGLE_CHOICE)
+            self.right[question.id] = Answer.objects.create(question=question, text="A", is_correct=True).id
+
+        ids = self.drawn_ids()
+        self.assertEqual(len(ids), 6)
+        self.assertTrue(set(ids) <= published)
+        for question_id in ids:
+            self.assertEqual(self.submit(question_id).status_code, status.HTTP_200_OK)
+        progress = UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual(progress.total_questions, 6)
+        self.assertIsNotNone(progress.completed_at)
+
+    def test_pool_change_refreshes_key(self):
+        key = grading.get_quiz_key(self.quiz)
+        self.assertEqual((key.pool_size, [len(ids) for _, ids in key.strata]), (6, [8, 4]))
+        QuestionPool.objects.filter(quiz=self.quiz).get().delete()
+        self.quiz.refresh_from_db()
+        self.assertEqual(grading.get_quiz_key(self.quiz).pool_size, 0)
+        self.assertEqual(len(self.drawn_ids()), 12)
@@ -0,0 +1,136 @@
+import threading
+
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading
+from apps.quizzes.models import Question, QuestionType, UserQuizProgress
+from apps.quizzes.progress import record_answers
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class ProgressTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Тест из десяти вопросов с одним правильным вариантом"""
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.quiz, self.questions = self.create_quiz(10)
+
+    def submit(self, question, correct=True):
+        answer = question.right if correct else question.wrong
+        response = self.client.post(reverse('user-answer-submit'),
+                                    {"question": question.id, "selected_answers": [answer.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response
+
+    def progress(self):
+        return UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+
+    def test_positions_are_stable(self):
+        """Вопросы получают последовательные позиции"""
+        self.assertEqual([q.position for q in self.questions], list(range(10)))
+
+    def test_positions_are_not_reused(self):
+        """Номер удаленного последнего вопроса не достается новому; одинаковые номера запрещены"""
+        self.questions[9].delete()
+        question = Question.objects.create(quiz=self.quiz, text="new", question_type=QuestionType.SINGLE_CHOICE)
+        self.assertEqual(question.position, 10)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Question.objects.create(quiz=self.quiz, text="dup", question_type=QuestionType.SINGLE_CHOICE, position=3)
+
+    def test_repeated_answers_do_not_inflate(self):
+        """Повторный ответ заменяет прежний результат"""
+        self.submit(self.questions[0])
+        self.submit(self.questions[0])
+        self.submit(self.questions[9], correct=False)
+        progress = self.progress()
+        self.assertEqual((progress.answered_questions, progress.correct_answers), (2, 1))
+        self.assertEqual(progress.score_percentage, 10.0)
+
+        self.submit(self.questions[0], correct=False)
+        self.submit(self.questions[9])
+        progress = self.progress()
+        self.assertEqual((progress.answered_questions, progress.correct_answers), (2, 1))
+        self.assertTrue(progress.is_correct(9))
+        self.assertFalse(progress.is_correct(0))
+        self.assertIsNone(progress.completed_at)
+
+    def test_completion_and_recompute(self):
+        """Ответ на все вопросы завершает тест; полный пересчет дает тот же результат"""
+        for question in self.questions:
+            self.submit(question, correct=question.position % 2 == 0)
+        progress = self.progress()
+        self.assertIsNotNone(progress.completed_at)
+        self.assertEqual((progress.answered_questions, progress.correct_answers), (10, 5))
+
+        counters = (progress.answered_questions, progress.correct_answers, bytes(progress.correct_bits))
+        progress.update_progress()
+        progress.refresh_from_db()
+        self.assertEqual(counters, (progress.answered_questions, progress.correct_answers,
+                                    bytes(progress.correct_bits)))
+
+    def test_submit_query_count_is_constant(self):
+        """Стоимость отправки не зависит от числа уже данных ответов"""
+        self.submit(self.questions[0])
+        with CaptureQueriesContext(connection) as first:
+            self.submit(self.questions[1])
+        for question in self.questions[2:]:
+            self.submit(question)
+        with CaptureQueriesContext(connection) as last:
+            self.submit(self.questions[0])
+        self.assertEqual(len(first), len(last))
+
+    def test_resume(self):
+        """Продолжение теста возвращает состояние каждого вопроса"""
+        self.submit(self.questions[3], correct=False)
+        response = self.client.get(reverse('user-progress-resume'), {"quiz": self.quiz.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        states = response.data["questions"]
+        self.assertEqual(len(states), 10)
+        self.assertEqual(states[3], {"question": self.questions[3].id, "position": 3,
+                                     "answered": True, "is_correct": False, "score": 0})
+        self.assertFalse(states[0]["answered"])
+
+
+class ConcurrentProgressTests(QuizTestMixin, TransactionTestCase):
+    def test_first_submissions_are_serialized(self):
+        """Вторая одновременная первая отправка ждет первую и видит ее прогресс как прежний"""
+        user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        quiz, _ = self.create_quiz(2)
+        quiz_key = grading.get_quiz_key(quiz)
+        recorded, release, previous = threading.Event(), threading.Event(), {}
+
+        def first():
+            try:
+                with transaction.atomic():
+                    record_answers(user.id, quiz_key, [(0, True, 1)])
+                    recorded.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def second():
+            try:
+                with transaction.atomic():
+                    previous["value"] = record_answers(user.id, quiz_key, [(1, True, 1)]).previous
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        threads[0].start()
+        self.assertTrue(recorded.wait(5))
+        threads[1].start()
+        threads[1].join(0.5)
+        self.assertTrue(threads[1].is_alive())
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertIsNotNone(previous["value"])
+        self.assertEqual(UserQuizProgress.objects.get(user=user, quiz=quiz).answered_questions, 2)
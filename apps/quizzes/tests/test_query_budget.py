@@ -0,0 +1,81 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading
+from apps.quizzes.models import (
+    Quiz, Question, Answer, OrderingItem, MatchingPair, Group, GroupItem,
+    InputAnswer, InputAnswerItem, SelectOption, SelectOptionItem, QuestionType
+)
+from apps.quizzes.services import build_answer, save_answers
+from apps.users.models import CustomUser
+
+from .utils import QueryBudgetMixin, QuizTestMixin
+
+
+class QueryBudgetTests(QuizTestMixin, QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='admin@email.com', password='testpassword',
+                                                   role=CustomUser.Role.ADMIN)
+        self.login(self.user)
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.add_questions()
+
+    def add_questions(self, quiz=None):
+        """По одному вопросу каждого типа со всеми дочерними объектами и ответ пользователя на каждый"""
+        quiz = quiz or self.quiz
+        questions = []
+        for question_type in QuestionType.values:
+            question = Question.objects.create(quiz=quiz, text=question_type, question_type=question_type)
+            Answer.objects.create(question=question, text="a", is_correct=True)
+            Answer.objects.create(question=question, text="b")
+            OrderingItem.objects.create(question=question, text="a", order=1)
+            OrderingItem.objects.create(question=question, text="b", order=2)
+            MatchingPair.objects.create(question=question, left_side="a", right_side="b")
+            group = Group.objects.create(question=question, name="g")
+            GroupItem.objects.create(group=group, text="a")
+            GroupItem.objects.create(group=group, text="b")
+            input_answer = InputAnswer.objects.create(question=question, text="t")
+            InputAnswerItem.objects.create(inputAnswer=input_answer, input_correct_text=["a"])
+            InputAnswerItem.objects.create(inputAnswer=input_answer, input_correct_text=["b"])
+            select_option = SelectOption.objects.create(question=question, text="t")
+            SelectOptionItem.objects.create(selectOption=select_option, select_correct_text="a")
+            SelectOptionItem.objects.create(selectOption=select_option, select_correct_text="b")
+            questions.append(question)
+
+        quiz.refresh_from_db()
+        quiz_key = grading.get_quiz_key(quiz)
+        answers = [build_answer(self.user, quiz_key.get(q.id),
+                                {"selected_answers": list(quiz_key.get(q.id).correct)}) for q in questions]
+        save_answers(self.user, quiz_key, answers)
+
+    def assertFlat(self, url, params=None, grow=None):
+        def request():
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response
+
+        return self.assertQueryBudget(request, grow or self.add_questions)
+
+    def test_quizzes(self):
+        self.assertFlat(reverse('quiz-list'), grow=lambda: self.add_questions(Quiz.objects.create(title="Another")))
+        self.assertFlat(reverse('quiz-detail', args=[self.quiz.id]))
+
+    def test_questions(self):
+        self.assertFlat(reverse('question-list'), {"quiz": self.quiz.id})
+        question = self.quiz.questions.first()
+        self.assertFlat(reverse('question-detail', args=[question.id]))
+
+    def test_content_lists(self):
+        for name in ['answer', 'ordering-item', 'matching-pair', 'group', 'group-item', 'input-answer',
+                     'input-answer-item', 'select-option', 'select-option-item']:
+            with self.subTest(name):
+                self.assertFlat(reverse(f'{name}-list'))
+
+    def test_user_answers_and_progress(self):
+        self.assertFlat(reverse('user-answer-list'))
+        self.assertFlat(reverse('user-progress-list'),
+                        grow=lambda: self.add_questions(Quiz.objects.create(title="Another")))
+        self.assertFlat(reverse('my-progress'), grow=lambda: self.add_questions(Quiz.objects.create(title="Another")))
+        self.assertFlat(reverse('user-progress-resume'), {"quiz": self.quiz.id})
@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.education.models import Region, City, School, SchoolClass
+from apps.quizzes import rollups
+from apps.quizzes.models import Quiz, QuizRollup
+from apps.users.models import CustomUser, UserProfile
+
+from .utils import QuizTestMixin
+
+
+class RollupTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        city = City.objects.create(name="Астана", region=Region.objects.create(name="Акмолинская"))
+        self.school = School.objects.create(name="НИШ", city=city)
+        self.classes = [SchoolClass.objects.create(grade=9), SchoolClass.objects.create(grade=10)]
+        self.students = [self.create_user(f"s{i}@email.com", CustomUser.Role.STUDENT, self.classes[i % 2])
+                         for i in range(4)]
+        self.teacher = self.create_user("teacher@email.com", CustomUser.Role.TEACHER)
+
+        self.quiz, self.questions = self.create_quiz(2)
+
+    def create_user(self, email, role, school_class=None):
+        user = CustomUser.objects.create_user(email=email, password='testpassword', role=role)
+        UserProfile.objects.filter(user=user).update(school=self.school, school_class=school_class)
+        return user
+
+    def submit(self, user, question, correct):
+        self.login(user)
+        answer = question.right if correct else question.wrong
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('user-answer-submit'),
+                                        {"question": question.id, "selected_answers": [answer.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def snapshot(self):
+        return sorted((r.school_class_id, r.attempts, r.completed, round(r.score_sum, 6), r.histogram)
+                      for r in QuizRollup.objects.filter(quiz=self.quiz))
+
+    def test_incremental_matches_reconcile(self):
+        """Сводки после отправок совпадают с пересборкой из прогресса"""
+        self.submit(self.students[0], self.questions[0], True)
+        self.submit(self.students[0], self.questions[1], False)
+        self.submit(self.students[1], self.questions[0], True)
+        self.submit(self.students[2], self.questions[0], False)
+        # Повторный ответ меняет балл, но не число попыток
+        self.submit(self.students[0], self.questions[1], True)
+        incremental = self.snapshot()
+        rollups.reconcile(self.quiz.id)
+        self.assertEqual(incremental, self.snapshot())
+
+        first_class = QuizRollup.objects.get(quiz=self.quiz, school_class=self.classes[0])
+        self.assertEqual((first_class.attempts, first_class.completed), (2, 1))
+        self.assertEqual(first_class.histogram[9], 1)
+
+    def test_only_dirty_quizzes_are_reconciled(self):
+        """Задача сверяет тесты с изменениями, в том числе после удаления ученика, и снимает с них отметку"""
+        for student in self.students[:3]:
+            self.submit(student, self.questions[0], True)
+        other = Quiz.objects.create(title="Other")
+        QuizRollup.objects.create(quiz=other, attempts=5)  # Расхождение без отметки не трогаем
+        self.assertEqual(rollups.reconcile_dirty(), 1)
+        self.assertEqual(rollups.reconcile_dirty(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students[0].delete()
+        self.assertEqual(sum(r.attempts for r in QuizRollup.objects.filter(quiz=self.quiz)), 3)
+        self.assertEqual(rollups.reconcile_dirty(batch_size=1), 1)
+        self.assertEqual(sum(r.attempts for r in QuizRollup.objects.filter(quiz=self.quiz)), 2)
+        self.assertEqual(QuizRollup.objects.get(quiz=other).attempts, 5)
+
+    def test_redis_outage_does_not_fail_submit(self):
+        """Ошибка Redis при отметке теста не отменяет сохраненные ответы и удаление ученика"""
+        broken = mock.Mock(**{"zadd.side_effect": ConnectionError})
+        with mock.patch("apps.quizzes.rollups.get_client", return_value=broken), \
+                self.assertLogs("apps.quizzes.rollups", "WARNING"):
+            self.submit(self.students[0], self.questions[0], True)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.students[1].delete()
+        self.assertEqual(QuizRollup.objects.get(quiz=self.quiz).attempts, 1)
+
+    def test_stats_endpoint(self):
+        """Учитель видит сводки своей школы и общий итог; ученик — ничего"""
+        for student in self.students:
+            self.submit(student, self.questions[0], True)
+
+        self.login(self.teacher)
+        response = self.client.get(reverse('quiz-stats-list'), {"quiz": self.quiz.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(reverse('quiz-stats-summary'), {"quiz": self.quiz.id})
+        self.assertEqual((response.data["attempts"], response.data["average_score"]), (4, 50.0))
+        self.assertEqual(response.data["histogram"][5], 4)
+
+        self.login(self.students[0])
+        self.assertEqual(self.client.get(reverse('quiz-stats-list')).data, [])
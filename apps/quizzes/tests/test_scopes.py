@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.education.models import Region, City, School, SchoolClass
+from apps.quizzes.models import Quiz, Question, Answer, QuestionType, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser, UserProfile
+
+from .utils import QuizTestMixin
+
+
+class AnswerScopeTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        city = City.objects.create(name="Астана", region=Region.objects.create(name="Акмолинская"))
+        self.school = School.objects.create(name="НИШ", city=city)
+        self.other_school = School.objects.create(name="Другая", city=city)
+        self.school_class = SchoolClass.objects.create(grade=9)
+
+        self.student = self.create_user('student@email.com', CustomUser.Role.STUDENT, self.school, self.school_class)
+        self.teacher = self.create_user('teacher@email.com', CustomUser.Role.TEACHER, self.school)
+        self.stranger = self.create_user('stranger@email.com', CustomUser.Role.TEACHER, self.other_school)
+
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.question = Question.objects.create(quiz=self.quiz, text="?", question_type=QuestionType.SINGLE_CHOICE)
+        self.right = Answer.objects.create(question=self.question, text="right", is_correct=True)
+
+    def create_user(self, email, role, school, school_class=None):
+        user = CustomUser.objects.create_user(email=email, password='testpassword', role=role)
+        UserProfile.objects.filter(user=user).update(school=school, school_class=school_class)
+        return user
+
+    def submit(self):
+        self.login(self.student)
+        response = self.client.post(reverse('user-answer-submit'),
+                                    {"question": self.question.id, "selected_answers": [self.right.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def test_scope_is_written_with_answer(self):
+        """Тест, школа и класс сохраняются в ответе и прогрессе при отправке"""
+        self.submit()
+        answer = UserAnswer.objects.get()
+        self.assertEqual((answer.quiz_id, answer.school_id, answer.school_class_id),
+                         (self.quiz.id, self.school.id, self.school_class.id))
+        progress = UserQuizProgress.objects.get()
+        self.assertEqual((progress.school_id, progress.school_class_id), (self.school.id, self.school_class.id))
+
+    def test_teacher_sees_only_own_school(self):
+        """Учитель видит ответы своей школы, учитель другой школы — нет"""
+        self.submit()
+        self.login(self.teacher)
+        response = self.client.get(reverse('user-answer-list'), {"school_class": self.school_class.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(len(self.client.get(reverse('user-progress-list')).data["results"]), 1)
+
+        self.login(self.stranger)
+        self.assertEqual(self.client.get(reverse('user-answer-list')).data["results"], [])
+        answer = UserAnswer.objects.get()
+        response = self.client.get(reverse('user-answer-detail', args=[answer.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_backfill(self):
+        """Команда заполняет поля у ответов, сохраненных до их появления"""
+        self.submit()
+        UserAnswer.objects.update(quiz=None, school=None, school_class=None)
+        UserQuizProgress.objects.update(school=None, school_class=None)
+        call_command("backfill_answer_scopes", batch_size=1, stdout=StringIO())
+        answer = UserAnswer.objects.get()
+        self.assertEqual((answer.quiz_id, answer.school_id, answer.school_class_id),
+                         (self.quiz.id, self.school.id, self.school_class.id))
+        self.assertEqual(UserQuizProgress.objects.get().school_id, self.school.id)
@@ -0,0 +1,110 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading
+from apps.quizzes.grading import AnswerKey
+from apps.quizzes.normalization import normalize
+from apps.quizzes.models import Quiz, Question, Answer, OrderingItem, QuestionType, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class PartialCreditTests(SimpleTestCase):
+    """Частичный зачет по ключу, без базы"""
+
+    def ordering(self, points=Decimal(4)):
+        order = (10, 20, 30, 40)
+        return AnswerKey(question_id=1, question_type=QuestionType.ORDERING, points=points, ordering=order,
+                         ranks={item: rank for rank, item in enumerate(order)})
+
+    def test_ordering_longest_increasing(self):
+        key = self.ordering()
+        self.assertEqual(grading.score(key, {"selected_order": [10, 20, 30, 40]}), Decimal(4))
+        # 10, 30, 40 стоят в верном порядке относительно друг друга
+        self.assertEqual(grading.score(key, {"selected_order": [20, 10, 30, 40]}), Decimal(3))
+        self.assertEqual(grading.score(key, {"selected_order": [40, 30, 20, 10]}), Decimal(1))
+        # Лишние и повторные элементы увеличивают знаменатель
+        self.assertEqual(grading.score(key, {"selected_order": [10, 10, 20, 30, 40, 99]}), Decimal("2.6666"))
+        self.assertEqual(grading.score(key, {}), Decimal(0))
+
+    def test_matching_per_pair(self):
+        key = AnswerKey(question_id=1, question_type=QuestionType.MATCHING, points=Decimal(2),
+                        pairs=frozenset((normalize(left), normalize(right)) for left, right in
+                                        [("1", "one"), ("2", "two"), ("3", "three"), ("4", "four")]))
+        self.assertEqual(grading.score(key, {"selected_matching": [["1", "one"], ["2", "three"]]}),
+                         Decimal("0.5"))
+        # Несколько ответов на одну левую часть не засчитываются
+        self.assertEqual(grading.score(key, {"selected_matching": [["1", "one"], ["1", "two"], ["2", "two"]]}),
+                         Decimal("0.5"))
+
+    def test_grouping_per_item(self):
+        key = AnswerKey(question_id=1, question_type=QuestionType.GROUPING, points=Decimal(3),
+                        placement=frozenset({(1, 100), (2, 100), (3, 200)}))
+        self.assertEqual(grading.score(key, {"selected_grouping": [{"group": 100, "items": [1, 3]},
+                                                                   {"group": 200, "items": [2]}]}), Decimal(1))
+        self.assertEqual(grading.score(key, {"selected_grouping": [{"group": "x", "items": [1]}]}), Decimal(0))
+
+    def test_all_or_nothing_types(self):
+        key = AnswerKey(question_id=1, question_type=QuestionType.MULTIPLE_CHOICE, points=Decimal(5),
+                        options=frozenset({1, 2, 3}), correct=frozenset({1, 2}))
+        self.assertEqual(grading.evaluate(key, {"selected_answers": [1, 2]}), (True, Decimal(5)))
+        self.assertEqual(grading.evaluate(key, {"selected_answers": [1]}), (False, Decimal(0)))
+
+
+class WeightedProgressTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Вопрос на выбор (1 балл) и упорядочивание из четырех элементов (4 балла)"""
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.quiz = Quiz.objects.create(title="Quiz")
+        self.single = Question.objects.create(quiz=self.quiz, text="1", question_type=QuestionType.SINGLE_CHOICE)
+        self.right = Answer.objects.create(question=self.single, text="A", is_correct=True)
+        self.ordering = Question.objects.create(quiz=self.quiz, text="2", question_type=QuestionType.ORDERING,
+                                                points=4)
+        self.items = [OrderingItem.objects.create(question=self.ordering, text=str(i), order=i).id
+                      for i in range(4)]
+
+    def submit(self, data):
+        response = self.client.post(reverse('user-answer-submit'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response
+
+    def progress(self):
+        return UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+
+    def test_partial_score_is_aggregated(self):
+        a, b, c, d = self.items
+        response = self.submit({"question": self.ordering.id, "selected_order": [b, a, c, d]})
+        self.assertFalse(response.data["is_correct"])
+        self.assertEqual(response.data["score"], Decimal(3))
+        self.assertEqual(response.data["score_percentage"], 60.0)
+
+        self.submit({"question": self.single.id, "selected_answers": [self.right.id]})
+        progress = self.progress()
+        self.assertEqual((progress.total_points, progress.earned_points), (Decimal(5), Decimal(4)))
+        self.assertEqual(progress.correct_answers, 1)
+        self.assertEqual(progress.score_percentage, 80.0)
+
+        # Повторный ответ заменяет баллы вопроса, а не добавляется к ним
+        self.submit({"question": self.ordering.id, "selected_order": [d, c, b, a]})
+        progress = self.progress()
+        self.assertEqual(progress.earned_points, Decimal(2))
+        self.assertEqual(progress.score_at(self.ordering.position), Decimal(1))
+
+        expected = (progress.earned_points, progress.scores, progress.score_percentage)
+        progress.update_progress()
+        progress.refresh_from_db()
+        self.assertEqual((progress.earned_points, progress.scores, progress.score_percentage), expected)
+
+    def test_answer_score_is_stored(self):
+        a, b, c, d = self.items
+        self.submit({"question": self.ordering.id, "selected_order": [a, b, c, d]})
+        answer = self.ordering.user_answers.get()
+        self.assertTrue(answer.is_correct)
+        self.assertEqual(answer.score, Decimal(4))
@@ -0,0 +1,153 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import permissions, status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import grading, shuffling
+from apps.quizzes.api.views import QuizViewSet
+from apps.quizzes.models import Quiz, Question, Answer, MatchingPair, QuestionType, QuizSnapshot, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+class SnapshotTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = CustomUser.objects.create_user(email='manager@email.com', password='testpassword',
+                                                      role=CustomUser.Role.CONTENT_MANAGER)
+        self.student = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.quiz = Quiz.objects.create(title="Quiz", shuffle=False)
+        question = Question.objects.create(quiz=self.quiz, text="2 + 2", question_type=QuestionType.SINGLE_CHOICE)
+        Answer.objects.create(question=question, text="4", is_correct=True)
+        Answer.objects.create(question=question, text="5")
+        question = Question.objects.create(quiz=self.quiz, text="Пары", question_type=QuestionType.MATCHING)
+        MatchingPair.objects.create(question=question, left_side="a", right_side="b")
+        self.url = reverse('quiz-detail', args=[self.quiz.id])
+
+    def publish(self):
+        self.login(self.manager)
+        response = self.client.post(reverse('quiz-publish', args=[self.quiz.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response
+
+    def test_student_variant_has_no_answers(self):
+        """Ученик получает снимок без правильных ответов"""
+        self.publish()
+        self.login(self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        choice, matching = data["questions"]
+        self.assertEqual(len(choice["answers"]), 2)
+        self.assertNotIn("is_correct", choice["answers"][0])
+        self.assertEqual(matching["matching_pairs"], [{"id": matching["matching_pairs"][0]["id"], "left_side": "a"}])
+        self.assertEqual(matching["matching_right_sides"], ["b"])
+
+    def test_etag_and_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без запросов к базе"""
+        self.publish()
+        self.login(self.student)
+        etag = self.client.get(self.url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([q for q in queries if "quizzes_" in q["sql"]])
+
+    def test_publish_is_idempotent(self):
+        """Повторная публикация без изменений не создает новый снимок"""
+        first = self.publish().data
+        second = self.publish().data
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(QuizSnapshot.objects.count(), 1)
+
+    def test_snapshot_checks_object_permissions(self):
+        """Опубликованный снимок отдается только после проверки объектных прав"""
+        class DenyObject(permissions.BasePermission):
+            def has_object_permission(self, request, view, obj):
+                return False
+
+        self.publish()
+        self.login(self.student)
+        with mock.patch.object(QuizViewSet, "permission_classes", [DenyObject]):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_staff_see_unpublished_changes(self):
+        """Сотрудники видят изменения до публикации, ученики — опубликованную версию"""
+        self.publish()
+        self.quiz.refresh_from_db()
+        self.quiz.title = "Новое название"
+        self.quiz.save()
+
+        self.login(self.manager)
+        self.assertEqual(self.client.get(self.url).data["title"], "Новое название")
+        self.login(self.student)
+        self.assertEqual(json.loads(self.client.get(self.url).content)["title"], "Quiz")
+
+    def test_unpublished_quiz_is_rendered_without_answers(self):
+        """Неопубликованный тест ученику отдается без правильных ответов"""
+        self.login(self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("is_correct", response.data["questions"][0]["answers"][0])
+
+
+class ShuffleTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Опубликованный тест из восьми вопросов с пятью вариантами"""
+        super().setUp()
+        self.manager = CustomUser.objects.create_user(email='manager@email.com', password='testpassword',
+                                                      role=CustomUser.Role.CONTENT_MANAGER)
+        self.first = CustomUser.objects.create_user(email='first@email.com', password='testpassword')
+        self.second = CustomUser.objects.create_user(email='second@email.com', password='testpassword')
+        self.quiz = Quiz.objects.create(title="Quiz")
+        for i in range(8):
+            question = Question.objects.create(quiz=self.quiz, text=str(i), question_type=QuestionType.SINGLE_CHOICE)
+            for j in range(5):
+                Answer.objects.create(question=question, text=str(j), is_correct=j == 0)
+        self.url = reverse('quiz-detail', args=[self.quiz.id])
+        self.login(self.manager)
+        self.client.post(reverse('quiz-publish', args=[self.quiz.id]))
+
+    def order(self, user, **params):
+        self.login(user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        questions = json.loads(response.content)["questions"]
+        return [q["id"] for q in questions], [[a["id"] for a in q["answers"]] for q in questions], response["ETag"]
+
+    def test_order_is_stable_per_user_and_attempt(self):
+        """Порядок зависит от ученика и попытки и не меняется между запросами"""
+        first = self.order(self.first)
+        self.assertEqual(self.order(self.first), first)
+        self.assertNotEqual(self.order(self.second)[:2], first[:2])
+        self.assertEqual(self.order(self.first, attempt=1), first)  # Номер попытки из запроса не учитывается
+        UserQuizProgress.objects.create(user=self.first, quiz=self.quiz)
+        shuffling.finish_attempt(self.first.id, self.quiz.id)
+        self.assertNotEqual(self.order(self.first)[:2], first[:2])
+        self.assertNotEqual(self.order(self.second)[2], first[2])
+        self.assertEqual(sorted(first[0]), sorted(self.quiz.questions.values_list("id", flat=True)))
+
+    def test_permutation_is_regenerated_from_key(self):
+        """Порядок вопросов восстанавливается по ключу ответов без хранения"""
+        UserQuizProgress.objects.create(user=self.first, quiz=self.quiz)
+        for _ in range(2):
+            shuffling.finish_attempt(self.first.id, self.quiz.id)
+        questions, _, etag = self.order(self.first)
+        quiz_key = grading.get_quiz_key(Quiz.objects.get(pk=self.quiz.pk))
+        self.assertEqual(shuffling.permutation(quiz_key, self.first.id, attempt=2), questions)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([q for q in queries if "quizzes_" in q["sql"]])
+
+    def test_non_decimal_pk(self):
+        """Цифры, которые int() не принимает (надстрочные), — 404, а не ошибка сервера"""
+        self.login(self.first)
+        self.assertEqual(self.client.get(reverse('quiz-detail', args=["²"])).status_code, status.HTTP_404_NOT_FOUND)
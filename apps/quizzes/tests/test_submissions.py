@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.quizzes import submissions, tasks
+from apps.quizzes.models import AnswerSubmission, SubmissionStatus, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+from .utils import QuizTestMixin
+
+
+@override_settings(QUIZ_ASYNC_GRADING=True)
+class AsyncGradingTests(QuizTestMixin, APITestCase):
+    def setUp(self):
+        """Тест из трех вопросов с одним правильным вариантом"""
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+        self.login(self.user)
+        self.quiz, self.questions = self.create_quiz(3)
+
+    def item(self, question, correct=True):
+        return {"question": question.id, "selected_answers": [(question.right if correct else question.wrong).id]}
+
+    def test_submit_returns_accepted_and_status(self):
+        """Ответ принимается с 202, проверка выполняется задачей после фиксации транзакции"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('user-answer-submit'), self.item(self.questions[0]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.data)
+        self.assertEqual(response.data["status"], SubmissionStatus.PENDING)
+
+        response = self.client.get(response.data["status_url"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], SubmissionStatus.DONE)
+        self.assertEqual(response.data["result"]["results"][0]["is_correct"], True)
+        self.assertEqual(UserQuizProgress.objects.get(user=self.user, quiz=self.quiz).correct_answers, 1)
+
+        self.login(CustomUser.objects.create_user(email='other@email.com', password='testpassword'))
+        self.assertEqual(self.client.get(reverse('answer-submission', args=[response.data["id"]])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_answers_are_rejected_before_enqueue(self):
+        foreign = {"question": self.questions[0].id, "selected_answers": [self.questions[1].right.id]}
+        response = self.client.post(reverse('user-answer-submit'), foreign, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(AnswerSubmission.objects.exists())
+
+    def test_micro_batch_merges_submissions_in_order(self):
+        """Отправки ученика в порции сохраняются одним bulk_create; последний ответ на вопрос побеждает"""
+        first = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[0], correct=False)])
+        second = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[0]),
+                                                                   self.item(self.questions[1])])
+        self.assertEqual(submissions.process_queue(), 2)
+
+        progress = UserQuizProgress.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((progress.answered_questions, progress.correct_answers), (2, 2))
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 3)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), (SubmissionStatus.DONE, SubmissionStatus.DONE))
+        self.assertEqual([r["is_correct"] for r in second.result["results"]], [True, True])
+
+    def test_failed_submission_does_not_block_others(self):
+        broken = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[2])])
+        valid = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[0])])
+        self.questions[2].delete()
+        self.quiz.refresh_from_db()
+
+        self.assertEqual(submissions.process_queue(), 2)
+        broken.refresh_from_db()
+        valid.refresh_from_db()
+        self.assertEqual(broken.status, SubmissionStatus.FAILED)
+        self.assertIn("answers", broken.error)
+        self.assertEqual(valid.status, SubmissionStatus.DONE)
+        self.assertEqual(UserQuizProgress.objects.get(user=self.user, quiz=self.quiz).correct_answers, 1)
+
+    def test_unexpected_error_marks_only_its_submission(self):
+        """Не только ошибки проверки: любое исключение помечает свою отправку, остальные сохраняются"""
+        broken = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[0])])
+        AnswerSubmission.objects.filter(pk=broken.pk).update(answers=[{"selected_answers": []}])  # Без вопроса
+        valid = submissions.enqueue(self.user.id, self.quiz.id, [self.item(self.questions[1])])
+
+        with self.assertLogs("apps.quizzes.submissions", "ERROR"):
+            self.assertEqual(submissions.process_queue(), 2)
+        broken.refresh_from_db()
+        valid.refresh_from_db()
+        self.assertEqual((broken.status, valid.status), (SubmissionStatus.FAILED, SubmissionStatus.DONE))
+        self.assertIn("error", broken.error)
+
+    def test_broker_error_does_not_fail_submit(self):
+        """Если задачу не удалось поставить, отправка остается в очереди для периодического запуска"""
+        with mock.patch.object(tasks.grade_submissions, "delay", side_effect=ConnectionError), \
+                self.assertLogs("apps.quizzes.submissions", "WARNING"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('user-answer-submit'), self.item(self.questions[0]), format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(AnswerSubmission.objects.get().status, SubmissionStatus.PENDING)
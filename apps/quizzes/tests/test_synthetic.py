@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from apps.quizzes import benchmarks, grading, synthetic
+from apps.quizzes.models import Question, QuestionType, Quiz, UserAnswer, UserQuizProgress
+from apps.users.models import CustomUser
+
+
+class SyntheticDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        grading._local_keys.clear()
+
+    def seed(self):
+        return synthetic.seed(students=30, quiz_count=2, questions=7, quizzes_per_user=2, schools_per_city=1,
+                              batch_size=50)
+
+    def test_seed_creates_consistent_data(self):
+        counts = self.seed()
+        self.assertEqual(counts["students"], 30)
+        self.assertEqual(counts["answers"], UserAnswer.objects.count())
+        self.assertEqual(set(Question.objects.values_list("question_type", flat=True)), set(QuestionType.values))
+        self.assertEqual(UserQuizProgress.objects.count(), 60)
+        self.assertTrue(UserAnswer.objects.filter(is_correct=True).exists())
+        self.assertTrue(UserAnswer.objects.filter(is_correct=False).exists())
+        self.assertGreater(counts["textbooks"], 0)
+
+        # Прогресс совпадает с полным пересчетом по ответам
+        fields = ["answered_questions", "correct_answers", "earned_points", "score_percentage", "scores"]
+        for progress in UserQuizProgress.objects.all()[:10]:
+            expected = [getattr(progress, field) for field in fields]
+            progress.update_progress()
+            progress.refresh_from_db()
+            self.assertEqual([getattr(progress, field) for field in fields], expected)
+
+        self.assertEqual(self.seed()["students"], 30)  # Повторный запуск добавляет новых учеников
+        self.assertEqual(CustomUser.objects.filter(email__endswith=f"@{synthetic.DOMAIN}").count(),
+                         60 + 2 * counts["schools"])
+
+        synthetic.flush()
+        self.assertFalse(Quiz.objects.exists())
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_benchmark_reports_all_scenarios(self):
+        self.seed()
+        result = benchmarks.run(requests=3, warmup=1, users=5)
+        self.assertEqual(set(result["scenarios"]), set(benchmarks.SCENARIOS))
+        for scenario, stats in result["scenarios"].items():
+            self.assertEqual((stats["requests"], stats["errors"]), (3, 0), scenario)
+            self.assertGreater(stats["queries_mean"], 0)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+
+        rows = benchmarks.compare(result, result)
+        self.assertTrue(rows and all(change in (0, None) for *_, change in rows))
+
+    def test_middleware_overhead(self):
+        result = benchmarks.middleware_overhead(requests=3, warmup=1)
+        self.assertGreater(result["full"]["queries_mean"], 0)  # Чтение и запись сессии
+        self.assertEqual(result["lean"]["queries_mean"], 0)
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([benchmarks.percentile(values, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(benchmarks.percentile([7], 99), 7)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.quizzes import grading
+from apps.quizzes.models import Quiz, Question, Answer, QuestionType
+from apps.quizzes.redis_client import get_client
+
+
+class QuizTestMixin:
+    """Общая подготовка тестов прохождения: пустые кэши, ключи ответов и Redis, вход по JWT"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        grading._local_keys.clear()
+        get_client(settings.QUIZ_REDIS_URL).flushdb()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+
+    def create_quiz(self, count, **fields):
+        """Тест из `count` вопросов Single Choice: у вопроса question.right — верный вариант, question.wrong — нет"""
+        quiz = Quiz.objects.create(**{"title": "Quiz", **fields})
+        questions = []
+        for i in range(count):
+            question = Question.objects.create(quiz=quiz, text=str(i), question_type=QuestionType.SINGLE_CHOICE)
+            question.right = Answer.objects.create(question=question, text="right", is_correct=True)
+            question.wrong = Answer.objects.create(question=question, text="wrong")
+            questions.append(question)
+        return quiz, questions
+
+
+class QueryBudgetMixin:
+    """Проверка, что число запросов эндпоинта не зависит от объема данных"""
+
+    def assertQueryBudget(self, request, grow, max_queries=None):
+        """
+        Выполняет `request()` до и после `grow()` (добавление данных) и сравнивает число запросов.
+        Первый вызов — прогрев кэшей, он не учитывается.
+        """
+        request()
+        with CaptureQueriesContext(connection) as before:
+            request()
+        grow()
+        with CaptureQueriesContext(connection) as after:
+            response = request()
+
+        queries = "\n".join(q["sql"] for q in after.captured_queries)
+        self.assertEqual(len(before), len(after), f"Число запросов растет вместе с данными:\n{queries}")
+        if max_queries is not None:
+            self.assertLessEqual(len(after), max_queries, queries)
+        return response
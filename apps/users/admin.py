@@ -5,6 +5,7 @@ from unfold.admin import ModelAdmin
 from unfold.decorators import action
 from unfold.forms import AdminPasswordChangeForm, UserChangeForm, UserCreationForm
 
+from . import avatars, principal
 from .models import CustomUser, UserProfile
 
 
@@ -37,15 +38,18 @@ class CustomUserAdmin(BaseUserAdmin, ModelAdmin):
     @action(description="Сделать выбранных пользователей активными")
     def activate_users(self, request, queryset):
         queryset.update(is_active=True)
+        principal.bump_versions(queryset.values_list("pk", flat=True))
 
     @action(description="Сделать выбранных пользователей неактивными")
     def deactivate_users(self, request, queryset):
         queryset.update(is_active=False)
+        principal.bump_versions(queryset.values_list("pk", flat=True))  # Выданные токены перестают действовать
 
     def avatar_preview(self, obj):
         """Отображение миниатюры аватара"""
         if obj.avatar:
-            return format_html('<img src="{}" width="30" height="30" style="border-radius:50%;" />', obj.avatar.url)
+            url = avatars.urls(obj.avatar_variants).get("64", {}).get("webp") or obj.avatar.url
+            return format_html('<img src="{}" width="30" height="30" style="border-radius:50%;" />', url)
         return "-"
 
     avatar_preview.short_description = "Аватар"
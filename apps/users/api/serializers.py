@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .. import avatars, principal
 from ..models import UserProfile
 
 User = get_user_model()
@@ -10,11 +12,16 @@ class UserSerializer(serializers.ModelSerializer):
 
     language = serializers.SerializerMethodField()
     school = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ["id", "email", "first_name", "last_name", "role", "phone", "iin", "avatar", "school",
-                  "is_active", "is_staff", "is_superuser", "has_full_access", "language"]
+        fields = ["id", "email", "first_name", "last_name", "role", "phone", "iin", "avatar", "avatar_variants",
+                  "school", "is_active", "is_staff", "is_superuser", "has_full_access", "language"]
+
+    def get_avatar_variants(self, obj):
+        """URL уменьшенных копий аватара: {"64": {"webp": ..., "jpeg": ...}, ...}"""
+        return avatars.urls(obj.avatar_variants)
 
     def get_language(self, obj):
         """Получаем язык пользователя из профиля"""
@@ -199,3 +206,11 @@ class ChangePasswordSerializer(serializers.Serializer):
         if not user.check_password(value):
             raise serializers.ValidationError("Старый пароль неверен.")
         return value
+
+
+class PrincipalTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Пара токенов с ролью, школой и классом пользователя (см. principal.py)"""
+
+    @classmethod
+    def get_token(cls, user):
+        return principal.with_claims(super().get_token(user), user)
@@ -3,11 +3,11 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, status, generics
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 from .permissions import UserPermissions
+from .. import principal
 from .serializers import (
     UserSerializer,
     UserProfileSerializer, CustomRegisterSerializer
@@ -92,7 +92,7 @@ class CustomLoginView(LoginView):
         # Проверяем, залогинен ли пользователь
         if response.status_code == 200:
             user = self.user  # Пользователь, прошедший аутентификацию
-            refresh = RefreshToken.for_user(user)  # Генерируем токены
+            refresh = principal.refresh_token_for(user)  # Генерируем токены с данными пользователя
             access = str(refresh.access_token)
 
             # Устанавливаем refresh-токен в HTTP-only cookie
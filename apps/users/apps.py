@@ -5,4 +5,5 @@ class UsersConfig(AppConfig):
     name = 'apps.users'
 
     def ready(self):
-        import apps.users.signals
\ No newline at end of file
+        import apps.users.checks
+        import apps.users.signals
@@ -1,9 +1,30 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
-from rest_framework_simplejwt.tokens import RefreshToken
 
-class JWTCookieAuthentication(JWTAuthentication):
+from . import principal, refresh
+
+
+class PrincipalJWTAuthentication(JWTAuthentication):
+    """JWT из заголовка Authorization; пользователь собирается из данных токена без запросов к базе"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Токен не содержит идентификатор пользователя")
+
+        user = principal.from_token(validated_token, user_id)
+        if user is None:
+            raise AuthenticationFailed("Пользователь не найден", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("Пользователь неактивен", code="user_inactive")
+        return user
+
+
+class JWTCookieAuthentication(PrincipalJWTAuthentication):
     """Аутентификация через JWT-токены, хранящиеся в cookies"""
 
     def authenticate(self, request):
@@ -11,15 +32,15 @@ class JWTCookieAuthentication(JWTAuthentication):
         access_token = request.COOKIES.get(settings.REST_AUTH.get("JWT_AUTH_COOKIE"))
         refresh_token = request.COOKIES.get(settings.REST_AUTH.get("JWT_AUTH_REFRESH_COOKIE"))
 
-        # Если нет access-токена, но есть refresh-токен → создаем новый access
+        # Если нет access-токена, но есть refresh-токен → берем новый access (один на refresh-токен, см. refresh.py)
         if not access_token and refresh_token:
             try:
-                refresh = RefreshToken(refresh_token)
-                access_token = str(refresh.access_token)  # Генерируем новый access
-                # Записываем новый access-токен в cookies (через response в middleware или в представлении)
-                request.new_access_token = access_token
-            except Exception:
+                access_token, expires = refresh.access_for(refresh_token)
+            except TokenError:
                 return None  # Refresh токен недействителен
+            # RefreshAccessCookieMiddleware запишет его в cookie ответа; атрибуты — на HttpRequest, его видит middleware
+            http_request = getattr(request, "_request", request)
+            http_request.new_access_token, http_request.new_access_token_expires = access_token, expires
 
         if not access_token:
             return None  # Нет токенов = нет аутентификации
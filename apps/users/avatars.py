@@ -0,0 +1,145 @@
+"""
+Уменьшенные копии аватаров.
+
+Загруженный файл аватара не меняется. После сохранения пользователя с новым
+файлом (CustomUser.save) задача process_avatar строит копии размеров
+AVATAR_SIZES в WebP и JPEG. Имена копий содержат хеш содержимого исходного
+файла (avatars/variants/<хеш>-<размер>.<формат>), поэтому их можно кэшировать
+навсегда, а одинаковые файлы обрабатываются один раз. Имена копий
+записываются в CustomUser.avatar_variants: {"hash": ..., "files": {"64": {"webp": ..., "jpeg": ...}}}.
+
+Копии, на которые больше никто не ссылается, удаляются сразу после замены
+аватара и периодической задачей prune_avatar_variants. Если файл не удалось
+прочитать как изображение, в avatar_variants записывается {"failed": true} —
+без копий, прежние копии удаляются.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "avatars/variants"
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def _name(digest, size, extension):
+    return f"{VARIANTS_DIR}/{digest}-{size}.{extension}"
+
+
+def _names(variants):
+    return {name for formats in variants.get("files", {}).values() for name in formats.values()}
+
+
+def urls(variants):
+    """URL копий по размерам и форматам для ответа API"""
+    return {size: {extension: default_storage.url(name) for extension, name in formats.items()}
+            for size, formats in variants.get("files", {}).items()}
+
+
+def _encode(image, size, image_format):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if image_format == "JPEG" and copy.mode != "RGB":
+        # У JPEG нет прозрачности: прозрачные области — белые
+        background = Image.new("RGB", copy.size, "white")
+        background.paste(copy, mask=copy.getchannel("A") if "A" in copy.getbands() else None)
+        copy = background
+    buffer = BytesIO()
+    copy.save(buffer, image_format, quality=settings.AVATAR_QUALITY, optimize=image_format == "JPEG")
+    return buffer.getvalue()
+
+
+def build_variants(content):
+    """Сохраняет копии изображения `content` (байты) и возвращает данные для avatar_variants"""
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    files = {}
+    image = None
+    for size in settings.AVATAR_SIZES:
+        formats = files[str(size)] = {}
+        for extension, image_format in FORMATS.items():
+            name = formats[extension] = _name(digest, size, extension)
+            if default_storage.exists(name):  # Такой же файл уже обработан
+                continue
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+                image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+            default_storage.save(name, ContentFile(_encode(image, size, image_format)))
+    return {"hash": digest, "files": files}
+
+
+def delete_unused(variants):
+    """Удаляет копии, если на этот хеш больше не ссылается ни один пользователь"""
+    if not variants.get("hash") or CustomUser.objects.filter(avatar_variants__hash=variants["hash"]).exists():
+        return
+    for name in _names(variants):
+        default_storage.delete(name)
+
+
+def process(user_id):
+    """Строит копии текущего аватара пользователя; без аватара — удаляет прежние"""
+    user = CustomUser.objects.filter(pk=user_id).only("avatar", "avatar_variants").first()
+    if user is None:
+        return None
+    previous, name = user.avatar_variants or {}, user.avatar.name
+    variants = {}
+    if name:
+        try:
+            with user.avatar.open("rb") as file:
+                variants = build_variants(file.read())
+        except (OSError, ValueError, Image.DecompressionBombError):  # Не изображение, поврежден, нет файла
+            logger.warning("Не удалось построить копии аватара пользователя %s", user_id, exc_info=True)
+            variants = {"failed": True}
+    if variants == previous:
+        return variants
+    # Только если аватар не сменился, пока строились копии; update() не трогает историю и версию токенов
+    current = Q(avatar=name) if name else Q(avatar="") | Q(avatar__isnull=True)
+    CustomUser.objects.filter(current, pk=user_id).update(avatar_variants=variants)
+    delete_unused(previous)
+    return variants
+
+
+def _is_old(name, cutoff):
+    """Свежие копии могут принадлежать задаче, которая еще не записала avatar_variants"""
+    try:
+        return default_storage.get_modified_time(name) < cutoff
+    except NotImplementedError:
+        return True
+
+
+def prune():
+    """Удаляет копии старше AVATAR_PRUNE_AGE без ссылок из avatar_variants. Возвращает число удаленных"""
+    try:
+        _, files = default_storage.listdir(VARIANTS_DIR)
+    except FileNotFoundError:
+        return 0
+    used = {name for variants in CustomUser.objects.exclude(avatar_variants={})
+            .values_list("avatar_variants", flat=True).iterator() for name in _names(variants)}
+    cutoff = timezone.now() - timedelta(seconds=settings.AVATAR_PRUNE_AGE)
+    deleted = 0
+    for file_name in files:
+        name = f"{VARIANTS_DIR}/{file_name}"
+        if name not in used and _is_old(name, cutoff):
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def schedule(user_id):
+    """Ставит задачу process_avatar; недоступный брокер не должен ломать сохранение пользователя"""
+    from .tasks import process_avatar
+
+    try:
+        process_avatar.delay(user_id)
+    except Exception:
+        logger.warning("Не удалось поставить обработку аватара пользователя %s", user_id, exc_info=True)
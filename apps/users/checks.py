@@ -0,0 +1,30 @@
+"""
+Проверки настроек (manage.py check и запуск сервера).
+
+Выпуск access-токенов по refresh-cookie (refresh.py) и версии токенов
+(principal.py) хранят блокировки, готовые токены и счетчики в кэше по
+умолчанию: он должен быть общим для всех процессов gunicorn, Celery и
+команд manage.py, иначе блокировка работает только внутри одного воркера,
+а token_refresh_stats всегда показывает нули.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Кэши в памяти одного процесса
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register()
+def shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if getattr(settings, "TESTING", False) or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"CACHES['default'] использует {backend}: кэш не общий для процессов.",
+        hint="Укажите CACHE_BACKEND=django.core.cache.backends.redis.RedisCache "
+             "и CACHE_LOCATION=redis://<хост>:6379/1.",
+        id="users.E001",
+    )]
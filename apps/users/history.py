@@ -0,0 +1,159 @@
+"""
+История изменений (django-simple-history) с отложенной записью.
+
+HistoricalRecords вставляет строку истории сразу при каждом save и delete.
+BufferedHistoricalRecords собирает строки в буфер и вставляет их одним
+bulk_create на модель истории:
+
+- внутри транзакции — после ее фиксации (transaction.on_commit); при откате
+  транзакции или точки сохранения строки отбрасываются вместе с изменениями;
+- вне транзакции внутри deferred() (BufferedHistoryRequestMiddleware
+  оборачивает в него запрос) — при выходе из блока;
+- в остальных случаях — сразу.
+
+Изменения только «шумовых» полей (HISTORY_NOISE_FIELDS: last_login,
+updated_at) и сохранения без изменений в историю не попадают. Изменения
+определяются по update_fields или по снимку полей, сделанному при загрузке
+объекта и после прошлой записи истории.
+
+Старую историю удаляет команда prune_history.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_init
+from django.utils import timezone
+from simple_history.middleware import HistoryRequestMiddleware
+from simple_history.models import HistoricalRecords
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+
+_deferred = ContextVar("history_deferred", default=None)
+
+
+class _Buffer:
+    def __init__(self):
+        self.records = []  # (HistoricalRecords, объект, строка истории, using)
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        flush(self.records)
+
+
+def flush(records):
+    """Вставляет строки истории: по одному bulk_create на модель истории"""
+    groups = {}
+    for record in records:
+        groups.setdefault((record[2].__class__, record[3]), []).append(record)
+    for (model, using), group in groups.items():
+        model.objects.using(using).bulk_create([history_instance for _, _, history_instance, _ in group])
+        for history, instance, history_instance, _ in group:
+            if history_instance._history_m2m_fields:
+                history.create_historical_record_m2ms(history_instance, instance)
+            post_create_historical_record.send(
+                sender=model, instance=instance, history_instance=history_instance,
+                history_date=history_instance.history_date, history_user=history_instance.history_user,
+                history_change_reason=history_instance.history_change_reason, using=using,
+            )
+
+
+def _transaction_buffer(using):
+    """Буфер текущей транзакции (с учетом точки сохранения) или None вне транзакции"""
+    connection = connections[using or "default"]
+    if not connection.in_atomic_block:
+        return None
+    # Буферы по точкам сохранения: при откате точки ее flush снимается с on_commit вместе с буфером
+    key = tuple(connection.savepoint_ids)
+    buffers = getattr(connection, "history_buffers", {})
+    buffer = buffers.get(key)
+    pending = {entry[1] for entry in connection.run_on_commit}
+    if buffer is None or buffer.flushed or buffer.flush not in pending:
+        # Записанные и откатившиеся буферы больше не нужны
+        buffers = {k: b for k, b in buffers.items() if not b.flushed and b.flush in pending}
+        buffer = buffers[key] = _Buffer()
+        connection.history_buffers = buffers
+        transaction.on_commit(buffer.flush, using=connection.alias)
+    return buffer
+
+
+@contextmanager
+def deferred():
+    """Строки истории, созданные вне транзакции, вставляются одним запросом при выходе из блока"""
+    records = []
+    token = _deferred.set(records)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        flush(records)
+
+
+class BufferedHistoricalRecords(HistoricalRecords):
+    """HistoricalRecords с отложенной пакетной записью и без записи «шумовых» изменений"""
+
+    def finalize(self, sender, **kwargs):
+        super().finalize(sender, **kwargs)
+        if self.cls is sender or (self.inherit and issubclass(sender, self.cls)):
+            post_init.connect(self.post_init, sender=sender, weak=False)
+
+    def _snapshot(self, instance):
+        loaded = instance.__dict__
+        return {field.attname: loaded[field.attname] for field in self.fields_included(instance)
+                if field.attname in loaded}
+
+    def post_init(self, instance, **kwargs):
+        instance._history_snapshot = self._snapshot(instance)
+
+    def _changed(self, instance, update_fields):
+        before = getattr(instance, "_history_snapshot", {})
+        changed = {name for name, value in self._snapshot(instance).items()
+                   if name not in before or before[name] != value}
+        if update_fields is not None:
+            changed &= {instance._meta.get_field(name).attname for name in update_fields}
+        return changed
+
+    def post_save(self, instance, created, using=None, update_fields=None, **kwargs):
+        if not created and not self._changed(instance, update_fields) - set(settings.HISTORY_NOISE_FIELDS):
+            return
+        super().post_save(instance, created, using=using, **kwargs)
+
+    def create_historical_record(self, instance, history_type, using=None):
+        using = using if self.use_base_model_db else None
+        manager = getattr(instance, self.manager_name)
+        history_date = getattr(instance, "_history_date", timezone.now())
+        history_user = self.get_history_user(instance)
+        history_change_reason = self.get_change_reason_for_object(instance, history_type, using)
+
+        attrs = {field.attname: getattr(instance, field.attname) for field in self.fields_included(instance)}
+        if getattr(manager.model, "history_relation", None) is not None:
+            attrs["history_relation"] = instance
+        history_instance = manager.model(history_date=history_date, history_type=history_type,
+                                         history_user=history_user, history_change_reason=history_change_reason,
+                                         **attrs)
+        pre_create_historical_record.send(
+            sender=manager.model, instance=instance, history_date=history_date, history_user=history_user,
+            history_change_reason=history_change_reason, history_instance=history_instance, using=using,
+        )
+        instance._history_snapshot = self._snapshot(instance)
+
+        record = (self, instance, history_instance, using)
+        buffer = _transaction_buffer(using)
+        if buffer is not None:
+            buffer.records.append(record)
+        elif _deferred.get() is not None:
+            _deferred.get().append(record)
+        else:
+            flush([record])
+
+
+def BufferedHistoryRequestMiddleware(get_response):
+    """HistoryRequestMiddleware, откладывающий запись истории до конца запроса"""
+    history_middleware = HistoryRequestMiddleware(get_response)
+
+    def middleware(request):
+        with deferred():
+            return history_middleware(request)
+
+    return middleware
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from simple_history.models import HistoricalChanges
+
+
+# python manage.py prune_history --days 365 --chunk 5000 --pause 0.1
+class Command(BaseCommand):
+    help = "Удаляет историю изменений старше заданного срока порциями (короткие транзакции без долгих блокировок)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.HISTORY_RETENTION_DAYS,
+                            help="Хранить историю за столько дней")
+        parser.add_argument("--chunk", type=int, default=5000, help="Строк в одном DELETE")
+        parser.add_argument("--pause", type=float, default=0, help="Пауза между порциями, секунд")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать строки к удалению")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        for model in apps.get_models():
+            if not issubclass(model, HistoricalChanges):
+                continue
+            old = model.objects.filter(history_date__lt=cutoff)
+            if options["dry_run"]:
+                self.stdout.write(f"{model._meta.label}: {old.count()} к удалению")
+                continue
+
+            deleted = 0
+            while True:
+                # Каждая порция — отдельный короткий DELETE по первичному ключу
+                ids = list(old.order_by("pk").values_list("pk", flat=True)[:options["chunk"]])
+                if not ids:
+                    break
+                deleted += model.objects.filter(pk__in=ids).delete()[0]
+                if options["pause"]:
+                    time.sleep(options["pause"])
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.label}: удалено {deleted}"))
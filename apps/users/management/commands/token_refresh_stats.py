@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import refresh
+
+
+# python manage.py token_refresh_stats [--reset]
+class Command(BaseCommand):
+    help = "Показывает, сколько access-токенов выпущено по refresh-cookie и сколько раз взят готовый"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счетчики после вывода")
+
+    def handle(self, *args, **options):
+        counts = refresh.metrics()
+        total = sum(counts.values())
+        for name, count in counts.items():
+            share = f" ({count * 100 / total:.1f}%)" if total else ""
+            self.stdout.write(f"{name:10} {count}{share}")
+        if options["reset"]:
+            refresh.reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+
+
+class RefreshAccessCookieMiddleware:
+    """Записывает в cookie access-токен, выпущенный по refresh-cookie (JWTCookieAuthentication, refresh.py)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        token = getattr(request, "new_access_token", None)
+        name = settings.REST_AUTH.get("JWT_AUTH_COOKIE", "access_token")
+        # Вход и выход сами ставят или удаляют cookie — их не перезаписываем
+        if token and name not in response.cookies:
+            response.set_cookie(
+                key=name,
+                value=token,
+                max_age=max(0, int(request.new_access_token_expires - time.time())),
+                httponly=settings.REST_AUTH.get("JWT_AUTH_HTTPONLY", True),
+                secure=settings.JWT_AUTH_SECURE,
+                samesite=settings.REST_AUTH.get("JWT_AUTH_SAMESITE", "Lax"),
+            )
+        return response
@@ -1,13 +1,13 @@
 import os
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from simple_history.models import HistoricalRecords
-from PIL import Image
 from apps.education.models import SchoolClass, SchoolClassPrefix, Language, School, Subject
 
+from .history import BufferedHistoricalRecords
+
 
 def validate_avatar_size(image):
     max_size = 1 * 1024 * 1024  # 1 МБ
@@ -95,8 +95,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     date_joined = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Дата изменения"))
+    # Растет при изменении роли, активности или школы/класса: данные в выданных токенах устаревают (principal.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    # Уменьшенные копии аватара в WebP и JPEG (avatars.py), заполняются задачей process_avatar
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
     objects = CustomUserManager()
 
     USERNAME_FIELD = "email"
@@ -115,17 +119,61 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         """Возвращает полное имя пользователя (имя + фамилия)"""
         return f"{self.first_name} {self.last_name}".strip()
 
+    # Поля, которые попадают в токен (principal.py)
+    PRINCIPAL_FIELDS = ("role", "is_active", "is_staff", "is_superuser", "has_full_access")
+
+    # Меняются только через update(), обычное сохранение не должно затирать их старыми значениями
+    MANAGED_FIELDS = {"token_version", "avatar_variants"}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_principal = {f: v for f, v in zip(field_names, values) if f in cls.PRINCIPAL_FIELDS}
+        if "avatar" in field_names:
+            instance._loaded_avatar = instance.avatar.name or ""
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Пользователь из токена загружает все недостающие поля одним запросом при первом обращении
+        if fields is not None and getattr(self, "from_token", False):
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None or "avatar" in fields:
+            self._loaded_avatar = self.avatar.name or ""
+
+    def _avatar_changed(self):
+        if "avatar" in self.get_deferred_fields():
+            return False
+        return (self.avatar.name or "") != getattr(self, "_loaded_avatar", "")
+
     def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_principal", None)
+        if loaded is None:  # Создан в коде, а не загружен: прежние значения неизвестны
+            changed = not self._state.adding
+        else:
+            changed = any(getattr(self, field) != value for field, value in loaded.items())
+        update_fields = kwargs.get("update_fields")
+        avatar_changed = self._avatar_changed() and (update_fields is None or "avatar" in update_fields)
+        if not (self._state.adding or args or kwargs.get("force_insert")) and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in deferred
+                                       and field.name not in self.MANAGED_FIELDS]
         super().save(*args, **kwargs)
-        if self.avatar:
-            try:
-                img = Image.open(self.avatar.path)
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                img.thumbnail((300, 300))
-                img.save(self.avatar.path, optimize=True, quality=85)
-            except Exception:
-                pass
+        if changed:
+            from .principal import bump_version
+
+            bump_version(self.pk)
+        if loaded is None or changed:
+            self._loaded_principal = {field: getattr(self, field) for field in self.PRINCIPAL_FIELDS
+                                      if field not in self.get_deferred_fields()}
+        if avatar_changed:
+            # Копии строятся в фоне и только для нового файла (avatars.py)
+            from .avatars import schedule
+
+            self._loaded_avatar = self.avatar.name or ""
+            user_id = self.pk
+            transaction.on_commit(lambda: schedule(user_id))
 
 
 class UserProfile(models.Model):
@@ -156,5 +204,29 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.user.get_role_display()})"
 
+    # Поля, которые попадают в токен (principal.py)
+    PRINCIPAL_FIELDS = ("school_id", "school_class_id", "school_class_prefix_id")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_principal = {f: v for f, v in zip(field_names, values) if f in cls.PRINCIPAL_FIELDS}
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_principal", None)
+        if loaded is None:  # Создан в коде, а не загружен: прежние значения неизвестны
+            changed = not self._state.adding
+        else:
+            changed = any(getattr(self, field) != value for field, value in loaded.items())
+        super().save(*args, **kwargs)
+        if changed:
+            from .principal import bump_version
+
+            bump_version(self.user_id)
+        if loaded is None or changed:
+            self._loaded_principal = {field: getattr(self, field) for field in self.PRINCIPAL_FIELDS
+                                      if field not in self.get_deferred_fields()}
+
 
 
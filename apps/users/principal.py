@@ -0,0 +1,157 @@
+"""
+Пользователь запроса из подписанных данных JWT без запросов к базе.
+
+При выдаче токена в него записываются роль, флаги доступа, школа и класс
+ученика и версия токена пользователя (claim "principal"). При проверке
+токена из этих данных собирается экземпляр CustomUser с отложенными
+остальными полями: права и фильтры по школе работают без запросов, а при
+обращении к другим полям (email, профиль и т.п.) они догружаются одним запросом.
+
+CustomUser.token_version растет при изменении роли, флагов, активности или
+школы/класса (CustomUser.save, UserProfile.save). Текущая версия берется из
+кэша процесса (PRINCIPAL_LOCAL_TIMEOUT секунд) и общего кэша
+(PRINCIPAL_VERSION_TIMEOUT секунд); если версия в токене устарела или данных
+в токене нет, текущие данные пользователя читаются из базы один раз на версию
+и тоже кэшируются. Отзыв (forget) удаляет версию из общего кэша; если кэш не
+общий (LocMem в нескольких процессах), до других процессов отзыв доходит,
+когда истекает их копия версии, — поэтому ее время жизни — секунды. Изменения через
+QuerySet.update() версию не меняют — после них нужно вызвать bump_versions().
+При удалении пользователя версия сбрасывается из кэша (signals.py).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser, UserProfile
+
+CLAIM = "principal"
+SCOPE_FIELDS = UserProfile.PRINCIPAL_FIELDS
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f"users:token_version:{user_id}"
+
+
+def _state_key(user_id, version):
+    return f"users:principal:{user_id}:{version}"
+
+
+def _cached(key, load, timeout):
+    """Значение из кэша процесса, затем из общего кэша (на `timeout` секунд), затем `load()`; None не кэшируется"""
+    now = time.monotonic()
+    hit = _local.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        if value is None:
+            return None
+        cache.set(key, value, timeout)
+    with _local_lock:
+        if len(_local) >= settings.PRINCIPAL_LOCAL_SIZE:
+            _local.pop(next(iter(_local)), None)
+        _local[key] = (now + settings.PRINCIPAL_LOCAL_TIMEOUT, value)
+    return value
+
+
+def current_version(user_id):
+    """Текущая версия токенов пользователя или None, если пользователя нет"""
+    return _cached(_version_key(user_id), lambda: CustomUser.objects.filter(pk=user_id)
+                   .values_list("token_version", flat=True).first(), settings.PRINCIPAL_VERSION_TIMEOUT)
+
+
+def _load_claims(user_id):
+    row = (CustomUser.objects.filter(pk=user_id)
+           .values("token_version", *CustomUser.PRINCIPAL_FIELDS,
+                   *(f"profile__{field}" for field in SCOPE_FIELDS)).first())
+    if row is None:
+        return None
+    claims = {field: row[field] for field in CustomUser.PRINCIPAL_FIELDS}
+    claims.update({field: row[f"profile__{field}"] for field in SCOPE_FIELDS})
+    claims["version"] = row["token_version"]
+    return claims
+
+
+def current_claims(user_id, version):
+    """Данные пользователя для версии `version` (читаются из базы один раз на версию)"""
+    return _cached(_state_key(user_id, version), lambda: _load_claims(user_id), settings.PRINCIPAL_CACHE_TIMEOUT)
+
+
+def forget(user_ids):
+    """Сбрасывает закэшированные версии: сразу — для этого процесса, после фиксации — для остальных"""
+    keys = [_version_key(user_id) for user_id in user_ids]
+
+    def drop():
+        cache.delete_many(keys)
+        with _local_lock:
+            for key in keys:
+                _local.pop(key, None)
+
+    drop()
+    transaction.on_commit(drop)  # Другой запрос мог успеть закэшировать прежнюю версию
+
+
+def bump_versions(user_ids):
+    """Делает данные в выданных токенах пользователей устаревшими (после QuerySet.update() и т.п.)"""
+    user_ids = list(user_ids)
+    CustomUser.objects.filter(pk__in=user_ids).update(token_version=F("token_version") + 1)
+    forget(user_ids)
+
+
+def bump_version(user_id):
+    bump_versions([user_id])
+
+
+def claims_for(user):
+    """Данные для токена: из объекта пользователя, школа и класс — из профиля"""
+    scope = UserProfile.objects.filter(user_id=user.pk).values(*SCOPE_FIELDS).first() or dict.fromkeys(SCOPE_FIELDS)
+    claims = {field: getattr(user, field) for field in CustomUser.PRINCIPAL_FIELDS}
+    claims.update(scope)
+    claims["version"] = current_version(user.pk) or 0
+    return claims
+
+
+def with_claims(token, user):
+    """Записывает данные пользователя в refresh-токен (переходят и в access-токены из него)"""
+    token[CLAIM] = claims_for(user)
+    return token
+
+
+def refresh_token_for(user):
+    return with_claims(RefreshToken.for_user(user), user)
+
+
+def build(user_id, claims):
+    """CustomUser из данных токена: остальные поля отложены и загрузятся при первом обращении"""
+    values = {"id": user_id, "token_version": claims["version"],
+              **{field: claims[field] for field in CustomUser.PRINCIPAL_FIELDS}}
+    fields = [f.attname for f in CustomUser._meta.concrete_fields if f.attname in values]  # Порядок как в модели
+    user = CustomUser.from_db(DEFAULT_DB_ALIAS, fields, [values[field] for field in fields])
+    user.from_token = True
+    user.scope = {field: claims[field] for field in SCOPE_FIELDS}
+    return user
+
+
+def from_token(validated_token, user_id):
+    """
+    Пользователь запроса по проверенному токену или None, если пользователя нет.
+    Данные токена используются, только если их версия совпадает с текущей.
+    """
+    version = current_version(user_id)
+    if version is None:
+        return None
+    claims = validated_token.get(CLAIM)
+    if not isinstance(claims, dict) or claims.get("version") != version:
+        claims = current_claims(user_id, version)
+        if claims is None:
+            return None
+    return build(user_id, claims)
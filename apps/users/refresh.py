@@ -0,0 +1,105 @@
+"""
+Новый access-токен по refresh-cookie.
+
+Когда cookie с access-токеном истекла, а refresh-cookie есть,
+JWTCookieAuthentication выпускает access-токен по refresh-токену, а
+RefreshAccessCookieMiddleware записывает его в cookie ответа на оставшееся
+время жизни токена — следующие запросы идут уже с ним.
+
+Одновременные запросы одного клиента (страница грузит несколько ресурсов
+сразу) не выпускают токен каждый: выпущенный токен кэшируется по хешу
+refresh-токена до истечения (за вычетом JWT_REFRESH_MARGIN), выпускает один
+запрос под блокировкой, остальные ждут его результат. Счетчики в кэше
+(metrics(), команда token_refresh_stats) показывают, как часто запросы идут по
+этой ветке: minted — выпущено, reused — взято готовое, waited — дождались
+чужого выпуска, rejected — refresh-токен недействителен. Блокировка и
+счетчики работают между процессами только с общим кэшем (проверка users.E001).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+METRICS = ("minted", "reused", "waited", "rejected")
+
+
+def _key(refresh_token):
+    return f"users:refreshed_access:{hashlib.sha256(refresh_token.encode()).hexdigest()}"
+
+
+def _metric_key(name):
+    return f"users:refresh_metrics:{name}"
+
+
+def _count(name):
+    key = _metric_key(name)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:  # Ключ успели удалить между add и incr
+            cache.add(key, 1, None)
+
+
+def metrics():
+    return {name: cache.get(_metric_key(name), 0) for name in METRICS}
+
+
+def reset_metrics():
+    cache.delete_many([_metric_key(name) for name in METRICS])
+
+
+def _fresh(cached):
+    """Готовый токен, если он не истекает в ближайшие JWT_REFRESH_MARGIN секунд"""
+    if cached is not None and cached[1] - settings.JWT_REFRESH_MARGIN > time.time():
+        return cached
+    return None
+
+
+def _wait(key):
+    """Ждет токен, который выпускает другой запрос; None — не дождались"""
+    deadline = time.monotonic() + settings.JWT_REFRESH_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.01)
+        cached = _fresh(cache.get(key))
+        if cached is not None:
+            return cached
+    return None
+
+
+def _mint(key, refresh_token):
+    try:
+        access = RefreshToken(refresh_token).access_token
+    except TokenError:
+        _count("rejected")
+        raise
+    minted = (str(access), access["exp"])
+    cache.set(key, minted, max(1, int(minted[1] - time.time()) - settings.JWT_REFRESH_MARGIN))
+    _count("minted")
+    return minted
+
+
+def access_for(refresh_token):
+    """
+    (access-токен, время истечения) по refresh-токену: готовый из кэша или новый.
+    Недействительный refresh-токен — TokenError.
+    """
+    key = _key(refresh_token)
+    cached = _fresh(cache.get(key))
+    if cached is not None:
+        _count("reused")
+        return cached
+
+    lock = f"{key}:lock"
+    if not cache.add(lock, 1, settings.JWT_REFRESH_WAIT + 1):
+        cached = _wait(key)
+        if cached is not None:
+            _count("waited")
+            return cached
+        return _mint(key, refresh_token)  # Выпускающий запрос завис или упал — выпускаем сами
+    try:
+        return _mint(key, refresh_token)
+    finally:
+        cache.delete(lock)
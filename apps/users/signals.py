@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from . import principal
 from .models import CustomUser, UserProfile
 
 @receiver(post_save, sender=CustomUser)
@@ -9,3 +10,9 @@ def create_user_profile(sender, instance, created, **kwargs):
     """
     if created:
         UserProfile.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    """Токены удаленного пользователя перестают действовать сразу, а не после истечения кэша версий"""
+    principal.forget([instance.pk])
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from . import avatars
+
+
+@shared_task
+def process_avatar(user_id):
+    """Строит уменьшенные копии аватара пользователя (запускается при смене файла)"""
+    avatars.process(user_id)
+
+
+@shared_task
+def prune_avatar_variants():
+    """Удаляет копии аватаров, на которые больше никто не ссылается"""
+    return avatars.prune()
@@ -1,3 +1,351 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apps.education.models import City, Region, School
+from PIL import Image
+
+from apps.users import avatars, checks, principal, refresh
+from apps.users.authentication import PrincipalJWTAuthentication
+from apps.users.models import CustomUser
+
+
+class PrincipalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principal._local.clear()
+        city = City.objects.create(name="Город", region=Region.objects.create(name="Область"))
+        self.school, self.other_school = (School.objects.create(name=name, city=city) for name in ("Школа", "Другая"))
+        self.user = CustomUser.objects.create_user(email='teacher@email.com', password='testpassword',
+                                                   role=CustomUser.Role.TEACHER, first_name="Айгерим")
+        self.user.profile.school = self.school
+        self.user.profile.save()
+        self.auth = PrincipalJWTAuthentication()
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.auth.authenticate(request)[0]
+
+    def test_user_is_built_from_claims(self):
+        token = principal.refresh_token_for(self.user).access_token
+        self.authenticate(token)  # Версия попадает в кэш
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, CustomUser)
+        self.assertEqual((user.pk, user.role, user.is_authenticated), (self.user.pk, CustomUser.Role.TEACHER, True))
+        self.assertEqual(user.scope["school_id"], self.school.id)
+
+        # Остальные поля догружаются одним запросом, сохранение не затирает их
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.first_name), ("teacher@email.com", "Айгерим"))
+        user = self.authenticate(token)
+        user.has_full_access = True
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.has_full_access), ("Айгерим", True))
+
+    def test_changes_invalidate_claims(self):
+        token = principal.refresh_token_for(self.user).access_token
+        self.authenticate(token)
+
+        self.user.role = CustomUser.Role.SCHOOL_ADMIN
+        self.user.save()
+        profile = self.user.profile
+        profile.refresh_from_db()
+        profile.school = self.other_school
+        profile.save()
+        user = self.authenticate(token)
+        self.assertEqual((user.role, user.scope["school_id"]), (CustomUser.Role.SCHOOL_ADMIN, self.other_school.id))
+
+        self.user.refresh_from_db()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_bulk_updates_and_deletion(self):
+        token = principal.refresh_token_for(self.user).access_token
+        self.authenticate(token)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        principal.bump_versions([self.user.pk])
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=True)
+        principal.bump_versions([self.user.pk])
+        self.authenticate(token)
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_version_is_cached_briefly(self):
+        """Версия в общем кэше живет секунды: если кэш не общий, отзыв доходит до других процессов быстро"""
+        self.user.refresh_from_db()
+        cache.clear()
+        principal._local.clear()
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            principal.current_version(self.user.pk)
+        cache_set.assert_called_once_with(principal._version_key(self.user.pk), self.user.token_version,
+                                          settings.PRINCIPAL_VERSION_TIMEOUT)
+
+    def test_unrelated_changes_keep_version(self):
+        version = CustomUser.objects.get(pk=self.user.pk).token_version
+        self.user.first_name = "Алия"
+        self.user.save()
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).token_version, version)
+
+    def test_token_without_claims(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.authenticate(token).scope["school_id"], self.school.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(token).role, CustomUser.Role.TEACHER)
+
+    def test_obtained_tokens_carry_claims(self):
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {"email": "teacher@email.com", "password": "testpassword"})
+        claims = AccessToken(response.json()["access"])[principal.CLAIM]
+        self.assertEqual((claims["role"], claims["school_id"]), (CustomUser.Role.TEACHER, self.school.id))
+
+
+class RefreshCookieTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principal._local.clear()
+        self.user = CustomUser.objects.create_user(email='teacher@email.com', password='testpassword',
+                                                   role=CustomUser.Role.TEACHER)
+        self.refresh = str(principal.refresh_token_for(self.user))
+        self.client.cookies["refresh_token"] = self.refresh
+
+    def test_access_cookie_is_set_once(self):
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, 200)
+        cookie = response.cookies["access_token"]
+        self.assertTrue(cookie["httponly"])
+        self.assertGreater(cookie["max-age"], 3000)
+
+        # Следующий запрос приходит с cookie и токен не выпускает
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("access_token", response.cookies)
+        self.assertEqual(refresh.metrics()["minted"], 1)
+
+    def test_concurrent_requests_share_token(self):
+        first = self.client.get(reverse("profile-list")).cookies["access_token"].value
+        del self.client.cookies["access_token"]  # Параллельный запрос ушел до ответа первого
+        second = self.client.get(reverse("profile-list")).cookies["access_token"].value
+        self.assertEqual(first, second)
+        self.assertEqual(refresh.metrics(), {"minted": 1, "reused": 1, "waited": 0, "rejected": 0})
+
+    @override_settings(JWT_REFRESH_WAIT=0.05)
+    def test_stale_lock_does_not_block(self):
+        cache.add(f"{refresh._key(self.refresh)}:lock", 1)
+        token, expires = refresh.access_for(self.refresh)
+        self.assertEqual(AccessToken(token)["user_id"], self.user.pk)
+        self.assertEqual(refresh.metrics()["minted"], 1)
+
+    def test_invalid_refresh_token(self):
+        self.client.cookies["refresh_token"] = "broken"
+        response = self.client.get(reverse("profile-list"))
+        self.assertIn(response.status_code, (401, 403))
+        self.assertNotIn("access_token", response.cookies)
+        self.assertEqual(refresh.metrics()["rejected"], 1)
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_process_local_cache_fails_outside_tests(self):
+        """Кэш в памяти процесса допустим только в тестах"""
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+                             "LOCATION": "redis://localhost:6379/1"}}
+        with override_settings(TESTING=False, CACHES=locmem):
+            self.assertEqual([error.id for error in checks.shared_cache(None)], ["users.E001"])
+        with override_settings(TESTING=False, CACHES=redis):
+            self.assertEqual(checks.shared_cache(None), [])
+        with override_settings(TESTING=True, CACHES=locmem):
+            self.assertEqual(checks.shared_cache(None), [])
+
+
+class MiddlewareDispatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principal._local.clear()
+        self.user = CustomUser.objects.create_user(email='teacher@email.com', password='testpassword',
+                                                   role=CustomUser.Role.TEACHER)
+        self.client.force_login(self.user)  # У браузера после входа есть и сессия
+
+    def test_jwt_api_request_skips_session(self):
+        token = principal.refresh_token_for(self.user).access_token
+        response = self.client.get(reverse("profile-list"), HTTP_AUTHORIZATION=f"Bearer {token}",
+                                   HTTP_ACCEPT_LANGUAGE="kk")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request.lean_middleware)
+        self.assertNotIn("sessionid", response.cookies)  # Сессия не перезаписывалась
+        self.assertEqual(response["Content-Language"], "kk")
+
+    def test_html_requests_use_full_stack(self):
+        """Browsable API отдает text/html — AccountMiddleware нужна сессия даже при входе по JWT"""
+        token = principal.refresh_token_for(self.user).access_token
+        for params, accept in [({}, "text/html,application/xhtml+xml"), ({"format": "api"}, "*/*")]:
+            response = self.client.get(reverse("profile-list"), params, HTTP_AUTHORIZATION=f"Bearer {token}",
+                                       HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("text/html", response["Content-Type"])
+            self.assertFalse(response.wsgi_request.lean_middleware)
+
+    def test_session_requests_use_full_stack(self):
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.lean_middleware)
+        self.assertIn("sessionid", response.cookies)
+
+        # Только refresh-cookie: при недействительном токене пользователь определяется по сессии
+        self.client.cookies["refresh_token"] = "broken"
+        response = self.client.get(reverse("profile-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.lean_middleware)
+
+    def test_admin_uses_full_stack(self):
+        token = principal.refresh_token_for(self.user).access_token
+        response = self.client.get("/ru/admin/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertFalse(response.wsgi_request.lean_middleware)
+
+
+class BufferedHistoryTests(TestCase):
+    def history(self, user_id):
+        return list(CustomUser.history.filter(id=user_id).order_by("history_id").values_list("history_type", "role"))
+
+    def test_history_is_written_once_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = CustomUser.objects.create_user(email='teacher@email.com', password='testpassword')
+            user.role = CustomUser.Role.TEACHER
+            user.save()
+            try:
+                with transaction.atomic():
+                    user.role = CustomUser.Role.ADMIN
+                    user.save()
+                    raise ValueError
+            except ValueError:
+                user.role = CustomUser.Role.TEACHER
+        self.assertEqual(self.history(user.pk), [])
+
+        with CaptureQueriesContext(connection) as captured:
+            for callback in callbacks:
+                callback()
+        inserts = [q for q in captured if q["sql"].startswith('INSERT INTO "users_historicalcustomuser"')]
+        self.assertEqual(len(inserts), 1)
+        # Изменение из откатившейся точки сохранения в историю не попало
+        self.assertEqual(self.history(user.pk), [("+", CustomUser.Role.USER), ("~", CustomUser.Role.TEACHER)])
+
+    def test_noise_changes_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.create_user(email='teacher@email.com', password='testpassword')
+        user_id = user.pk
+        user = CustomUser.objects.get(pk=user_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.last_login = timezone.now()
+            user.save(update_fields=["last_login"])
+            user.save()
+            user.first_name = "Алия"
+            user.save()
+            user.delete()
+        self.assertEqual([history_type for history_type, _ in self.history(user_id)], ["+", "~", "-"])
+
+    def test_prune_history(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            users = [CustomUser.objects.create_user(email=f'user{n}@email.com', password='testpassword')
+                     for n in range(3)]
+        CustomUser.history.filter(id__in=[user.pk for user in users[:2]]).update(
+            history_date=timezone.now() - timedelta(days=400))
+        call_command("prune_history", days=365, chunk=1, stdout=StringIO())
+        self.assertEqual(list(CustomUser.history.values_list("id", flat=True)), [users[2].pk])
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = CustomUser.objects.create_user(email='student@email.com', password='testpassword')
+
+    def image(self, color, name="avatar.png"):
+        buffer = BytesIO()
+        Image.new("RGBA", (800, 600), color).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar = upload
+            self.user.save()
+        self.user.refresh_from_db()
+        return self.user.avatar_variants
+
+    def test_variants_are_built_for_new_file(self):
+        upload = self.image((255, 0, 0, 128))
+        variants = self.upload(upload)
+        self.assertEqual(set(variants["files"]), {"64", "128", "300"})
+        with default_storage.open(variants["files"]["300"]["webp"]) as file:
+            self.assertEqual(Image.open(file).size, (300, 225))
+        with default_storage.open(variants["files"]["64"]["jpeg"]) as file:
+            self.assertEqual(Image.open(file).format, "JPEG")
+        with self.user.avatar.open("rb") as file:
+            self.assertEqual(file.read(), upload.file.getvalue())  # Исходный файл не перезаписан
+        self.assertIn(variants["hash"], avatars.urls(variants)["128"]["webp"])
+
+        # Сохранение без смены файла не запускает обработку
+        with mock.patch("apps.users.tasks.process_avatar.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.first_name = "Алия"
+                self.user.save()
+        delay.assert_not_called()
+
+    def test_old_variants_are_removed(self):
+        old = self.upload(self.image((255, 0, 0, 255)))
+        new = self.upload(self.image((0, 0, 255, 255), "other.png"))
+        self.assertNotEqual(old["hash"], new["hash"])
+        self.assertFalse(any(default_storage.exists(name) for name in avatars._names(old)))
+        self.assertTrue(all(default_storage.exists(name) for name in avatars._names(new)))
+
+        self.assertEqual(self.upload(None), {})
+        self.assertFalse(any(default_storage.exists(name) for name in avatars._names(new)))
+
+    def test_broken_file_clears_variants(self):
+        """Файл не изображение: копий нет, прежние удалены, задача не падает"""
+        old = self.upload(self.image((255, 0, 0, 255)))
+        with self.assertLogs("apps.users.avatars", "WARNING"):
+            variants = self.upload(SimpleUploadedFile("avatar.png", b"not an image", content_type="image/png"))
+        self.assertEqual(variants, {"failed": True})
+        self.assertEqual(avatars.urls(variants), {})
+        self.assertFalse(any(default_storage.exists(name) for name in avatars._names(old)))
+
+    def test_broker_error_does_not_break_save(self):
+        with mock.patch("apps.users.tasks.process_avatar.delay", side_effect=ConnectionError), \
+                self.assertLogs("apps.users.avatars", "WARNING"):
+            self.upload(self.image((0, 0, 255, 255)))
+        self.assertTrue(self.user.avatar.name)
+        self.assertEqual(self.user.avatar_variants, {})
+
+    @override_settings(AVATAR_PRUNE_AGE=0)
+    def test_prune_unused_variants(self):
+        variants = self.upload(self.image((0, 255, 0, 255)))
+        orphan = default_storage.save(f"{avatars.VARIANTS_DIR}/orphan-64.webp", ContentFile(b"x"))
+        self.assertEqual(avatars.prune(), 1)
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(all(default_storage.exists(name) for name in avatars._names(variants)))
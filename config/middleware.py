@@ -0,0 +1,97 @@
+"""
+Отдельная цепочка middleware для запросов к API с JWT.
+
+Запросы к API (LEAN_MIDDLEWARE_PATHS) за JSON с access-токеном в заголовке
+Authorization или в cookie проходят LEAN_MIDDLEWARE: без сессий (с
+SESSION_SAVE_EVERY_REQUEST — запись в базу на каждый запрос), CSRF, сообщений
+и AuthenticationMiddleware — пользователя определяет DRF по токену. Остальные
+запросы (админка, allauth, Swagger, вход и выход, API с сессией браузера)
+проходят FULL_MIDDLEWARE, как раньше. Запросы за HTML (Browsable API DRF)
+тоже идут через FULL_MIDDLEWARE: AccountMiddleware allauth из MIDDLEWARE
+читает request.session в успешных ответах text/html. Разницу на запрос показывает
+`python manage.py benchmark_api --middleware`.
+
+Цепочки собираются так же, как в django.core.handlers.base.BaseHandler;
+process_view, process_template_response и process_exception middleware
+выбранной цепочки вызываются через MiddlewareDispatcher.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+class Chain:
+    """Цепочка middleware из списка путей вокруг `get_response`"""
+
+    def __init__(self, paths, get_response):
+        self.view, self.template_response, self.exception = [], [], []
+        handler = get_response
+        for path in reversed(paths):
+            try:
+                middleware = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, "process_view"):
+                self.view.insert(0, middleware.process_view)
+            if hasattr(middleware, "process_template_response"):
+                self.template_response.append(middleware.process_template_response)
+            if hasattr(middleware, "process_exception"):
+                self.exception.append(middleware.process_exception)
+            handler = convert_exception_to_response(middleware)
+        self.handler = handler
+
+
+def wants_html(request):
+    """Ответом будет страница Browsable API: Accept с text/html или ?format=api"""
+    return "text/html" in request.headers.get("Accept", "") or request.GET.get("format") == "api"
+
+
+def is_lean(request):
+    """Запрос к API за JSON, который аутентифицируется только по JWT и не использует сессию"""
+    path = request.path_info
+    if not path.startswith(tuple(settings.LEAN_MIDDLEWARE_PATHS)) or path.startswith(
+            tuple(settings.LEAN_MIDDLEWARE_EXCLUDE)) or wants_html(request):
+        return False
+    if request.headers.get("Authorization", "").startswith("Bearer "):
+        return True
+    # С access-cookie аутентификация по cookie либо проходит, либо отклоняет запрос — до сессии дело не доходит.
+    # Только с refresh-cookie недействительный токен передает запрос SessionAuthentication
+    if settings.REST_AUTH.get("JWT_AUTH_COOKIE") in request.COOKIES:
+        return True
+    return (settings.REST_AUTH.get("JWT_AUTH_REFRESH_COOKIE") in request.COOKIES
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+class MiddlewareDispatcher:
+    """Выбирает для запроса LEAN_MIDDLEWARE или FULL_MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        self.full = Chain(settings.FULL_MIDDLEWARE, get_response)
+        self.lean = Chain(settings.LEAN_MIDDLEWARE, get_response)
+
+    def _chain(self, request):
+        return self.lean if getattr(request, "lean_middleware", False) else self.full
+
+    def __call__(self, request):
+        request.lean_middleware = is_lean(request)
+        return self._chain(request).handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in self._chain(request).view:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for process_template_response in self._chain(request).template_response:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for process_exception in self._chain(request).exception:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
@@ -10,6 +10,8 @@ from django.template.context_processors import static
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 DEBUG = config("DEBUG", default="False")
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-default-key')
+# manage.py test или pytest (pytest-django импортирует настройки после pytest)
+TESTING = "test" in sys.argv or "pytest" in sys.modules
 
 INSTALLED_APPS = [
     'modeltranslation',
@@ -57,19 +59,38 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    "corsheaders.middleware.CorsMiddleware",  # Добавляем в начало
+    'config.middleware.MiddlewareDispatcher',  # Дальше — FULL_MIDDLEWARE или LEAN_MIDDLEWARE (config/middleware.py)
+    'allauth.account.middleware.AccountMiddleware',  # allauth требует его в MIDDLEWARE
+]
+
+# Браузер, админка, allauth и API с сессией
+FULL_MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    "corsheaders.middleware.CorsMiddleware",  # Добавляем в начало
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.middleware.locale.LocaleMiddleware',
-    'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'simple_history.middleware.HistoryRequestMiddleware',
+    'apps.users.history.BufferedHistoryRequestMiddleware',  # Автор изменений и запись истории в конце запроса
+    'apps.users.middleware.RefreshAccessCookieMiddleware',  # Access-токен, выпущенный по refresh-cookie
 ]
 
+# API с JWT: без сессий, CSRF и сообщений
+LEAN_MIDDLEWARE = [
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.locale.LocaleMiddleware',  # От языка зависят переводимые поля в ответах
+    'apps.users.history.BufferedHistoryRequestMiddleware',  # Автор изменений в истории
+    'apps.users.middleware.RefreshAccessCookieMiddleware',
+]
+LEAN_MIDDLEWARE_PATHS = ["/api/"]
+LEAN_MIDDLEWARE_EXCLUDE = ["/api/v1/auth/"]  # Вход и выход работают с сессией
+
+# Сессии, аутентификация и сообщения для админки подключены в FULL_MIDDLEWARE
+SILENCED_SYSTEM_CHECKS = ["admin.E408", "admin.E409", "admin.E410"]
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -124,6 +145,7 @@ REST_AUTH = {
     'JWT_AUTH_COOKIE': 'access_token',
     'JWT_AUTH_REFRESH_COOKIE': 'refresh_token',
     'JWT_AUTH_HTTPONLY': True,
+    'JWT_TOKEN_CLAIMS_SERIALIZER': 'apps.users.api.serializers.PrincipalTokenObtainPairSerializer',
 }
 REST_AUTH_REGISTER_SERIALIZERS = {
     'REGISTER_SERIALIZER': 'apps.users.serializers.CustomRegisterSerializer',
@@ -132,7 +154,7 @@ REST_AUTH_REGISTER_SERIALIZERS = {
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "apps.users.authentication.JWTCookieAuthentication",  # Добавляем поддержку cookie
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.PrincipalJWTAuthentication',  # Заголовок Authorization
         'rest_framework.authentication.SessionAuthentication',  # Для браузера
     ),
     "DEFAULT_PERMISSION_CLASSES": [
@@ -169,8 +191,29 @@ SIMPLE_JWT = {
     "JTI_CLAIM": "jti",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=60),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=7),
+    "TOKEN_OBTAIN_SERIALIZER": "apps.users.api.serializers.PrincipalTokenObtainPairSerializer",
 }
 
+# Access-токен по refresh-cookie (apps/users/refresh.py)
+JWT_REFRESH_MARGIN = 30  # За сколько секунд до истечения выпущенный токен уже не раздается
+JWT_REFRESH_WAIT = 2  # Сколько секунд ждать токен, который выпускает параллельный запрос
+
+# Пользователь запроса из данных токена (apps/users/principal.py)
+PRINCIPAL_CACHE_TIMEOUT = 60 * 60  # Время жизни данных пользователей в общем кэше (ключ — версия, не устаревают)
+# Время жизни версии токенов в общем кэше: с кэшем процесса (LocMem) отзыв доходит до других процессов за это время
+PRINCIPAL_VERSION_TIMEOUT = 10
+PRINCIPAL_LOCAL_TIMEOUT = 5  # Сколько секунд процесс не перепроверяет версию токенов пользователя
+PRINCIPAL_LOCAL_SIZE = 10000  # Сколько пользователей держать в памяти процесса
+
+# История изменений (apps/users/history.py)
+HISTORY_NOISE_FIELDS = ["last_login", "updated_at"]  # Изменения только этих полей в историю не пишутся
+HISTORY_RETENTION_DAYS = 365  # Сколько дней хранить историю (команда prune_history)
+
+# Копии аватаров (apps/users/avatars.py)
+AVATAR_SIZES = [64, 128, 300]  # Стороны копий в пикселях (изображение вписывается в квадрат)
+AVATAR_QUALITY = 85  # Качество WebP и JPEG
+AVATAR_PRUNE_AGE = 60 * 60 * 24  # Копии без ссылок удаляются не раньше, чем через столько секунд после создания
+
 ######################################################################
 # Time
 ######################################################################
@@ -280,6 +323,79 @@ UNFOLD = {
     }
 }
 
+######################################################################
+# CACHE & CELERY
+######################################################################
+
+# Общий Redis: блокировки и счетчики выпуска токенов (apps/users/refresh.py) нужны всем процессам,
+# кэш в памяти процесса — только в тестах (проверка users.E001)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache' if TESTING
+                          else 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default='' if TESTING else 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'nislab',
+    }
+}
+
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='memory://' if TESTING else 'redis://localhost:6379/0')
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=TESTING, cast=bool)
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers.DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'flush-expired-quiz-drafts': {
+        'task': 'apps.quizzes.tasks.flush_expired_drafts',
+        'schedule': 60 * 5,
+    },
+    'reconcile-quiz-rollups': {
+        'task': 'apps.quizzes.tasks.reconcile_rollups',
+        'schedule': 60 * 60,
+    },
+    'create-answer-partitions': {
+        'task': 'apps.quizzes.tasks.create_answer_partitions',
+        'schedule': 60 * 60 * 24,
+    },
+    # Подбирает отправки, для которых задача не была поставлена (например, брокер был недоступен)
+    'grade-answer-submissions': {
+        'task': 'apps.quizzes.tasks.grade_submissions',
+        'schedule': 60,
+    },
+    'prune-idempotency-records': {
+        'task': 'apps.quizzes.tasks.prune_idempotency_records',
+        'schedule': 60 * 60,
+    },
+    'prune-avatar-variants': {
+        'task': 'apps.users.tasks.prune_avatar_variants',
+        'schedule': 60 * 60 * 24,
+    },
+}
+
+######################################################################
+# QUIZZES
+######################################################################
+
+QUIZ_ANSWER_KEY_TIMEOUT = 60 * 60 * 24  # Время жизни ключей ответов в общем кэше
+QUIZ_ANSWER_KEY_LOCAL_SIZE = 512  # Сколько ключей тестов держать в памяти процесса
+QUIZ_BATCH_MAX_ANSWERS = 500  # Максимум ответов в одной пакетной отправке
+QUIZ_DRAFT_CACHE = 'default'  # Кэш для черновиков ответов незавершенных попыток
+QUIZ_DRAFT_IDLE_TIMEOUT = 60 * 60  # Через сколько секунд без изменений черновик сохраняется автоматически
+QUIZ_DRAFT_TIMEOUT = 60 * 60 * 6  # Время жизни черновика в кэше (больше периода автосохранения)
+# Redis для sorted sets квизов (черновики, сверка сводок, рейтинги); memory:// — в памяти процесса
+QUIZ_REDIS_URL = config('QUIZ_REDIS_URL', default='memory://' if TESTING else 'redis://localhost:6379/2')
+QUIZ_LEADERBOARD_MAX_LIMIT = 100  # Максимум строк в одном ответе рейтинга
+QUIZ_IMPORT_MAX_QUESTIONS = 2000  # Максимум вопросов в одном импортируемом тесте
+QUIZ_EXPORT_CHUNK_SIZE = 2000  # Сколько строк читать из серверного курсора за раз при выгрузке
+QUIZ_SHUFFLE_KEY = config('QUIZ_SHUFFLE_KEY', default=SECRET_KEY)  # Ключ HMAC для перемешивания вариантов
+# Ответы принимаются с 202 и проверяются воркерами Celery порциями (см. submissions.py)
+QUIZ_ASYNC_GRADING = config('QUIZ_ASYNC_GRADING', default=False, cast=bool)
+QUIZ_ASYNC_BATCH_SIZE = 200  # Сколько отправок проверять в одной транзакции
+QUIZ_ASYNC_MAX_BATCHES = 50  # Сколько порций обрабатывает один запуск задачи
+QUIZ_ROLLUP_BATCH_SIZE = 100  # Сколько отмеченных тестов сверять в одной порции
+QUIZ_ROLLUP_MAX_BATCHES = 20  # Сколько порций сверяет один запуск задачи reconcile_rollups
+QUIZ_IDEMPOTENCY_TTL = 60 * 60 * 24  # Сколько хранить ответы под ключом Idempotency-Key
+QUIZ_IDEMPOTENCY_CACHE_TIMEOUT = 60 * 10  # Сколько держать их в кэше для быстрых повторов
+
 ######################################################################
 # LOGGING
 ######################################################################